@@ -0,0 +1,30 @@
+"""Add enrichment_pending to events
+
+Revision ID: 5c2e9a71d0b4
+Revises: f48a53560299
+Create Date: 2026-10-19 11:40:02.917455
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2e9a71d0b4'
+down_revision: Union[str, Sequence[str], None] = 'f48a53560299'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column('events', sa.Column('enrichment_pending', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.create_index(
+        'idx_events_enrichment_pending', 'events', ['ts'],
+        postgresql_where=sa.text('enrichment_pending'),
+    )
+
+def downgrade():
+    op.drop_index('idx_events_enrichment_pending', table_name='events')
+    op.drop_column('events', 'enrichment_pending')
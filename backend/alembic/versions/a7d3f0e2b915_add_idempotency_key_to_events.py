@@ -0,0 +1,30 @@
+"""Add idempotency_key to events
+
+Revision ID: a7d3f0e2b915
+Revises: 5c2e9a71d0b4
+Create Date: 2026-10-19 13:05:27.640118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3f0e2b915'
+down_revision: Union[str, Sequence[str], None] = '5c2e9a71d0b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column('events', sa.Column('idempotency_key', sa.String(length=128), nullable=True))
+    op.create_index(
+        'uq_events_idempotency_key', 'events', ['idempotency_key'], unique=True,
+        postgresql_where=sa.text('idempotency_key IS NOT NULL'),
+    )
+
+def downgrade():
+    op.drop_index('uq_events_idempotency_key', table_name='events')
+    op.drop_column('events', 'idempotency_key')
@@ -0,0 +1,34 @@
+"""Add comarca_geometry_levels table
+
+Revision ID: b8c41e07d2a6
+Revises: a7d3f0e2b915
+Create Date: 2026-10-19 18:20:41.503117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8c41e07d2a6'
+down_revision: Union[str, Sequence[str], None] = 'a7d3f0e2b915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        'comarca_geometry_levels',
+        sa.Column('zoom', sa.SmallInteger(), primary_key=True),
+        sa.Column('etag', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('gzip', sa.LargeBinary(), nullable=False),
+        sa.Column('br', sa.LargeBinary(), nullable=False),
+        sa.Column('built_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+    )
+
+
+def downgrade():
+    op.drop_table('comarca_geometry_levels')
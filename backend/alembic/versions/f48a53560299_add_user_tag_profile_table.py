@@ -0,0 +1,41 @@
+"""Add user_tag_profile table
+
+Revision ID: f48a53560299
+Revises: 235f52e6f362
+Create Date: 2026-10-19 09:12:44.208311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f48a53560299'
+down_revision: Union[str, Sequence[str], None] = '235f52e6f362'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        "user_tag_profile",
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("tag", sa.String(), primary_key=True),
+        sa.Column("cnt", sa.Integer(), nullable=False, server_default=sa.text("0")),
+    )
+    # Backfill from the existing save/complete history
+    op.execute("""
+        INSERT INTO user_tag_profile (user_id, tag, cnt)
+        SELECT e.user_id, t.tag, count(*)
+        FROM events e
+        JOIN activities a ON a.id = e.activity_id
+        CROSS JOIN LATERAL unnest(a.tags) AS t(tag)
+        WHERE e.event_type IN ('save', 'complete')
+        GROUP BY 1, 2
+    """)
+
+def downgrade():
+    op.drop_table("user_tag_profile")
@@ -9,6 +9,8 @@ from app.db.session import get_session
 from app.db.models.activity_suggestion import ActivitySuggestion
 from app.services.activity.schemas import ActivitySuggestionIn, ActivitySuggestionOut
 from app.services.activity.utils import activity_to_schema
+from app.services.geo.tiles import tile_cache
+from app.services.recommender.index import activity_changed
 
 router = APIRouter()
 
@@ -33,6 +35,8 @@ def validate_activity(activity_id: str, db: Session = Depends(get_session)):
     activity.validated = True
     db.commit()
     db.refresh(activity)
+    activity_changed(db, activity.id)
+    tile_cache.layer_changed("activities")
     return activity_to_schema(activity)
 
 @router.post("/activities/suggest", response_model=ActivitySuggestionOut)
@@ -56,6 +60,8 @@ def suggest_activity(payload: ActivitySuggestionIn, db: Session = Depends(get_se
     db.add(suggestion)
     db.commit()
     db.refresh(suggestion)
+    activity_changed(db, suggestion.id)
+    tile_cache.layer_changed("activities")
     return activity_to_schema(suggestion)
 
 @router.delete("/activities/{activity_id}", response_model=dict)
@@ -78,6 +84,8 @@ def delete_activity(activity_id: str, db: Session = Depends(get_session)):
         raise HTTPException(status_code=404, detail="Activity not found")
     db.delete(activity)
     db.commit()
+    activity_changed(db, activity_id, deleted=True)
+    tile_cache.layer_changed("activities")
     return {"detail": "Activity deleted"}
 
 @router.put("/activities/{activity_id}", response_model=ActivitySuggestionOut)
@@ -108,6 +116,8 @@ def update_activity(activity_id: str, payload: ActivitySuggestionIn, db: Session
         setattr(activity, field, value)
     db.commit()
     db.refresh(activity)
+    activity_changed(db, activity.id)
+    tile_cache.layer_changed("activities")
     return activity_to_schema(activity)
 
 @router.get("/activities/categories", response_model=list[str])
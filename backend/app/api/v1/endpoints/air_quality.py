@@ -1,8 +1,22 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Query, HTTPException
-from app.services.air_quality.schemas import AirQualityResponse, AirQualityPoint
+import asyncio
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+
+from app.db.session import get_session
+from app.services.air_quality.grid import GridPoint, load_grid_points
+from app.services.air_quality.schemas import (
+    AirQualityBatchIn,
+    AirQualityGridResponse,
+    AirQualityPoint,
+    AirQualityResponse,
+)
 from app.services.air_quality.service import air_quality_service
+from app.services.concurrency import ExecutorSaturated
 
 router = APIRouter()
 """Endpoints for retrieving air quality data."""
@@ -23,13 +37,16 @@ async def air_quality(
         AirQualityResponse: Air quality data for the location.
 
     Raises:
-        HTTPException: 404 if no data is available, 502 for service errors.
+        HTTPException: 404 if no data is available, 503 if too many upstream calls
+            are queued, 502 for service errors.
     """
     try:
         result = await air_quality_service.get_air_quality(lat=lat, lon=lon)
         if not result.observations or result.observations[0] is None:
             raise HTTPException(status_code=404, detail="No air quality data available for this location.")
         return result
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=f"Air quality service busy: {e}")
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Air quality service error: {str(e)}")
 
@@ -49,12 +66,53 @@ async def air_quality_hourly(
         list[AirQualityPoint]: List of hourly air quality data points.
 
     Raises:
-        HTTPException: 404 if no data is available, 502 for service errors.
+        HTTPException: 404 if no data is available, 503 if too many upstream calls
+            are queued, 502 for service errors.
     """
     try:
         points = await air_quality_service.get_air_quality_hourly(lat=lat, lon=lon)
         if not points:
             raise HTTPException(status_code=404, detail="No hourly air quality data available for this location.")
-        return points
+        # Rows are already JSON-ready; skip per-row response_model validation
+        return ORJSONResponse(points)
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=f"Air quality service busy: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Air quality service error: {str(e)}")
+
+@router.get("/air-quality/grid", response_model=AirQualityGridResponse)
+async def air_quality_grid(
+    source: Literal["comarcas", "stations"] = Query("comarcas"),
+    db: Session = Depends(get_session),
+) -> AirQualityGridResponse:
+    """
+    Current air quality at every point of a grid source in one response: an
+    interior point of each comarca, or each Meteocat station.
+
+    Raises:
+        HTTPException: 503 if too many upstream calls are queued, 502 for service errors.
+    """
+    points = await asyncio.to_thread(load_grid_points, db, source)
+    try:
+        return await air_quality_service.get_air_quality_grid(points, source)
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=f"Air quality service busy: {e}")
     except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Air quality service error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=502, detail=f"Air quality service error: {str(e)}")
+
+
+@router.post("/air-quality/batch", response_model=AirQualityGridResponse)
+async def air_quality_batch(body: AirQualityBatchIn) -> AirQualityGridResponse:
+    """
+    Current air quality at each of up to MAX_BATCH_POINTS points, in request order.
+
+    Raises:
+        HTTPException: 503 if too many upstream calls are queued, 502 for service errors.
+    """
+    points = [GridPoint(lat=p.lat, lon=p.lon) for p in body.points]
+    try:
+        return await air_quality_service.get_air_quality_grid(points, "points")
+    except ExecutorSaturated as e:
+        raise HTTPException(status_code=503, detail=f"Air quality service busy: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Air quality service error: {str(e)}")
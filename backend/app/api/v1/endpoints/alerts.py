@@ -1,20 +1,47 @@
-from fastapi import APIRouter, Query
-from app.services.alerts.service import alerts_service
+import asyncio
+from datetime import date
+
+import httpx
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from app.db.session import get_session
+from app.services.alerts.service import CachedEpisodes, alerts_service
 from app.services.alerts.schemas import EpisodiObert
-from typing import List
+from app.services.geo.service import comarca_service
+from typing import List, Optional
 
 router = APIRouter()
 """Endpoints for Meteocat alerts and warnings."""
 
+
+def _requested_date(year: int, month: int, day: int) -> date:
+    try:
+        return date(year, month, day)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _conditional_response(cached: CachedEpisodes, if_none_match: Optional[str]) -> Response:
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if if_none_match and (
+        if_none_match.strip() == "*" or cached.etag in (t.strip() for t in if_none_match.split(","))
+    ):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
 @router.get("/meteocat/episodis-oberts", response_model=List[EpisodiObert])
 async def get_episodis_oberts(
     year: int = Query(..., ge=2000, le=2100, description="Year in YYYY format"),
     month: int = Query(..., ge=1, le=12, description="Month in MM format"),
     day: int = Query(..., ge=1, le=31, description="Day in DD format"),
+    if_none_match: Optional[str] = Header(None),
 ):
     """
     Get Meteocat 'episodis oberts' (open warning episodes) for a specific date.
 
+    Served from the cache kept fresh by the refresh_alerts task, as pre-serialized
+    JSON with an ETag; a matching If-None-Match gets 304.
+
     Args:
         year (int): Year in YYYY format.
         month (int): Month in MM format.
@@ -22,5 +49,44 @@ async def get_episodis_oberts(
 
     Returns:
         List[EpisodiObert]: List of open warning episodes for the given date.
+
+    Raises:
+        HTTPException: 422 for an invalid date, 502 if the date isn't cached and
+            Meteocat can't be reached.
+    """
+    requested = _requested_date(year, month, day)
+    try:
+        cached = await alerts_service.get_cached(requested)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Meteocat alerts error: {e}")
+    return _conditional_response(cached, if_none_match)
+
+
+@router.get("/meteocat/episodis-oberts/levels")
+async def get_episodis_oberts_levels(
+    year: int = Query(..., ge=2000, le=2100, description="Year in YYYY format"),
+    month: int = Query(..., ge=1, le=12, description="Month in MM format"),
+    day: int = Query(..., ge=1, le=31, description="Day in DD format"),
+    if_none_match: Optional[str] = Header(None),
+    session = Depends(get_session),
+):
+    """
+    Maximum warning level per comarca for each period of a date, for the alerts map.
+
+    `perill[p][i]` and `nivell[p][i]` are the levels of period `periods[p]` in the
+    i-th feature of /comarcas/geojson (0 = no warning), so the map colours features
+    by index instead of walking the episodes. Same ETag / 304 handling as
+    /meteocat/episodis-oberts.
+
+    Raises:
+        HTTPException: 422 for an invalid date, 502 if the date isn't cached and
+            Meteocat can't be reached.
     """
-    return await alerts_service.get_episodis_oberts(year, month, day)
\ No newline at end of file
+    requested = _requested_date(year, month, day)
+    # Blocking query on a cache miss; keep it off the event loop
+    codes = await asyncio.to_thread(comarca_service.feature_codes, session)
+    try:
+        cached = await alerts_service.get_levels(requested, codes)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Meteocat alerts error: {e}")
+    return _conditional_response(cached, if_none_match)
@@ -1,17 +1,16 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Header, Query, Response
 from sqlalchemy import text
-import json
-import time
+import gzip
+from typing import Optional
 
 from app.db.session import get_session
+from app.services.geo.geometries import geometry_store
 from app.services.geo.schemas import ComarcaOut
 from app.services.geo.service import comarca_service
 
 router = APIRouter()
-_geojson_cache = {"data": None, "timestamp": 0}
-CACHE_TTL = 3600  # seconds
 
 @router.get("/comarcas", response_model=list[ComarcaOut])
 def list_comarcas(session = Depends(get_session)) -> list[ComarcaOut]:
@@ -43,28 +42,28 @@ def lookup_comarca(
     return ComarcaOut(code=row.code, name=row.name)
 
 @router.get("/comarcas/geojson")
-def comarcas_geojson(session = Depends(get_session)):
-    now = time.time()
-    if _geojson_cache["data"] and now - _geojson_cache["timestamp"] < CACHE_TTL:
-        return _geojson_cache["data"]
+def comarcas_geojson(
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Map zoom; selects the simplification level"),
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    session = Depends(get_session),
+):
+    """
+    Comarca boundaries as a FeatureCollection, simplified for `zoom`.
 
-    result = session.execute(
-        text("SELECT code, name, ST_AsGeoJSON(ST_Transform(geom, 4326)) as geojson FROM comarcas")
-    )
-    features = []
-    for row in result.fetchall():
-        features.append({
-            "type": "Feature",
-            "geometry": json.loads(row.geojson),
-            "properties": {
-                "code": row.code,
-                "name": row.name,
-            }
-        })
-    geojson = {
-        "type": "FeatureCollection",
-        "features": features
-    }
-    _geojson_cache["data"] = geojson
-    _geojson_cache["timestamp"] = now
-    return geojson
\ No newline at end of file
+    Payloads are built when comarcas are loaded (scripts/load_comarcas.py) and
+    stored compressed; they are sent as-is with Content-Encoding br or gzip and
+    only decompressed for clients that accept neither. Features are ordered by
+    code, the order comarca_service.feature_codes() returns.
+    """
+    payload = geometry_store.get(session, zoom)
+    headers = {"ETag": payload.etag, "Vary": "Accept-Encoding", "Cache-Control": "public, max-age=3600"}
+    if if_none_match and payload.etag in (t.strip() for t in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    accepted = {e.split(";")[0].strip().lower() for e in (accept_encoding or "").split(",")}
+    if "br" in accepted:
+        return Response(content=payload.br, media_type="application/geo+json", headers={**headers, "Content-Encoding": "br"})
+    if "gzip" in accepted:
+        return Response(content=payload.gzip, media_type="application/geo+json", headers={**headers, "Content-Encoding": "gzip"})
+    return Response(content=gzip.decompress(payload.gzip), media_type="application/geo+json", headers=headers)
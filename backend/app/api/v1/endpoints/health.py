@@ -1,13 +1,32 @@
-from fastapi import APIRouter
-from app.services.recommender import MLRecommender
-from app.core.config import settings
+import os
 
-model = MLRecommender(settings.model_path)
-model.load()
+from fastapi import APIRouter
+from app.services.air_quality.service import air_quality_service
+from app.services.geo.tiles import tile_cache
+from app.services.recommender import model_registry
+from app.services.recommender.impressions import impression_writer
 
 router = APIRouter()
 
 
 @router.get("/health")
 def health() -> dict:
-    return {"status": "ok", "model_loaded": model.model is not None}
+    model = model_registry.active
+    return {
+        "status": "ok",
+        "model_loaded": model.model is not None,
+        "model_version": model.version,
+        "model_error": model.load_error,
+        "pid": os.getpid(),
+    }
+
+
+@router.get("/metrics")
+def metrics() -> dict:
+    """In-process counters of this worker's background components."""
+    return {
+        "pid": os.getpid(),
+        "impressions": impression_writer.stats(),
+        "air_quality": air_quality_service.stats(),
+        "tiles": tile_cache.stats(),
+    }
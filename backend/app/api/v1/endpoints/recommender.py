@@ -1,66 +1,36 @@
+import asyncio
 import uuid
-import pandas as pd
-from sqlalchemy import text
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from app.services.recommender import MLRecommender, recommend, fetch_weather_slice
-from app.core.config import settings
+from app.services.recommender import recommend, fetch_weather_slice, model_registry, WeatherUnavailable
+from app.services.recommender import result_cache
+from app.services.recommender.impressions import impression_writer
+from app.services.recommender.events import ingest_events
+from app.services.recommender.embeddings import embedding_store
+from app.services.recommender.index import activity_index, current_catalog_version
+from app.services.recommender.service import get_user_preferences
+from app.services.recommender.time_windows import rank_time_windows
+from app.services.recommender.weather_grid import weather_grid
 from app.services.user.auth import get_current_user, require_role
 from app.db.session import get_session
 from app.db.models import User
-from app.services.recommender.schemas import ActivityOut, EventIn
-from app.services.recommender.utils import get_weather_for_event
+from app.services.recommender.schemas import (
+    MAX_BEST_TIME_ACTIVITIES,
+    ActivityOut,
+    ActivityTimeWindowsOut,
+    EventBatchIn,
+    EventBatchItemResult,
+    EventBatchOut,
+    EventIn,
+)
 
 router = APIRouter(tags=["recommender"])
 
-model = MLRecommender(settings.model_path)
-model.load()
-
+UNKNOWN_REFERENCE_MSG = "user_id or activity_id does not exist"
 
-@router.post("/events")
-def log_event(ev: EventIn, db: Session = Depends(get_session)):
-    # Fetch weather data for the event location and time
-    event_time = ev.ts.isoformat() if ev.ts else pd.Timestamp.now(tz="UTC").isoformat()
-    weather = get_weather_for_event(ev.user_lat, ev.user_lon, event_time)
-
-    db.execute(
-        text("""
-        INSERT INTO events (
-          id, user_id, activity_id, event_type, ts,
-          request_id, position,
-          user_lat, user_lon,
-          weather_temp_c, weather_precip_prob, weather_wind_kmh, weather_is_day,
-          cloud_cover, precipitation
-        )
-        VALUES (
-          :id, :u, :a, :t, COALESCE(:ts, now()),
-          :rid, :pos,
-          :lat, :lon,
-          :temp, :pp, :wind, :day,
-          :cloud, :precip
-        )
-        """),
-        {
-            "id": str(uuid.uuid4()),
-            "u": str(ev.user_id),
-            "a": str(ev.activity_id),
-            "t": ev.event_type,
-            "ts": ev.ts,
-            "rid": str(ev.request_id) if ev.request_id else None,
-            "pos": ev.position,
-            "lat": ev.user_lat,
-            "lon": ev.user_lon,
-            "temp": weather["weather_temp_c"],
-            "pp": weather["weather_precip_prob"],
-            "wind": weather["weather_wind_kmh"],
-            "day": weather["weather_is_day"],
-            "cloud": weather["cloud_cover"],
-            "precip": weather["precipitation"],
-        }
-    )
-    db.commit()
-    return {"ok": True}
 
 @router.get("/recommendations", response_model=list[ActivityOut])
 async def get_recommendations(
@@ -73,98 +43,185 @@ async def get_recommendations(
     user: User = Depends(get_current_user),  # requires login
 ):
     request_id = uuid.uuid4()
+    # Pin the model for the whole request; a concurrent reload swaps it for later requests only
+    model = model_registry.active
 
-    w = await fetch_weather_slice(lat, lon, horizon_hours=horizon_hours)
-    recs = recommend(
-        db=db,
-        model=model,
-        user_id=user.id,
-        lat=lat,
-        lon=lon,
-        radius_km=radius_km,
-        weather_temp_c=w.temp_c,
-        weather_precip_prob=w.precip_prob,
-        weather_wind_kmh=w.wind_kmh,
-        weather_is_day=w.is_day,
-        limit=limit,
+    try:
+        w = await fetch_weather_slice(lat, lon, horizon_hours=horizon_hours)
+    except WeatherUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    cache_key, recs = await result_cache.lookup(
+        user.id, lat, lon, radius_km, limit, w, model.version, embedding_store.version
     )
-    
-    for idx, r in enumerate(recs, start=1):
-        db.execute(
-            text("""
-            INSERT INTO events (
-            id, user_id, activity_id, event_type, ts,
-            request_id, position,
-            user_lat, user_lon,
-            weather_temp_c, weather_precip_prob, weather_wind_kmh, weather_is_day
-            )
-            VALUES (
-            :id, :u, :a, 'view', now(),
-            :rid, :pos,
-            :lat, :lon,
-            :t, :pp, :w, :day
-            )
-            """),
-            {
-                "id": str(uuid.uuid4()),
-                "u": str(user.id),
-                "a": str(r["id"]),
-                "rid": str(request_id),
-                "pos": idx,
-                "lat": float(lat),
-                "lon": float(lon),
-                "t": float(w.temp_c),
-                "pp": float(w.precip_prob),
-                "w": float(w.wind_kmh),
-                "day": float(w.is_day),
-            }
+    if recs is None:
+        recs = recommend(
+            db=db,
+            model=model,
+            user_id=user.id,
+            lat=lat,
+            lon=lon,
+            radius_km=radius_km,
+            weather_temp_c=w.temp_c,
+            weather_precip_prob=w.precip_prob,
+            weather_wind_kmh=w.wind_kmh,
+            weather_is_day=w.is_day,
+            limit=limit,
         )
+        await result_cache.store(cache_key, recs)
+
+    # Impressions are logged for cache hits too, so training data sees every view.
+    # They are queued and written in batches after the response.
+    await impression_writer.submit([
+        impression_writer.row(
+            user_id=user.id,
+            activity_id=uuid.UUID(str(r["id"])),
+            request_id=request_id,
+            position=idx,
+            user_lat=float(lat),
+            user_lon=float(lon),
+            weather_temp_c=float(w.temp_c),
+            weather_precip_prob=float(w.precip_prob),
+            weather_wind_kmh=float(w.wind_kmh),
+            weather_is_day=float(w.is_day),
+        )
+        for idx, r in enumerate(recs, start=1)
+    ])
 
-    db.commit()
-    
     # Include request_id in response so the client can attach it to clicks/saves
     for r in recs:
         r["request_id"] = str(request_id)
     
     return recs
 
+@router.get("/recommendations/best-time", response_model=list[ActivityTimeWindowsOut])
+async def get_best_time_windows(
+    activity_ids: list[uuid.UUID] = Query(..., min_length=1, max_length=MAX_BEST_TIME_ACTIVITIES),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    horizon_hours: int = Query(48, ge=1, le=48),
+    durations: list[int] = Query([1, 2, 3, 4], min_length=1, max_length=12),
+    limit: int = Query(5, ge=1, le=50),
+    db: Session = Depends(get_session),
+    user: User = Depends(get_current_user),
+):
+    """
+    Best time windows in the next `horizon_hours` for each activity.
+
+    Every start hour x duration is scored with the recommender's model and the
+    weather forecast at the activity's location; `lat`/`lon` (the user's
+    position) only feed the distance feature.
+    """
+    if any(d < 1 or d > 24 for d in durations):
+        raise HTTPException(status_code=422, detail="durations must be between 1 and 24 hours")
+    model = model_registry.active
+
+    def load_context():
+        prefs = get_user_preferences(db, user.id)
+        activity_index.ensure_fresh(db, current_catalog_version())
+        return prefs
+
+    def score_windows(activity, series):
+        return rank_time_windows(
+            model,
+            activity,
+            series,
+            cat_pref,
+            tag_pref,
+            durations=sorted(set(durations)),
+            horizon_hours=horizon_hours,
+            user_lat=lat,
+            user_lon=lon,
+            limit=limit,
+            cf_score=embedding_store.score(user.id, activity.id),
+        )
+
+    # Database, sync Redis, embedding reloads and scoring run in worker threads;
+    # only the weather reads run on the event loop
+    cat_pref, tag_pref = await asyncio.to_thread(load_context)
+
+    out = []
+    for activity_id in dict.fromkeys(activity_ids):
+        activity = activity_index.get(str(activity_id))
+        if activity is None:
+            raise HTTPException(status_code=404, detail=f"Activity {activity_id} not found")
+        try:
+            series = await weather_grid.series(activity.lat, activity.lon)
+        except WeatherUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        windows = await asyncio.to_thread(score_windows, activity, series)
+        out.append({"activity_id": activity.id, "name": activity.name, "windows": windows})
+    return out
+
 @router.post("/model/reload")
-def reload_model(admin: User = Depends(require_role("admin"))):
-    model.load()
-    return {"ok": True, "model_loaded": model.model is not None}
+async def reload_model(
+    version: Optional[str] = None,
+    admin: User = Depends(require_role("admin")),
+):
+    """
+    Load a model version (default: the registry's current one), record it as the
+    manifest's current version and broadcast the reload to every API worker. The
+    version is validated locally first so a bad artifact is never recorded or
+    broadcast; workers started later load the same version from the manifest.
+    """
+    try:
+        model = await asyncio.to_thread(model_registry.load, version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if model.version is not None:
+        # None: legacy single-file artifact, which has no manifest entry
+        await asyncio.to_thread(model_registry.set_current, model.version)
+    await model_registry.broadcast_reload(model.version)
+    return {"ok": True, "model_loaded": model.model is not None, "model_version": model.version}
 
 @router.post("/events")
 def log_event(ev: EventIn, db: Session = Depends(get_session)):
-    db.execute(
-        text("""
-        INSERT INTO events (
-          id, user_id, activity_id, event_type, ts,
-          request_id, position,
-          user_lat, user_lon,
-          weather_temp_c, weather_precip_prob, weather_wind_kmh, weather_is_day
-        )
-        VALUES (
-          :id, :u, :a, :t, COALESCE(:ts, now()),
-          :rid, :pos,
-          :lat, :lon,
-          :temp, :pp, :wind, :day
-        )
-        """),
-        {
-            "id": str(uuid.uuid4()),
-            "u": str(ev.user_id),
-            "a": str(ev.activity_id),
-            "t": ev.event_type,
-            "ts": ev.ts,
-            "rid": str(ev.request_id) if ev.request_id else None,
-            "pos": ev.position,
-            "lat": ev.user_lat,
-            "lon": ev.user_lon,
-            "temp": ev.weather_temp_c,
-            "pp": ev.weather_precip_prob,
-            "wind": ev.weather_wind_kmh,
-            "day": ev.weather_is_day,
-        }
+    """
+    Store a client event as-is. Missing weather context is filled in later by
+    the enrich_event_weather Celery task, so ingestion never waits on upstream.
+    """
+    status = ingest_events(db, [ev])[0]
+    if status == "rejected":
+        raise HTTPException(status_code=422, detail=UNKNOWN_REFERENCE_MSG)
+    return {"ok": True, "duplicate": status == "duplicate"}
+
+
+@router.post("/events/batch", response_model=EventBatchOut)
+def log_events_batch(batch: EventBatchIn, db: Session = Depends(get_session)):
+    """
+    Store a buffer of client events in one transaction.
+
+    Each item is validated independently and reported back by index. Valid items
+    are written with a single multi-row INSERT; items carrying an
+    idempotency_key that was already stored are reported as duplicates, so the
+    whole batch can be retried safely. Items referencing an unknown user or
+    activity are reported as rejected and never stored.
+    """
+    results: list[EventBatchItemResult] = []
+    valid: list[EventIn] = []
+    valid_idx: list[int] = []
+    for i, item in enumerate(batch.events):
+        try:
+            valid.append(EventIn.model_validate(item))
+            valid_idx.append(i)
+        except ValidationError as e:
+            results.append(EventBatchItemResult(
+                index=i,
+                status="invalid",
+                errors=e.errors(include_url=False, include_context=False),
+            ))
+
+    statuses = ingest_events(db, valid)
+    for i, status in zip(valid_idx, statuses):
+        errors = [{"type": "unknown_reference", "msg": UNKNOWN_REFERENCE_MSG}] if status == "rejected" else None
+        results.append(EventBatchItemResult(index=i, status=status, errors=errors))
+    results.sort(key=lambda r: r.index)
+
+    return EventBatchOut(
+        accepted=statuses.count("accepted"),
+        duplicates=statuses.count("duplicate"),
+        invalid=len(batch.events) - len(statuses),
+        rejected=statuses.count("rejected"),
+        results=results,
     )
-    db.commit()
-    return {"ok": True}
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+
+from app.db.session import get_session
+from app.services.geo.tiles import LAYERS, tile_cache, valid_tile
+
+router = APIRouter()
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+
+@router.get("/tiles/{layer}/{z}/{x}/{y}.mvt")
+def get_tile(
+    layer: str,
+    z: int,
+    x: int,
+    y: int,
+    if_none_match: Optional[str] = Header(None),
+    session = Depends(get_session),
+):
+    """
+    Mapbox Vector Tile of one layer (comarcas, activities or meteocat_stations).
+
+    Rendered by PostGIS (ST_AsMVT) with geometry quantized to the tile grid, and
+    cached in Redis until the layer's rows change. The ETag is a hash of the
+    tile, so a client revalidating an unchanged tile gets 304.
+
+    Raises:
+        HTTPException: 404 for an unknown layer or a tile outside the zoom's grid.
+    """
+    if layer not in LAYERS:
+        raise HTTPException(status_code=404, detail=f"Unknown layer: {layer}")
+    if not valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    tile = tile_cache.get(session, layer, z, x, y)
+    headers = {"ETag": tile.etag, "Cache-Control": "no-cache"}
+    if if_none_match and tile.etag in (t.strip() for t in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=tile.data, media_type=MVT_MEDIA_TYPE, headers=headers)
@@ -11,6 +11,7 @@ from app.api.v1.endpoints import (
     recommender,
     activities,
     category,
+    tiles,
 )
 
 api_router = APIRouter()
@@ -23,4 +24,5 @@ api_router.include_router(meteocat.router, prefix="/v1", tags=["meteocat"])
 api_router.include_router(forecast.router, prefix="/v1", tags=["forecast"])
 api_router.include_router(recommender.router, prefix="/v1", tags=["recommender"])
 api_router.include_router(activities.router, prefix="/v1", tags=["activities"])
-api_router.include_router(category.router, prefix="/v1", tags=["categories"])
\ No newline at end of file
+api_router.include_router(category.router, prefix="/v1", tags=["categories"])
+api_router.include_router(tiles.router, prefix="/v1", tags=["tiles"])
\ No newline at end of file
@@ -41,6 +41,27 @@ class Settings(BaseSettings):
     weatherkit_token: str = Field(default="", alias="WEATHERKIT_TOKEN")
 
     model_path: str = Field(default="/models/recommender.joblib")
+    model_registry_dir: str = Field(default="/models/registry", alias="MODEL_REGISTRY_DIR")
+    recommendations_cache_ttl_seconds: int = Field(default=600, alias="RECOMMENDATIONS_CACHE_TTL_SECONDS")
+    recommendations_max_candidates: int = Field(default=500, alias="RECOMMENDATIONS_MAX_CANDIDATES")
+    impression_queue_max: int = Field(default=10_000, alias="IMPRESSION_QUEUE_MAX")
+    impression_batch_size: int = Field(default=500, alias="IMPRESSION_BATCH_SIZE")
+    impression_flush_interval_seconds: float = Field(default=1.0, alias="IMPRESSION_FLUSH_INTERVAL_SECONDS")
+    activity_index_max_age_seconds: int = Field(default=300, alias="ACTIVITY_INDEX_MAX_AGE_SECONDS")
+    retrain_label_window_days: int = Field(default=7, alias="RETRAIN_LABEL_WINDOW_DAYS")
+    retrain_max_lookback_days: int = Field(default=30, alias="RETRAIN_MAX_LOOKBACK_DAYS")
+    retrain_min_rows: int = Field(default=200, alias="RETRAIN_MIN_ROWS")
+    retrain_trees_per_run: int = Field(default=100, alias="RETRAIN_TREES_PER_RUN")
+    retrain_max_total_trees: int = Field(default=1500, alias="RETRAIN_MAX_TOTAL_TREES")
+    retrain_auc_tolerance: float = Field(default=0.0, alias="RETRAIN_AUC_TOLERANCE")
+    recommender_embeddings_dir: str = Field(default="/models/embeddings", alias="RECOMMENDER_EMBEDDINGS_DIR")
+    cf_rank: int = Field(default=32, alias="CF_RANK")
+    cf_lookback_days: int = Field(default=180, alias="CF_LOOKBACK_DAYS")
+    cf_keep_snapshots: int = Field(default=45, alias="CF_KEEP_SNAPSHOTS")
+    air_quality_executor_workers: int = Field(default=4, alias="AIR_QUALITY_EXECUTOR_WORKERS")
+    air_quality_executor_queue: int = Field(default=64, alias="AIR_QUALITY_EXECUTOR_QUEUE")
+    tile_cache_max_tiles: int = Field(default=50000, alias="TILE_CACHE_MAX_TILES")
+    tile_cache_ttl_seconds: int = Field(default=7 * 24 * 3600, alias="TILE_CACHE_TTL_SECONDS")
     
     jwt_secret_key: str = Field(default="supersecretkey", alias="JWT_SECRET_KEY")
     jwt_algorithm: str = Field(default="HS256", alias="JWT_ALGORITHM")
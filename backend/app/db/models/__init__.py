@@ -1,24 +1,26 @@
 # Import all models from their respective files
-from .comarca import Comarca
+from .comarca import Comarca, ComarcaGeometryLevel
 from .meteocat import (
     MeteocatStation,
     StationMeasurement,
     StationVariable,
     StationVariableValue,
 )
-from .user import User, UserPreference
+from .user import User, UserPreference, UserTagProfile
 from .activity_suggestion import ActivitySuggestion, Event
 from .category import Category
 
 
 __all__ = [
     "Comarca",
+    "ComarcaGeometryLevel",
     "MeteocatStation",
     "StationMeasurement",
     "StationVariable",
     "StationVariableValue",
     "User",
     "UserPreference",
+    "UserTagProfile",
     "ActivitySuggestion",
     "Event",
     "Category",
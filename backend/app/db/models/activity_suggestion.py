@@ -49,4 +49,12 @@ class Event(Base):
     weather_temp_c = Column(Float, nullable=True)
     weather_precip_prob = Column(Float, nullable=True)
     weather_wind_kmh = Column(Float, nullable=True)
-    weather_is_day = Column(Float, nullable=True)
\ No newline at end of file
+    weather_is_day = Column(Float, nullable=True)
+    cloud_cover = Column(Float, nullable=True)
+    precipitation = Column(Float, nullable=True)
+
+    # Set on ingest when weather context still has to be filled in by the enrichment task
+    enrichment_pending = Column(Boolean, nullable=False, default=False)
+
+    # Client-generated key that makes retried submissions no-ops
+    idempotency_key = Column(String(128), nullable=True)
\ No newline at end of file
@@ -1,7 +1,7 @@
 from sqlalchemy.orm import Mapped, mapped_column
 from geoalchemy2 import Geometry
 from app.db.base import Base
-from sqlalchemy import String
+from sqlalchemy import DateTime, Integer, LargeBinary, SmallInteger, String, func
 
 
 class Comarca(Base):
@@ -13,3 +13,15 @@ class Comarca(Base):
 
     # PostGIS geometry (WGS84).
     geom: Mapped[str] = mapped_column(Geometry(geometry_type="MULTIPOLYGON", srid=4326, spatial_index=True))
+
+
+class ComarcaGeometryLevel(Base):
+    """Pre-compressed /comarcas/geojson payload of one zoom level (see geo/geometries.py)."""
+    __tablename__ = "comarca_geometry_levels"
+
+    zoom: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    etag: Mapped[str] = mapped_column(String(64))
+    size: Mapped[int] = mapped_column(Integer)  # uncompressed bytes
+    gzip: Mapped[bytes] = mapped_column(LargeBinary)
+    br: Mapped[bytes] = mapped_column(LargeBinary)
+    built_at = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -18,4 +18,11 @@ class UserPreference(Base):
     __tablename__ = "user_preferences"
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
     category = Column(String, primary_key=True)
-    weight = Column(Integer, nullable=False, default=1)
\ No newline at end of file
+    weight = Column(Integer, nullable=False, default=1)
+
+class UserTagProfile(Base):
+    """Per-user tag counts over save/complete events, maintained on event insert."""
+    __tablename__ = "user_tag_profile"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    tag = Column(String, primary_key=True)
+    cnt = Column(Integer, nullable=False, default=0)
@@ -7,17 +7,27 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1.router import api_router
 from app.core.config import settings
+from app.services.air_quality.service import air_quality_service
+from app.services.alerts.service import alerts_service
 from app.services.cache import cache
+from app.services.recommender.impressions import impression_writer
+from app.services.recommender.registry import model_registry
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await cache.connect()
+    await model_registry.start()
+    await impression_writer.start()
     try:
         yield
     finally:
         # Shutdown
+        await impression_writer.stop()
+        await model_registry.stop()
+        air_quality_service.close()
+        await alerts_service.close()
         await cache.close()
 
 
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+GRID_SOURCES = ("comarcas", "stations")
+POINTS_TTL_SECONDS = 3600
+
+# ST_PointOnSurface rather than ST_Centroid: the centroid of a coastal or
+# concave comarca can fall outside it (or in the sea).
+_SOURCE_SQL = {
+    "comarcas": text("""
+        SELECT code AS id, name,
+               ST_Y(ST_PointOnSurface(geom)) AS lat,
+               ST_X(ST_PointOnSurface(geom)) AS lon
+        FROM comarcas
+        ORDER BY code
+    """),
+    "stations": text("""
+        SELECT codi AS id, nom AS name, latitud AS lat, longitud AS lon
+        FROM meteocat_stations
+        WHERE latitud IS NOT NULL AND longitud IS NOT NULL
+        ORDER BY codi
+    """),
+}
+
+
+@dataclass(frozen=True)
+class GridPoint:
+    lat: float
+    lon: float
+    id: Optional[str] = None
+    name: Optional[str] = None
+
+
+_points_cache: Dict[str, Tuple[float, List[GridPoint]]] = {}
+
+
+def load_grid_points(db: Session, source: str) -> List[GridPoint]:
+    """Named points of a grid source (comarca interior points or Meteocat stations), cached in process."""
+    if source not in _SOURCE_SQL:
+        raise ValueError(f"Unknown grid source: {source}")
+    hit = _points_cache.get(source)
+    now = time.time()
+    if hit is not None and now - hit[0] < POINTS_TTL_SECONDS:
+        return hit[1]
+    points = [
+        GridPoint(lat=float(r.lat), lon=float(r.lon), id=str(r.id), name=r.name)
+        for r in db.execute(_SOURCE_SQL[source]).fetchall()
+    ]
+    _points_cache[source] = (now, points)
+    return points
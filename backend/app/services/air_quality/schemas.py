@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class AirQualityPoint(BaseModel):
@@ -24,3 +24,30 @@ class AirQualityResponse(BaseModel):
     lon: float
     provider: str
     observations: list[AirQualityPoint]
+
+
+MAX_BATCH_POINTS = 500
+
+
+class AirQualityGridPoint(BaseModel):
+    id: Optional[str] = None
+    name: Optional[str] = None
+    lat: float
+    lon: float
+    observation: Optional[AirQualityPoint] = None
+
+
+class AirQualityGridResponse(BaseModel):
+    updated_at: datetime
+    provider: str
+    source: str
+    points: list[AirQualityGridPoint]
+
+
+class LatLonIn(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+
+
+class AirQualityBatchIn(BaseModel):
+    points: list[LatLonIn] = Field(..., min_length=1, max_length=MAX_BATCH_POINTS)
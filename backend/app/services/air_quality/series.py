@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.air_quality.schemas import AirQualityPoint
+
+# Open-Meteo air-quality hourly variables, in request order
+VARIABLES = (
+    "pm2_5", "pm10", "carbon_monoxide", "carbon_dioxide",
+    "nitrogen_dioxide", "sulphur_dioxide", "ozone", "uv_index",
+)
+
+# The upstream model (CAMS Europe) is ~0.1 deg; nearby requests share one series
+SNAP_DEGREES = 0.01
+
+
+def snap(lat: float, lon: float) -> Tuple[float, float]:
+    return (
+        round(round(lat / SNAP_DEGREES) * SNAP_DEGREES, 4),
+        round(round(lon / SNAP_DEGREES) * SNAP_DEGREES, 4),
+    )
+
+
+@dataclass(frozen=True)
+class AirQualitySeries:
+    """Hourly air-quality series of one snapped location, one float64 row per variable (NaN = missing)."""
+    t0: int              # unix seconds of the first sample
+    step: int            # seconds between samples
+    fetched_at: float    # unix seconds
+    values: np.ndarray   # (len(VARIABLES), n)
+
+    @property
+    def n(self) -> int:
+        return int(self.values.shape[1])
+
+    def encode(self) -> Dict[str, Any]:
+        """Columnar JSON: one list per variable instead of one object per hour."""
+        return {
+            "t0": self.t0,
+            "step": self.step,
+            "fetched_at": self.fetched_at,
+            "values": {v: _nullable(row) for v, row in zip(VARIABLES, self.values)},
+        }
+
+    @classmethod
+    def decode(cls, data: Dict[str, Any]) -> "AirQualitySeries":
+        values = np.array(
+            [[np.nan if x is None else x for x in data["values"][v]] for v in VARIABLES],
+            dtype=np.float64,
+        )
+        return cls(t0=int(data["t0"]), step=int(data["step"]), fetched_at=float(data["fetched_at"]), values=values)
+
+    @classmethod
+    def from_arrays(cls, t0: int, step: int, columns: List[np.ndarray]) -> "AirQualitySeries":
+        values = np.vstack([np.asarray(c, dtype=np.float64) for c in columns])
+        values[~np.isfinite(values)] = np.nan
+        return cls(t0=int(t0), step=int(step), fetched_at=time.time(), values=values)
+
+    def nearest_index(self, ts: float) -> int:
+        """Index of the sample closest to `ts`, clamped to the series."""
+        return min(max(int(math.floor((ts - self.t0) / self.step + 0.5)), 0), self.n - 1)
+
+    def point(self, i: int) -> AirQualityPoint:
+        return AirQualityPoint(
+            time=datetime.fromtimestamp(self.t0 + i * self.step, timezone.utc),
+            **{v: (None if np.isnan(x) else float(x)) for v, x in zip(VARIABLES, self.values[:, i].tolist())},
+        )
+
+    def current(self, now: Optional[float] = None) -> AirQualityPoint:
+        return self.point(self.nearest_index(time.time() if now is None else now))
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """
+        Every hour as a JSON-ready dict shaped like AirQualityPoint, built column-wise
+        (no per-row model validation).
+        """
+        times = np.datetime_as_string(
+            (self.t0 + self.step * np.arange(self.n, dtype=np.int64)).astype("datetime64[s]"), unit="s"
+        )
+        columns = [[f"{t}Z" for t in times.tolist()]] + [_nullable(row) for row in self.values]
+        keys = ("time",) + VARIABLES
+        return [dict(zip(keys, r)) for r in zip(*columns)]
+
+
+def _nullable(row: np.ndarray) -> List[Optional[float]]:
+    """Float list with NaN as None."""
+    return np.where(np.isnan(row), None, row).tolist()
@@ -1,134 +1,194 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import logging
+import time
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import redis
 
-from app.services.air_quality.schemas import AirQualityPoint, AirQualityResponse
+from app.core.config import settings
+from app.services.air_quality.grid import GridPoint
+from app.services.air_quality.schemas import AirQualityGridPoint, AirQualityGridResponse, AirQualityResponse
+from app.services.air_quality.series import VARIABLES, AirQualitySeries, snap
 from app.services.cache import cache
+from app.services.concurrency import BoundedExecutor, ExecutorSaturated, SingleFlight
 
 import openmeteo_requests
-import numpy as np
-import pandas as pd
 import requests_cache
 from retry_requests import retry
-import asyncio
+
+logger = logging.getLogger(__name__)
+
+AIR_QUALITY_URL = "https://air-quality-api.open-meteo.com/v1/air-quality"
+SERIES_KEY = "airq:v3:series:{lat:.2f}:{lon:.2f}"
+SERIES_TTL_SECONDS = 60 * 30
+UPSTREAM_BATCH = 50  # locations per multi-coordinate upstream call
+
+Cell = Tuple[float, float]
 
 class AirQualityService:
     def __init__(self):
         cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
         retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
         self.openmeteo = openmeteo_requests.Client(session=retry_session)
-
-    async def get_air_quality(self, lat: float, lon: float) -> AirQualityResponse:
-        cache_key = f"airq:v2:{round(lat,3)}:{round(lon,3)}"
+        # Blocking SDK calls get their own bounded pool instead of the loop's default
+        # executor, and concurrent misses for one location share a single call.
+        self._executor = BoundedExecutor(
+            "openmeteo-aq",
+            max_workers=settings.air_quality_executor_workers,
+            max_queue=settings.air_quality_executor_queue,
+        )
+        self._flight = SingleFlight()
+
+    async def series(self, lat: float, lon: float) -> AirQualitySeries:
+        """
+        Hourly series of the snapped location around (lat, lon). Both endpoints read
+        this one cached series; concurrent misses share one upstream call.
+        """
+        cell = snap(lat, lon)
+        cache_key = SERIES_KEY.format(lat=cell[0], lon=cell[1])
         cached = await cache.get_json(cache_key)
         if cached:
-            return AirQualityResponse.model_validate(cached)
-
-        # Run the blocking Open-Meteo client in a thread
-        df = await asyncio.get_event_loop().run_in_executor(
-            None, self._fetch_hourly_dataframe, lat, lon
-        )
-
-        if df.empty:
-            raise Exception("No air quality data returned from Open-Meteo.")
+            return AirQualitySeries.decode(cached)
+
+        async def fetch() -> AirQualitySeries:
+            series = await self._executor.run(self._fetch_series, *cell)
+            await cache.set_json(cache_key, series.encode(), ttl_seconds=SERIES_TTL_SECONDS)
+            return series
+
+        return await self._flight.do(cell, fetch)
+
+    async def series_many(self, points: Sequence[Tuple[float, float]]) -> List[Optional[AirQualitySeries]]:
+        """
+        Series of many points: one MGET for all snapped cells, then multi-location
+        upstream calls (UPSTREAM_BATCH cells each) for the cells not cached.
+        Returns None for points whose cell has no data, including cells of a
+        failed upstream call; a Redis failure is treated as a full cache miss.
+
+        Raises:
+            ExecutorSaturated: every upstream call was shed and nothing was cached.
+        """
+        cells = [snap(lat, lon) for lat, lon in points]
+        unique = list(dict.fromkeys(cells))
+        try:
+            raw = await cache.get_many([SERIES_KEY.format(lat=c[0], lon=c[1]) for c in unique])
+        except redis.RedisError:
+            logger.warning("Redis unavailable; fetching %d air-quality cells upstream", len(unique))
+            raw = [None] * len(unique)
+        found: Dict[Cell, AirQualitySeries] = {
+            c: AirQualitySeries.decode(json.loads(r)) for c, r in zip(unique, raw) if r
+        }
 
-        # Find the row with the timestamp closest to now
-        now = pd.Timestamp.utcnow()
-        idx = (df["date"] - now).abs().idxmin()
-        row = df.loc[idx]
-
-        point = AirQualityPoint(
-            time=row["date"].to_pydatetime(),
-            pm2_5=row["pm2_5"],
-            pm10=row["pm10"],
-            carbon_monoxide=row["carbon_monoxide"],
-            carbon_dioxide=row["carbon_dioxide"],
-            nitrogen_dioxide=row["nitrogen_dioxide"],
-            sulphur_dioxide=row["sulphur_dioxide"],
-            ozone=row["ozone"],
-            uv_index=row["uv_index"],
+        async def fetch(chunk: Tuple[Cell, ...]) -> Dict[Cell, AirQualitySeries]:
+            fetched = dict(zip(chunk, await self._executor.run(self._fetch_many, chunk)))
+            try:
+                await cache.set_many_json(
+                    {SERIES_KEY.format(lat=c[0], lon=c[1]): s.encode() for c, s in fetched.items()},
+                    ttl_seconds=SERIES_TTL_SECONDS,
+                )
+            except redis.RedisError:
+                logger.warning("Could not cache %d air-quality cells", len(fetched))
+            return fetched
+
+        missing = [c for c in unique if c not in found]
+        chunks = [tuple(missing[i:i + UPSTREAM_BATCH]) for i in range(0, len(missing), UPSTREAM_BATCH)]
+        results = await asyncio.gather(
+            *(self._flight.do(chunk, lambda chunk=chunk: fetch(chunk)) for chunk in chunks),
+            return_exceptions=True,
         )
+        failed = [r for r in results if isinstance(r, BaseException)]
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, BaseException):
+                logger.warning("Air-quality upstream call for %d cells failed", len(chunk), exc_info=result)
+            else:
+                found.update(result)
+        if not found and failed and all(isinstance(r, ExecutorSaturated) for r in failed):
+            # Nothing to serve because of load shedding: let the endpoint answer 503
+            raise failed[0]
+        return [found[c] if c in found and found[c].n else None for c in cells]
+
+    def prewarm(self, points: Sequence[Tuple[float, float]]) -> int:
+        """
+        Blocking refresh of the cells of `points` (Celery beat), so map requests
+        find every cell cached. Returns the number of cells written.
+        """
+        cells = list(dict.fromkeys(snap(lat, lon) for lat, lon in points))
+        written = 0
+        for i in range(0, len(cells), UPSTREAM_BATCH):
+            chunk = cells[i:i + UPSTREAM_BATCH]
+            pipe = cache.sync.pipeline(transaction=False)
+            for c, series in zip(chunk, self._fetch_many(chunk)):
+                pipe.set(SERIES_KEY.format(lat=c[0], lon=c[1]), json.dumps(series.encode()), ex=SERIES_TTL_SECONDS)
+                written += 1
+            pipe.execute()
+        return written
+
+    def stats(self) -> dict:
+        return {"executor": self._executor.stats(), "single_flight": self._flight.stats()}
+
+    def close(self) -> None:
+        self._executor.shutdown()
 
-        payload = AirQualityResponse(
+    async def get_air_quality(self, lat: float, lon: float) -> AirQualityResponse:
+        series = await self.series(lat, lon)
+        return AirQualityResponse(
             updated_at=datetime.now(timezone.utc),
             lat=lat,
             lon=lon,
             provider="open-meteo",
-            observations=[point],
+            observations=[series.current()],
         )
-        await cache.set_json(cache_key, payload.model_dump(mode="json"), ttl_seconds=60 * 30)
-        return payload
 
-    def _fetch_hourly_dataframe(self, lat: float, lon: float) -> pd.DataFrame:
-        url = "https://air-quality-api.open-meteo.com/v1/air-quality"
-        params = {
-            "latitude": lat,
-            "longitude": lon,
-            "hourly": [
-                "pm2_5", "pm10", "carbon_monoxide", "carbon_dioxide",
-                "nitrogen_dioxide", "sulphur_dioxide", "ozone", "uv_index",
+    async def get_air_quality_grid(self, points: Sequence[GridPoint], source: str) -> AirQualityGridResponse:
+        """Current values of every point in one response."""
+        series = await self.series_many([(p.lat, p.lon) for p in points])
+        now = time.time()
+        return AirQualityGridResponse(
+            updated_at=datetime.now(timezone.utc),
+            provider="open-meteo",
+            source=source,
+            points=[
+                AirQualityGridPoint(
+                    id=p.id,
+                    name=p.name,
+                    lat=p.lat,
+                    lon=p.lon,
+                    observation=s.current(now) if s is not None else None,
+                )
+                for p, s in zip(points, series)
             ],
+        )
+
+    def _fetch_many(self, cells: Sequence[Cell]) -> List[AirQualitySeries]:
+        """One upstream call for all `cells`; responses come back in request order."""
+        params = {
+            "latitude": [c[0] for c in cells],
+            "longitude": [c[1] for c in cells],
+            "hourly": list(VARIABLES),
         }
-        responses = air_quality_service.openmeteo.weather_api(url, params=params)
-        response = responses[0]
-        hourly = response.Hourly()
-        hourly_pm2_5 = hourly.Variables(0).ValuesAsNumpy()
-        hourly_pm10 = hourly.Variables(1).ValuesAsNumpy()
-        hourly_carbon_monoxide = hourly.Variables(2).ValuesAsNumpy()
-        hourly_carbon_dioxide = hourly.Variables(3).ValuesAsNumpy()
-        hourly_nitrogen_dioxide = hourly.Variables(4).ValuesAsNumpy()
-        hourly_sulphur_dioxide = hourly.Variables(5).ValuesAsNumpy()
-        hourly_ozone = hourly.Variables(6).ValuesAsNumpy()
-        hourly_uv_index = hourly.Variables(7).ValuesAsNumpy()
-
-        hourly_data = {"date": pd.date_range(
-            start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
-            end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
-            freq=pd.Timedelta(seconds=hourly.Interval()),
-            inclusive="left"
-        )}
-        hourly_data["pm2_5"] = hourly_pm2_5
-        hourly_data["pm10"] = hourly_pm10
-        hourly_data["carbon_monoxide"] = hourly_carbon_monoxide
-        hourly_data["carbon_dioxide"] = hourly_carbon_dioxide
-        hourly_data["nitrogen_dioxide"] = hourly_nitrogen_dioxide
-        hourly_data["sulphur_dioxide"] = hourly_sulphur_dioxide
-        hourly_data["ozone"] = hourly_ozone
-        hourly_data["uv_index"] = hourly_uv_index
-
-        hourly_dataframe = pd.DataFrame(data=hourly_data)
-        hourly_dataframe = hourly_dataframe.replace({np.nan: None, np.inf: None, -np.inf: None})
-
-        return hourly_dataframe
-    
-    async def get_air_quality_hourly(self, lat: float, lon: float) -> list[AirQualityPoint]:
-        cache_key = f"airq:hourly:{round(lat,3)}:{round(lon,3)}"
-        cached = await cache.get_json(cache_key)
-        if cached:
-            return [AirQualityPoint.model_validate(row) for row in cached]
+        responses = self.openmeteo.weather_api(AIR_QUALITY_URL, params=params)
+        out = []
+        for response in responses:
+            hourly = response.Hourly()
+            out.append(AirQualitySeries.from_arrays(
+                t0=hourly.Time(),
+                step=hourly.Interval(),
+                columns=[hourly.Variables(i).ValuesAsNumpy() for i in range(len(VARIABLES))],
+            ))
+        return out
 
-        df = await asyncio.get_event_loop().run_in_executor(
-            None, self._fetch_hourly_dataframe, lat, lon
-        )
-        if df.empty:
+    def _fetch_series(self, lat: float, lon: float) -> AirQualitySeries:
+        series = self._fetch_many([(lat, lon)])[0]
+        if series.n == 0:
             raise Exception("No air quality data returned from Open-Meteo.")
+        return series
 
-        points = []
-        for _, row in df.iterrows():
-            points.append(AirQualityPoint(
-                time=row["date"].to_pydatetime(),
-                pm2_5=row["pm2_5"],
-                pm10=row["pm10"],
-                carbon_monoxide=row["carbon_monoxide"],
-                carbon_dioxide=row["carbon_dioxide"],
-                nitrogen_dioxide=row["nitrogen_dioxide"],
-                sulphur_dioxide=row["sulphur_dioxide"],
-                ozone=row["ozone"],
-                uv_index=row["uv_index"],
-            ))
-        # Cache as list of dicts
-        await cache.set_json(cache_key, [p.model_dump(mode="json") for p in points], ttl_seconds=60 * 30)
-        return points
+    async def get_air_quality_hourly(self, lat: float, lon: float) -> list[dict]:
+        """Hourly points as JSON-ready dicts shaped like AirQualityPoint."""
+        series = await self.series(lat, lon)
+        return series.rows()
 
-air_quality_service = AirQualityService()
\ No newline at end of file
+air_quality_service = AirQualityService()
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def _comarca_id(code: str) -> Optional[int]:
+    """Meteocat idComarca of a comarca code ("01" -> 1); None for non-numeric codes."""
+    try:
+        return int(code)
+    except ValueError:
+        return None
+
+
+def build_level_index(episodes: List[Dict[str, Any]], codes: Sequence[str], day: str) -> Dict[str, Any]:
+    """
+    Maximum warning `perill` and `nivell` per period and comarca.
+
+    Rows of `perill`/`nivell` follow `periods` (first-seen order); columns follow
+    `codes`, i.e. the /comarcas/geojson feature order. 0 means no warning.
+    `afectacions[p]` lists every affectation of period p as
+    [column, perill, nivell, llindar], for tooltips. Affectations of comarques
+    not in `codes` are ignored.
+    """
+    pos = {cid: i for i, code in enumerate(codes) if (cid := _comarca_id(code)) is not None}
+    periods: Dict[str, int] = {}
+    rows: List[int] = []
+    cols: List[int] = []
+    perill: List[int] = []
+    nivell: List[int] = []
+    details: List[List[list]] = []
+    for ep in episodes:
+        for avis in ep.get("avisos") or ():
+            for evolucio in avis.get("evolucions") or ():
+                for periode in evolucio.get("periodes") or ():
+                    p = periods.setdefault(periode["nom"], len(periods))
+                    if p == len(details):
+                        details.append([])
+                    for af in periode.get("afectacions") or ():
+                        i = pos.get(af.get("idComarca"))
+                        if i is None:
+                            continue
+                        rows.append(p)
+                        cols.append(i)
+                        perill.append(af.get("perill") or 0)
+                        nivell.append(af.get("nivell") or 0)
+                        details[p].append([i, perill[-1], nivell[-1], af.get("llindar")])
+
+    shape = (len(periods), len(codes))
+    max_perill = np.zeros(shape, dtype=np.int16)
+    max_nivell = np.zeros(shape, dtype=np.int16)
+    np.maximum.at(max_perill, (rows, cols), perill)
+    np.maximum.at(max_nivell, (rows, cols), nivell)
+    return {
+        "date": day,
+        "count": len(codes),
+        "periods": list(periods),
+        "perill": max_perill.tolist(),
+        "nivell": max_nivell.tolist(),
+        "afectacions": details,
+    }
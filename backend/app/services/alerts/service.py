@@ -1,19 +1,235 @@
-import os
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
 import httpx
+import redis
+from pydantic import TypeAdapter
+
+from app.core.config import settings
+from app.services.alerts.levels import build_level_index
 from app.services.alerts.schemas import EpisodiObert
+from app.services.cache import cache
+from app.services.concurrency import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+EPISODIS_URL = "https://api.meteo.cat/pronostic/v2/smp/episodis-oberts"
+META_KEY = "alerts:v1:episodis:{day}:meta"  # {"etag", "upstream_etag", "upstream_last_modified", "fetched_at"}
+BODY_KEY = "alerts:v1:episodis:{day}:body"  # validated episodes, serialized once
+LEVELS_KEY = "alerts:v2:levels:{day}"  # per-comarca level index, see levels.py
+CACHE_TTL_SECONDS = 3 * 24 * 3600
+PREFETCH_DAYS = 2  # today and tomorrow, the dates the alerts page offers
+LOCAL_TZ = ZoneInfo("Europe/Madrid")
+FETCH_TIMEOUT_SECONDS = 15.0
+
+_episodes = TypeAdapter(List[EpisodiObert])
+
+
+@dataclass(frozen=True)
+class CachedEpisodes:
+    """Response-ready episodes of one date: the JSON body and its ETag."""
+    etag: str
+    body: str
+
+
+def _etag(body: str) -> str:
+    return '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _codes_hash(codes: Sequence[str]) -> str:
+    return hashlib.sha256(",".join(codes).encode("utf-8")).hexdigest()[:16]
+
+
+def _levels_body(episodes_body: str, episodes_etag: str, codes: Sequence[str], day: date) -> str:
+    index = build_level_index(json.loads(episodes_body), codes, day.isoformat())
+    # The episodes ETag and column codes it was built from; a mismatch means the index is stale
+    index["source_etag"] = episodes_etag
+    index["codes_hash"] = _codes_hash(codes)
+    return json.dumps(index, separators=(",", ":"))
+
+
+def prefetch_dates(now: Optional[datetime] = None) -> List[date]:
+    today = (now or datetime.now(LOCAL_TZ)).astimezone(LOCAL_TZ).date()
+    return [today + timedelta(days=i) for i in range(PREFETCH_DAYS)]
+
 
 class AlertsService:
+    """
+    Meteocat open warning episodes, served from Redis.
+
+    The refresh_alerts task re-fetches the dates the UI shows with conditional
+    requests (If-None-Match / If-Modified-Since), validates the episodes once and
+    stores them pre-serialized with an ETag. Requests only reach api.meteo.cat for
+    a date that isn't cached, and concurrent misses for one date share the call.
+    """
+
+    def __init__(self) -> None:
+        self._client: Optional[httpx.AsyncClient] = None
+        self._flight = SingleFlight()
+
+    # ---- upstream ----
+
+    @staticmethod
+    def _request(day: date, meta: Optional[Dict[str, Any]]) -> Tuple[Dict[str, str], Dict[str, str]]:
+        params = {"data": f"{day:%Y-%m-%d}Z"}
+        headers = {"x-api-key": settings.meteocat_api_key} if settings.meteocat_api_key else {}
+        if meta:
+            if meta.get("upstream_etag"):
+                headers["If-None-Match"] = meta["upstream_etag"]
+            if meta.get("upstream_last_modified"):
+                headers["If-Modified-Since"] = meta["upstream_last_modified"]
+        return params, headers
+
+    @staticmethod
+    def _process(
+        resp: httpx.Response, meta: Optional[Dict[str, Any]]
+    ) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        New meta and body for an upstream response; body is None on 304 (unchanged).
+
+        Raises:
+            httpx.HTTPStatusError: upstream error status.
+            pydantic.ValidationError: unexpected payload.
+        """
+        if resp.status_code == 304 and meta:
+            return {**meta, "fetched_at": time.time()}, None
+        resp.raise_for_status()
+        body = _episodes.dump_json(_episodes.validate_json(resp.content)).decode("utf-8")
+        return {
+            "etag": _etag(body),
+            "upstream_etag": resp.headers.get("ETag"),
+            "upstream_last_modified": resp.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        }, body
+
+    async def _fetch(self, day: date) -> CachedEpisodes:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=FETCH_TIMEOUT_SECONDS)
+        params, headers = self._request(day, None)
+        resp = await self._client.get(EPISODIS_URL, params=params, headers=headers)
+        meta, body = self._process(resp, None)
+        try:
+            await cache.set_many(
+                {META_KEY.format(day=day): json.dumps(meta), BODY_KEY.format(day=day): body},
+                ttl_seconds=CACHE_TTL_SECONDS,
+            )
+        except redis.RedisError:
+            logger.warning("Could not cache alerts for %s", day)
+        return CachedEpisodes(etag=meta["etag"], body=body)
+
+    # ---- reads ----
+
+    async def get_cached(self, day: date) -> CachedEpisodes:
+        """
+        Episodes of `day` from Redis; only a date that isn't cached is fetched upstream.
+
+        Raises:
+            httpx.HTTPError: upstream failure for an uncached date.
+        """
+        try:
+            meta, body = await cache.get_many([META_KEY.format(day=day), BODY_KEY.format(day=day)])
+        except redis.RedisError:
+            logger.warning("Redis unavailable; fetching alerts for %s upstream", day)
+            meta = body = None
+        if meta and body is not None:
+            return CachedEpisodes(etag=json.loads(meta)["etag"], body=body)
+        return await self._flight.do(day, lambda: self._fetch(day))
+
     async def get_episodis_oberts(self, year: int, month: int, day: int) -> list[EpisodiObert]:
-        url = (
-            f"https://api.meteo.cat/pronostic/v2/smp/episodis-oberts"
-            f"?data={year:04d}-{month:02d}-{day:02d}Z"
-        )
-        api_key = os.environ.get("METEOCAT_API_KEY")
-        headers = {"x-api-key": api_key} if api_key else {}
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.get(url, headers=headers)
-            resp.raise_for_status()
-            data = resp.json()
-        return [EpisodiObert.model_validate(ep) for ep in data]
-
-alerts_service = AlertsService()
\ No newline at end of file
+        cached = await self.get_cached(date(year, month, day))
+        return _episodes.validate_json(cached.body)
+
+    async def get_levels(self, day: date, codes: Sequence[str]) -> CachedEpisodes:
+        """
+        Per-comarca level index of `day`, columns in `codes` order (the
+        /comarcas/geojson feature order). Built from the cached episodes when
+        missing or stale.
+
+        Raises:
+            httpx.HTTPError: upstream failure for an uncached date.
+        """
+        try:
+            meta, levels = await cache.get_many([META_KEY.format(day=day), LEVELS_KEY.format(day=day)])
+        except redis.RedisError:
+            meta = levels = None
+        if meta and levels:
+            head = json.loads(levels)
+            # Compare the codes themselves, not their number: a reload can swap comarques
+            if head.get("source_etag") == json.loads(meta)["etag"] and head.get("codes_hash") == _codes_hash(codes):
+                return CachedEpisodes(etag=_etag(levels), body=levels)
+
+        episodes = await self.get_cached(day)
+        levels = _levels_body(episodes.body, episodes.etag, codes, day)
+        try:
+            await cache.set_many({LEVELS_KEY.format(day=day): levels}, ttl_seconds=CACHE_TTL_SECONDS)
+        except redis.RedisError:
+            logger.warning("Could not cache alert levels for %s", day)
+        return CachedEpisodes(etag=_etag(levels), body=levels)
+
+    # ---- background refresh (Celery) ----
+
+    def refresh(
+        self,
+        client: httpx.Client,
+        days: Optional[List[date]] = None,
+        codes: Optional[Sequence[str]] = None,
+    ) -> Dict[str, str]:
+        """
+        Conditionally re-fetch `days` (default: prefetch_dates()) into the cache.
+        A failed date keeps its previous entry. With `codes` (comarca feature
+        order) the per-comarca level index is rebuilt alongside the episodes.
+
+        Returns:
+            {date: "updated" | "not_modified" | "failed"}
+        """
+        r = cache.sync
+        out: Dict[str, str] = {}
+        for day in days or prefetch_dates():
+            pipe = r.pipeline(transaction=False)
+            pipe.get(META_KEY.format(day=day))
+            pipe.exists(BODY_KEY.format(day=day))
+            raw, has_body = pipe.execute()
+            # Only revalidate when there is a body to keep on 304
+            meta = json.loads(raw) if raw and has_body else None
+            params, headers = self._request(day, meta)
+            try:
+                meta, body = self._process(client.get(EPISODIS_URL, params=params, headers=headers), meta)
+            except Exception:
+                logger.warning("Alerts refresh failed for %s", day, exc_info=True)
+                out[day.isoformat()] = "failed"
+                continue
+            levels_key = LEVELS_KEY.format(day=day)
+            pipe = r.pipeline(transaction=False)
+            pipe.set(META_KEY.format(day=day), json.dumps(meta), ex=CACHE_TTL_SECONDS)
+            if body is None:
+                pipe.expire(BODY_KEY.format(day=day), CACHE_TTL_SECONDS)
+                if codes is not None:
+                    pipe.expire(levels_key, CACHE_TTL_SECONDS)
+            else:
+                pipe.set(BODY_KEY.format(day=day), body, ex=CACHE_TTL_SECONDS)
+                if codes is not None:
+                    pipe.set(levels_key, _levels_body(body, meta["etag"], codes, day), ex=CACHE_TTL_SECONDS)
+            results = pipe.execute()
+            if body is None and codes is not None and not results[-1]:
+                # Unchanged episodes but no index yet (e.g. first run after deploy)
+                cached = r.get(BODY_KEY.format(day=day))
+                if cached is not None:
+                    r.set(levels_key, _levels_body(cached, meta["etag"], codes, day), ex=CACHE_TTL_SECONDS)
+            out[day.isoformat()] = "not_modified" if body is None else "updated"
+        return out
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+alerts_service = AlertsService()
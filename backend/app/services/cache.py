@@ -3,23 +3,46 @@ from __future__ import annotations
 import json
 from typing import Any, Optional
 
-import redis.asyncio as redis
+import redis
+import redis.asyncio as aioredis
 
 from app.core.config import settings
 
 
 class RedisCache:
     def __init__(self) -> None:
-        self._redis: Optional[redis.Redis] = None
+        self._redis: Optional[aioredis.Redis] = None
+        self._sync: Optional[redis.Redis] = None
+        self._sync_bytes: Optional[redis.Redis] = None
 
     async def connect(self) -> None:
         if self._redis is None:
-            self._redis = redis.from_url(settings.redis_url, decode_responses=True)
+            self._redis = aioredis.from_url(settings.redis_url, decode_responses=True)
+
+    @property
+    def sync(self) -> redis.Redis:
+        """Blocking client for sync endpoints and Celery tasks."""
+        if self._sync is None:
+            self._sync = redis.from_url(settings.redis_url, decode_responses=True)
+        return self._sync
+
+    @property
+    def sync_bytes(self) -> redis.Redis:
+        """Blocking client that returns raw bytes, for binary values (vector tiles)."""
+        if self._sync_bytes is None:
+            self._sync_bytes = redis.from_url(settings.redis_url)
+        return self._sync_bytes
 
     async def close(self) -> None:
         if self._redis is not None:
             await self._redis.close()
             self._redis = None
+        if self._sync is not None:
+            self._sync.close()
+            self._sync = None
+        if self._sync_bytes is not None:
+            self._sync_bytes.close()
+            self._sync_bytes = None
 
     async def get_json(self, key: str) -> Optional[Any]:
         await self.connect()
@@ -39,5 +62,37 @@ class RedisCache:
         assert self._redis is not None
         await self._redis.delete(key)
 
+    async def publish(self, channel: str, message: Any) -> None:
+        await self.connect()
+        assert self._redis is not None
+        await self._redis.publish(channel, json.dumps(message))
+
+    async def get_many(self, keys: list[str]) -> list[Optional[str]]:
+        await self.connect()
+        assert self._redis is not None
+        return await self._redis.mget(keys)
+
+    async def set_many(self, mapping: dict[str, str], ttl_seconds: int) -> None:
+        """SET every key of `mapping` (raw strings) with one pipelined round trip."""
+        await self.connect()
+        assert self._redis is not None
+        pipe = self._redis.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipe.set(key, value, ex=ttl_seconds)
+        await pipe.execute()
+
+    async def set_many_json(self, mapping: dict[str, Any], ttl_seconds: int) -> None:
+        await self.set_many({key: json.dumps(value) for key, value in mapping.items()}, ttl_seconds)
+
+    async def zadd(self, key: str, mapping: dict[str, float]) -> None:
+        await self.connect()
+        assert self._redis is not None
+        await self._redis.zadd(key, mapping)
+
+    async def pubsub(self) -> aioredis.client.PubSub:
+        await self.connect()
+        assert self._redis is not None
+        return self._redis.pubsub()
+
 
 cache = RedisCache()
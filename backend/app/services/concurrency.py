@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls per key: the first caller starts the work, callers
+    arriving while it runs await the same task. Nothing is cached once it finishes.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._stats: Dict[str, int] = {"calls": 0, "started": 0, "coalesced": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        self._stats["calls"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self._stats["started"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+        else:
+            self._stats["coalesced"] += 1
+        # A caller that disconnects must not cancel the call the others wait on
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "in_flight": len(self._inflight)}
+
+
+class ExecutorSaturated(RuntimeError):
+    """The executor's queue is full; the caller should shed the request."""
+
+
+class BoundedExecutor:
+    """
+    Dedicated thread pool for blocking upstream SDK calls.
+
+    At most `max_workers` calls run at once and at most `max_queue` wait for a
+    thread; beyond that `run` raises ExecutorSaturated instead of queueing
+    without bound. Queue depth and the time calls wait for a thread are tracked
+    for /metrics.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._stats: Dict[str, float] = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "last_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "total_wait_ms": 0.0,
+            "total_run_ms": 0.0,
+        }
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        with self._lock:
+            # Calls submitted but not picked up yet, minus those an idle thread is about to take
+            waiting = self._queued - max(0, self.max_workers - self._running)
+            if waiting >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise ExecutorSaturated(f"{self.name}: {waiting} calls already waiting")
+            self._queued += 1
+            self._stats["submitted"] += 1
+        submitted_at = time.perf_counter()
+
+        def call() -> T:
+            started_at = time.perf_counter()
+            wait_ms = (started_at - submitted_at) * 1000.0
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._stats["last_wait_ms"] = wait_ms
+                self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+                self._stats["total_wait_ms"] += wait_ms
+            ok = False
+            try:
+                result = fn(*args)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._stats["completed" if ok else "failed"] += 1
+                    self._stats["total_run_ms"] += (time.perf_counter() - started_at) * 1000.0
+
+        future = self._pool.submit(call)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _on_done(self, future) -> None:
+        # A future cancelled while queued never ran `call`, so it still counts as queued
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            done = self._stats["completed"] + self._stats["failed"]
+            started = self._stats["submitted"] - self._queued
+            return {
+                **self._stats,
+                "queue_depth": self._queued,
+                "queue_capacity": self.max_queue,
+                "running": self._running,
+                "workers": self.max_workers,
+                "avg_wait_ms": self._stats["total_wait_ms"] / started if started else 0.0,
+                "avg_run_ms": self._stats["total_run_ms"] / done if done else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import brotli
+import orjson
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.geo.service import comarca_service
+
+# Zoom levels with a precomputed payload; a request is served the finest level
+# not above its zoom (or the coarsest one below it).
+ZOOM_LEVELS = (6, 8, 10, 12)
+DEFAULT_ZOOM = 8  # the comarca maps open at zoom 8
+STORE_TTL_SECONDS = 300
+
+
+def pixel_degrees(zoom: int) -> float:
+    """Width of a 256px web-mercator tile pixel in degrees of longitude."""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def simplify_tolerance(zoom: int) -> float:
+    """Half a pixel: vertices removed at this tolerance don't move a rendered edge."""
+    return pixel_degrees(zoom) / 2
+
+
+def coordinate_digits(zoom: int) -> int:
+    """Decimals that keep rounding error under a tenth of a pixel."""
+    return math.ceil(-math.log10(pixel_degrees(zoom) / 10))
+
+
+def level_for(zoom: Optional[int]) -> int:
+    if zoom is None:
+        return DEFAULT_ZOOM
+    return max([z for z in ZOOM_LEVELS if z <= zoom], default=ZOOM_LEVELS[0])
+
+
+# Feature order must match comarca_service.feature_codes() (ORDER BY code)
+_LEVEL_SQL = text("""
+    SELECT code, name,
+           ST_AsGeoJSON(ST_SimplifyPreserveTopology(ST_Transform(geom, 4326), :tolerance), :digits) AS geojson
+    FROM comarcas
+    ORDER BY code
+""")
+
+_UPSERT_SQL = text("""
+    INSERT INTO comarca_geometry_levels (zoom, etag, size, gzip, br, built_at)
+    VALUES (:zoom, :etag, :size, :gzip, :br, now())
+    ON CONFLICT (zoom)
+    DO UPDATE SET etag = EXCLUDED.etag, size = EXCLUDED.size, gzip = EXCLUDED.gzip,
+                  br = EXCLUDED.br, built_at = EXCLUDED.built_at
+""")
+
+
+@dataclass(frozen=True)
+class GeometryPayload:
+    """FeatureCollection of one zoom level, compressed once."""
+    zoom: int
+    etag: str
+    size: int
+    gzip: bytes
+    br: bytes
+
+
+def render_level(session: Session, zoom: int) -> bytes:
+    """
+    Comarca FeatureCollection simplified for `zoom`. PostGIS geometry JSON is
+    spliced in as-is instead of being parsed and re-serialized.
+    """
+    params = {"tolerance": simplify_tolerance(zoom), "digits": coordinate_digits(zoom)}
+    parts: List[bytes] = []
+    for row in session.execute(_LEVEL_SQL, params).fetchall():
+        props = orjson.dumps({"code": row.code, "name": row.name})
+        parts.append(b'{"type":"Feature","geometry":' + row.geojson.encode("utf-8") + b',"properties":' + props + b"}")
+    return b'{"type":"FeatureCollection","features":[' + b",".join(parts) + b"]}"
+
+
+def compress_level(zoom: int, body: bytes) -> GeometryPayload:
+    return GeometryPayload(
+        zoom=zoom,
+        etag='"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+        size=len(body),
+        gzip=gzip.compress(body, compresslevel=9, mtime=0),
+        br=brotli.compress(body, quality=11, mode=brotli.MODE_TEXT),
+    )
+
+
+def build_geometry_levels(session: Session) -> List[GeometryPayload]:
+    """Simplify, serialize and compress every zoom level and store them. Run after loading comarcas."""
+    payloads = [compress_level(z, render_level(session, z)) for z in ZOOM_LEVELS]
+    for p in payloads:
+        session.execute(_UPSERT_SQL, {"zoom": p.zoom, "etag": p.etag, "size": p.size, "gzip": p.gzip, "br": p.br})
+    session.commit()
+    geometry_store.clear()
+    comarca_service.clear_feature_codes()
+    return payloads
+
+
+class GeometryStore:
+    """
+    Stored payloads, cached in process. Levels missing from the table (comarcas
+    loaded before the table existed) are built on first request.
+    """
+
+    def __init__(self) -> None:
+        self._levels: Dict[int, GeometryPayload] = {}
+        self._loaded_at = 0.0
+
+    def _load(self, session: Session) -> None:
+        rows = session.execute(text("SELECT zoom, etag, size, gzip, br FROM comarca_geometry_levels")).fetchall()
+        levels = {
+            r.zoom: GeometryPayload(zoom=r.zoom, etag=r.etag, size=r.size, gzip=bytes(r.gzip), br=bytes(r.br))
+            for r in rows
+        }
+        if {z: p.etag for z, p in levels.items()} != {z: p.etag for z, p in self._levels.items()}:
+            # Rebuilt by another process (comarcas reloaded): re-read the feature codes
+            # too, so per-comarca arrays stay aligned with the served features
+            comarca_service.clear_feature_codes()
+        self._levels = levels
+        self._loaded_at = time.time()
+
+    def get(self, session: Session, zoom: Optional[int]) -> GeometryPayload:
+        level = level_for(zoom)
+        if time.time() - self._loaded_at > STORE_TTL_SECONDS:
+            self._load(session)
+        if level not in self._levels:
+            self._levels = {p.zoom: p for p in build_geometry_levels(session)}
+            self._loaded_at = time.time()
+        return self._levels[level]
+
+    def clear(self) -> None:
+        self._levels = {}
+        self._loaded_at = 0.0
+
+
+geometry_store = GeometryStore()
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
+import time
 from dataclasses import dataclass
-from typing import Optional
+from typing import List, Optional
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.models import Comarca
@@ -13,7 +14,30 @@ class ComarcaLookupResult:
     name: str
 
 
+# Feature order of /comarcas/geojson. Per-comarca arrays (e.g. the alert level
+# index) are aligned with it, so both must read codes in this order.
+FEATURE_CODES_SQL = text("SELECT code FROM comarcas ORDER BY code")
+FEATURE_CODES_TTL_SECONDS = 3600
+
+
 class ComarcaService:
+    def __init__(self) -> None:
+        self._feature_codes: Optional[List[str]] = None
+        self._feature_codes_at = 0.0
+
+    def feature_codes(self, session) -> List[str]:
+        """Comarca codes in /comarcas/geojson feature order (cached in process)."""
+        now = time.time()
+        if self._feature_codes is None or now - self._feature_codes_at > FEATURE_CODES_TTL_SECONDS:
+            self._feature_codes = [r[0] for r in session.execute(FEATURE_CODES_SQL).fetchall()]
+            self._feature_codes_at = now
+        return self._feature_codes
+
+    def clear_feature_codes(self) -> None:
+        """Drop the cached codes; call when the comarcas table changes."""
+        self._feature_codes = None
+        self._feature_codes_at = 0.0
+
     def list_comarcas(self, session: AsyncSession) -> list[ComarcaLookupResult]:
         res = session.execute(select(Comarca.code, Comarca.name).order_by(Comarca.name.asc()))
         return [ComarcaLookupResult(code=r[0], name=r[1]) for r in res.all()]
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict
+
+import redis
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.services.cache import cache
+
+logger = logging.getLogger(__name__)
+
+MAX_ZOOM = 22
+EXTENT = 4096   # tile coordinate grid; ST_AsMVTGeom quantizes to it, so precision follows the zoom
+BUFFER = 64     # clip margin in tile units, so strokes and labels don't break at tile edges
+WEB_MERCATOR_WIDTH_M = 40075016.68557849
+
+VERSION_KEY = "tiles:v1:version:{layer}"  # bumped by layer_changed()
+TILE_KEY = "tiles:v1:{layer}:{version}:{z}:{x}:{y}"
+LRU_KEY = "tiles:v1:lru"  # tile key -> last access (unix seconds)
+
+_ENVELOPE = f"""
+    bounds AS (
+        SELECT ST_TileEnvelope(:z, :x, :y) AS tile,
+               ST_Transform(ST_TileEnvelope(:z, :x, :y, margin => {BUFFER / EXTENT}), 4326) AS filter
+    )
+"""
+
+# Each query returns one bytea: the layer's features in tile (z, x, y)
+LAYER_SQL = {
+    "comarcas": text(f"""
+        WITH {_ENVELOPE}
+        SELECT ST_AsMVT(t, 'comarcas', {EXTENT}, 'geom') FROM (
+            SELECT c.code, c.name,
+                   ST_AsMVTGeom(
+                       ST_SimplifyPreserveTopology(ST_Transform(c.geom, 3857), :tolerance),
+                       b.tile, {EXTENT}, {BUFFER}, true
+                   ) AS geom
+            FROM comarcas c, bounds b
+            WHERE c.geom && b.filter
+        ) t
+        WHERE t.geom IS NOT NULL
+    """),
+    "activities": text(f"""
+        WITH {_ENVELOPE}
+        SELECT ST_AsMVT(t, 'activities', {EXTENT}, 'geom') FROM (
+            SELECT a.id::text AS id, a.name, a.category, a.indoor, a.covered, a.validated,
+                   ST_AsMVTGeom(ST_Transform(a.location::geometry, 3857), b.tile, {EXTENT}, {BUFFER}, true) AS geom
+            FROM activities a, bounds b
+            WHERE a.location && b.filter::geography
+        ) t
+        WHERE t.geom IS NOT NULL
+    """),
+    "meteocat_stations": text(f"""
+        WITH {_ENVELOPE}
+        SELECT ST_AsMVT(t, 'meteocat_stations', {EXTENT}, 'geom') FROM (
+            SELECT s.codi, s.nom, s.altitud,
+                   ST_AsMVTGeom(
+                       ST_Transform(ST_SetSRID(ST_MakePoint(s.longitud, s.latitud), 4326), 3857),
+                       b.tile, {EXTENT}, {BUFFER}, true
+                   ) AS geom
+            FROM meteocat_stations s, bounds b
+            WHERE s.latitud IS NOT NULL AND s.longitud IS NOT NULL
+              AND ST_SetSRID(ST_MakePoint(s.longitud, s.latitud), 4326) && b.filter
+        ) t
+        WHERE t.geom IS NOT NULL
+    """),
+}
+LAYERS = tuple(LAYER_SQL)
+
+
+@dataclass(frozen=True)
+class Tile:
+    data: bytes  # empty when the tile has no features
+
+    @property
+    def etag(self) -> str:
+        # From the contents, not the layer version: the version counter restarts
+        # at 0 if its Redis key is lost, and would then validate stale tiles
+        return '"' + hashlib.blake2b(self.data, digest_size=8).hexdigest() + '"'
+
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def render_tile(session: Session, layer: str, z: int, x: int, y: int) -> bytes:
+    # Half a tile pixel in metres: simplification below it is invisible after quantization
+    tolerance = WEB_MERCATOR_WIDTH_M / 2 ** z / EXTENT / 2
+    data = session.execute(LAYER_SQL[layer], {"z": z, "x": x, "y": y, "tolerance": tolerance}).scalar()
+    return bytes(data) if data else b""
+
+
+class TileCache:
+    """
+    Rendered tiles in Redis, keyed by a per-layer version that write paths bump
+    through layer_changed(): a change makes every cached tile of the layer
+    unreachable at once. Access times are tracked in a sorted set and the least
+    recently used tiles are evicted beyond TILE_CACHE_MAX_TILES; superseded
+    versions age out the same way (and through their TTL).
+    """
+
+    def __init__(self) -> None:
+        self._stats: Dict[str, int] = {"hits": 0, "misses": 0, "evicted": 0, "errors": 0}
+
+    def get(self, session: Session, layer: str, z: int, x: int, y: int) -> Tile:
+        r = cache.sync_bytes
+        try:
+            raw_version = r.get(VERSION_KEY.format(layer=layer))
+            version = int(raw_version) if raw_version else 0
+            key = TILE_KEY.format(layer=layer, version=version, z=z, x=x, y=y)
+            pipe = r.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.zadd(LRU_KEY, {key: time.time()}, xx=True)
+            data, _ = pipe.execute()
+        except redis.RedisError:
+            logger.warning("Redis unavailable; rendering tile %s/%s/%s/%s uncached", layer, z, x, y)
+            self._stats["errors"] += 1
+            return Tile(data=render_tile(session, layer, z, x, y))
+
+        if data is not None:
+            self._stats["hits"] += 1
+            return Tile(data=data)
+
+        self._stats["misses"] += 1
+        data = render_tile(session, layer, z, x, y)
+        try:
+            self._store(r, key, data)
+        except redis.RedisError:
+            self._stats["errors"] += 1
+            logger.warning("Could not cache tile %s", key)
+        return Tile(data=data)
+
+    def _store(self, r: redis.Redis, key: str, data: bytes) -> None:
+        pipe = r.pipeline(transaction=False)
+        pipe.set(key, data, ex=settings.tile_cache_ttl_seconds)
+        pipe.zadd(LRU_KEY, {key: time.time()})
+        pipe.zcard(LRU_KEY)
+        size = pipe.execute()[-1]
+        excess = size - settings.tile_cache_max_tiles
+        if excess > 0:
+            evicted = [k for k, _ in r.zpopmin(LRU_KEY, excess)]
+            if evicted:
+                r.delete(*evicted)
+                self._stats["evicted"] += len(evicted)
+
+    def layer_changed(self, layer: str) -> None:
+        """Invalidate every cached tile of `layer`; call after its source rows change."""
+        try:
+            cache.sync.incr(VERSION_KEY.format(layer=layer))
+        except redis.RedisError:
+            logger.warning("Could not invalidate %s tiles", layer)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+
+tile_cache = TileCache()
@@ -19,6 +19,7 @@ from app.db.models import (
     StationVariable, 
     StationVariableValue
 )
+from app.services.geo.tiles import tile_cache
 
 
 def _as_float(v) -> Optional[float]:
@@ -113,7 +114,8 @@ class MeteocatClient:
                     )
                     db.add(obj)
                 db.commit()
-            
+        tile_cache.layer_changed("meteocat_stations")
+
     async def fetch_station_measured_data(
         self, codi_estacio: str, any: int, mes: int, dia: int
     ) -> list[dict]:
@@ -1,4 +1,5 @@
 from .service import MLRecommender, recommend
-from .features import fetch_weather_slice
+from .weather_grid import WeatherUnavailable, fetch_weather_slice
+from .registry import ModelRegistry, model_registry
 
-__all__ = ["MLRecommender", "recommend"]
\ No newline at end of file
+__all__ = ["MLRecommender", "recommend", "ModelRegistry", "model_registry"]
\ No newline at end of file
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from uuid import UUID
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import svds
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Implicit feedback strength per event type; views carry no preference signal.
+INTERACTION_WEIGHTS: Dict[str, float] = {"click": 1.0, "save": 3.0, "complete": 5.0}
+SNAPSHOT_GLOB = "cf-*.npz"
+CHECK_INTERVAL_SECONDS = 60.0
+
+INTERACTIONS_SQL = text("""
+    SELECT
+      user_id::text AS user_id,
+      activity_id::text AS activity_id,
+      sum(CASE event_type
+            WHEN 'click' THEN :w_click
+            WHEN 'save' THEN :w_save
+            WHEN 'complete' THEN :w_complete
+          END)::float AS weight
+    FROM events
+    WHERE event_type IN ('click', 'save', 'complete')
+      AND activity_id IS NOT NULL
+      AND ts >= :since AND ts < :until
+    GROUP BY user_id, activity_id
+""")
+
+
+@dataclass(frozen=True)
+class Embeddings:
+    """
+    One factorization of the user x activity interaction matrix.
+
+    user_vecs @ activity_vecs.T approximates the (log-scaled) interaction
+    strength; it is only trained on events before `data_until`.
+    """
+    data_until: datetime
+    user_ids: np.ndarray       # (n_users,) str
+    activity_ids: np.ndarray   # (n_activities,) str
+    user_vecs: np.ndarray      # (n_users, rank) float32
+    activity_vecs: np.ndarray  # (n_activities, rank) float32
+    user_pos: Dict[str, int] = field(init=False, repr=False, compare=False)
+    activity_pos: Dict[str, int] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "user_pos", {u: i for i, u in enumerate(self.user_ids.tolist())})
+        object.__setattr__(self, "activity_pos", {a: i for i, a in enumerate(self.activity_ids.tolist())})
+
+    @property
+    def version(self) -> str:
+        return f"{self.data_until:%Y%m%dT%H%M%S}"
+
+    @property
+    def rank(self) -> int:
+        return int(self.user_vecs.shape[1])
+
+    def save(self, path: Path) -> None:
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                data_until=np.array(self.data_until.isoformat()),
+                user_ids=self.user_ids.astype(str),
+                activity_ids=self.activity_ids.astype(str),
+                user_vecs=self.user_vecs,
+                activity_vecs=self.activity_vecs,
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "Embeddings":
+        with np.load(path, allow_pickle=False) as z:
+            return cls(
+                data_until=datetime.fromisoformat(str(z["data_until"])),
+                user_ids=z["user_ids"],
+                activity_ids=z["activity_ids"],
+                user_vecs=z["user_vecs"].astype(np.float32, copy=False),
+                activity_vecs=z["activity_vecs"].astype(np.float32, copy=False),
+            )
+
+    def pair_scores(self, user_ids: Sequence[str], activity_ids: Sequence[str]) -> np.ndarray:
+        """Row-wise user . activity dot products; NaN where either side has no embedding."""
+        ui = np.fromiter((self.user_pos.get(u, -1) for u in user_ids), dtype=np.intp, count=len(user_ids))
+        ai = np.fromiter((self.activity_pos.get(a, -1) for a in activity_ids), dtype=np.intp, count=len(activity_ids))
+        out = np.full(len(ui), np.nan, dtype=np.float32)
+        known = (ui >= 0) & (ai >= 0)
+        out[known] = np.einsum("ij,ij->i", self.user_vecs[ui[known]], self.activity_vecs[ai[known]])
+        return out
+
+
+def factorize(
+    user_ids: np.ndarray,
+    activity_ids: np.ndarray,
+    weights: np.ndarray,
+    rank: int,
+    seed: int = 42,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Truncated SVD of the sparse user x activity matrix with log1p-scaled weights.
+
+    Returns:
+        (user ids, activity ids, user vectors, activity vectors). Vectors are
+        float32 and carry sqrt of the singular values on both sides, so their
+        dot product is the rank-`rank` reconstruction of the matrix.
+    """
+    users, ui = np.unique(user_ids, return_inverse=True)
+    activities, ai = np.unique(activity_ids, return_inverse=True)
+    M = csr_matrix(
+        (np.log1p(weights.astype(np.float64)), (ui, ai)),
+        shape=(len(users), len(activities)),
+    )
+    k = min(rank, min(M.shape) - 1)
+    if k < 1:
+        raise ValueError(f"Interaction matrix {M.shape} is too small to factorize")
+    U, s, Vt = svds(M, k=k, random_state=seed)
+    root = np.sqrt(s)
+    return (
+        users,
+        activities,
+        (U * root).astype(np.float32),
+        (Vt.T * root).astype(np.float32),
+    )
+
+
+def build_embeddings(engine: Engine, until: datetime, lookback_days: int, rank: int) -> Embeddings:
+    """Factorize clicks/saves/completions in [until - lookback_days, until)."""
+    df = pd.read_sql(
+        INTERACTIONS_SQL,
+        engine,
+        params={
+            "since": until - timedelta(days=lookback_days),
+            "until": until,
+            **{f"w_{k}": v for k, v in INTERACTION_WEIGHTS.items()},
+        },
+    )
+    users, activities, U, V = factorize(
+        df["user_id"].to_numpy(str), df["activity_id"].to_numpy(str), df["weight"].to_numpy(), rank
+    )
+    return Embeddings(data_until=until, user_ids=users, activity_ids=activities, user_vecs=U, activity_vecs=V)
+
+
+# ---- snapshots on disk ----
+
+
+def list_snapshots(root: Union[str, Path]) -> List[Path]:
+    """Snapshot files, oldest first (file names sort by data_until)."""
+    return sorted(Path(root).glob(SNAPSHOT_GLOB))
+
+
+def publish_snapshot(emb: Embeddings, root: Union[str, Path], keep: int) -> Path:
+    """
+    Write `emb` as the newest snapshot and drop all but the last `keep`.
+    Older snapshots stay around so training can look features up as of each impression.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    path = root / f"cf-{emb.version}.npz"
+    tmp = path.with_name(f".{path.name}.tmp")
+    emb.save(tmp)
+    os.replace(tmp, path)
+    for old in list_snapshots(root)[:-keep]:
+        old.unlink(missing_ok=True)
+    return path
+
+
+class EmbeddingHistory:
+    """All snapshots on disk, for point-in-time lookups while building training data."""
+
+    def __init__(self, root: Union[str, Path]):
+        self.snapshots = [Embeddings.load(p) for p in list_snapshots(root)]
+        self._untils = np.array(
+            [s.data_until.timestamp() for s in self.snapshots], dtype=np.float64
+        )
+
+    def lookup(self, user_ids: pd.Series, activity_ids: pd.Series, ts: pd.Series) -> np.ndarray:
+        """
+        cf_score of each impression from the newest snapshot trained only on
+        events before it; NaN when there is none (what serving saw then).
+        """
+        out = np.full(len(ts), np.nan, dtype=np.float32)
+        if not self.snapshots:
+            return out
+        seconds = pd.to_datetime(ts, utc=True).to_numpy(dtype="datetime64[ns]").astype(np.int64) / 1e9
+        which = np.searchsorted(self._untils, seconds, side="right") - 1
+        users = user_ids.to_numpy(str)
+        activities = activity_ids.to_numpy(str)
+        for s in np.unique(which[which >= 0]).tolist():
+            rows = np.flatnonzero(which == s)
+            out[rows] = self.snapshots[s].pair_scores(users[rows], activities[rows])
+        return out
+
+
+class EmbeddingStore:
+    """
+    The newest snapshot, resident in memory, plus its rows aligned to the
+    activity index so per-request scoring is one gather and one matmul.
+    New snapshots published by the worker are picked up within
+    CHECK_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._current: Optional[Embeddings] = None
+        self._path: Optional[Path] = None
+        self._checked_at = 0.0
+        self._aligned: Optional[Tuple[object, Embeddings, np.ndarray]] = None
+
+    @property
+    def current(self) -> Optional[Embeddings]:
+        self.ensure_fresh()
+        return self._current
+
+    def ensure_fresh(self) -> None:
+        if time.monotonic() - self._checked_at < CHECK_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            if time.monotonic() - self._checked_at < CHECK_INTERVAL_SECONDS:
+                return
+            self._checked_at = time.monotonic()
+            snapshots = list_snapshots(self.root)
+            if not snapshots or snapshots[-1] == self._path:
+                return
+            try:
+                self._current = Embeddings.load(snapshots[-1])
+                self._path = snapshots[-1]
+            except Exception:
+                logger.warning("Could not load embeddings %s; keeping the previous ones", snapshots[-1], exc_info=True)
+
+    @property
+    def version(self) -> Optional[str]:
+        """Version of the snapshot scores come from; None when there is none."""
+        emb = self.current
+        return emb.version if emb is not None else None
+
+    def _activity_rows(self, cols, emb: Embeddings) -> np.ndarray:
+        """Embedding row of every activity in an index snapshot (-1 if it has none)."""
+        aligned = self._aligned
+        if aligned is not None and aligned[0] is cols and aligned[1] is emb:
+            return aligned[2]
+        rows = np.fromiter(
+            (emb.activity_pos.get(r.id, -1) for r in cols.rows), dtype=np.intp, count=len(cols.rows)
+        )
+        self._aligned = (cols, emb, rows)
+        return rows
+
+    def scores(self, user_id: Union[str, UUID], candidates) -> np.ndarray:
+        """cf_score of every candidate of a CandidateSet for this user; NaN where unknown."""
+        out = np.full(len(candidates), np.nan, dtype=np.float32)
+        emb = self.current
+        u = emb.user_pos.get(str(user_id)) if emb is not None else None
+        if u is None or not len(candidates):
+            return out
+        rows = self._activity_rows(candidates.cols, emb)[candidates.idx]
+        known = rows >= 0
+        out[known] = emb.activity_vecs[rows[known]] @ emb.user_vecs[u]
+        return out
+
+    def score(self, user_id: Union[str, UUID], activity_id: str) -> float:
+        emb = self.current
+        if emb is None:
+            return float("nan")
+        return float(emb.pair_scores([str(user_id)], [str(activity_id)])[0])
+
+
+embedding_store = EmbeddingStore(settings.recommender_embeddings_dir)
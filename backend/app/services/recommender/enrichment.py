@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+OPEN_METEO_FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+
+# Open-Meteo hourly variable -> events column
+HOURLY_COLUMNS = {
+    "apparent_temperature": "weather_temp_c",
+    "precipitation_probability": "weather_precip_prob",
+    "wind_speed_10m": "weather_wind_kmh",
+    "is_day": "weather_is_day",
+    "cloud_cover": "cloud_cover",
+    "precipitation": "precipitation",
+}
+
+CELL_DEGREES = 0.01       # ~1 km; events in the same cell share one upstream series
+MAX_PAST_DAYS = 92        # Open-Meteo forecast API limit
+COORDS_PER_REQUEST = 50   # cells per multi-location upstream call
+
+Cell = Tuple[float, float]
+
+
+def snap_cell(lat: float, lon: float) -> Cell:
+    return (round(round(lat / CELL_DEGREES) * CELL_DEGREES, 4), round(round(lon / CELL_DEGREES) * CELL_DEGREES, 4))
+
+
+def _request_series(
+    client: httpx.Client, chunk: List[Cell], past_days: int, forecast_days: int, variables: Sequence[str],
+) -> List[dict]:
+    resp = client.get(OPEN_METEO_FORECAST_URL, params={
+        "latitude": ",".join(f"{lat:.4f}" for lat, _ in chunk),
+        "longitude": ",".join(f"{lon:.4f}" for _, lon in chunk),
+        "hourly": ",".join(variables),
+        "timezone": "UTC",
+        "timeformat": "unixtime",
+        "past_days": past_days,
+        "forecast_days": forecast_days,
+    })
+    resp.raise_for_status()
+    data = resp.json()
+    # A single location returns an object, several return a list in request order
+    return data if isinstance(data, list) else [data]
+
+
+def fetch_hourly_series(
+    client: httpx.Client,
+    cells: List[Cell],
+    past_days: int,
+    forecast_days: int = 1,
+    variables: Sequence[str] = tuple(HOURLY_COLUMNS),
+) -> Dict[Cell, dict]:
+    """
+    Hourly series for many cells, COORDS_PER_REQUEST locations per request.
+    Returns {cell: {"time": [unix seconds...], <variable>: [...]}}.
+
+    A failed request doesn't fail the call. When upstream rejects a chunk
+    (4xx, e.g. one invalid coordinate) its cells are retried one by one and
+    those rejected again map to an empty series. Cells of chunks that fail
+    otherwise (network, 5xx) are left out, so callers can retry them later.
+    """
+    out: Dict[Cell, dict] = {}
+    for i in range(0, len(cells), COORDS_PER_REQUEST):
+        chunk = cells[i:i + COORDS_PER_REQUEST]
+        try:
+            items = _request_series(client, chunk, past_days, forecast_days, variables)
+        except httpx.HTTPStatusError as e:
+            if not e.response.is_client_error:
+                logger.warning("Open-Meteo request for %d cells failed: %s", len(chunk), e)
+                continue
+            items = []
+            for cell in chunk:
+                try:
+                    items.extend(_request_series(client, [cell], past_days, forecast_days, variables))
+                except httpx.HTTPStatusError as e:
+                    if not e.response.is_client_error:
+                        logger.warning("Open-Meteo request for cell %s failed: %s", cell, e)
+                        break
+                    logger.warning("Open-Meteo rejected cell %s: %s", cell, e)
+                    items.append({})
+                except httpx.HTTPError as e:
+                    logger.warning("Open-Meteo request for cell %s failed: %s", cell, e)
+                    break
+        except httpx.HTTPError as e:
+            logger.warning("Open-Meteo request for %d cells failed: %s", len(chunk), e)
+            continue
+        for cell, item in zip(chunk, items):
+            out[cell] = item.get("hourly") or {}
+    return out
+
+
+def _hour_values(series: dict, ts: datetime) -> Optional[Dict[str, Optional[float]]]:
+    times = series.get("time") or []
+    if len(times) < 2:
+        return None
+    interval = times[1] - times[0]
+    i = round((ts.timestamp() - times[0]) / interval)
+    if not 0 <= i < len(times):
+        return None
+    values = {}
+    for var, col in HOURLY_COLUMNS.items():
+        seq = series.get(var) or []
+        v = seq[i] if i < len(seq) else None
+        values[col] = float(v) if v is not None else None
+    return values
+
+
+def enrich_pending_events(db: Session, client: httpx.Client, batch_size: int = 1000) -> int:
+    """
+    Fill missing weather context of up to `batch_size` pending events.
+
+    Events are grouped by grid cell; each cell's hourly series is fetched once and
+    every event in it is matched to its hour. Values the client sent are kept.
+    Rows are locked with SKIP LOCKED so several workers can run this concurrently.
+    Events in cells upstream rejects are marked done without weather.
+
+    Returns:
+        Number of events marked as enriched.
+    """
+    rows = db.execute(
+        text("""
+        SELECT id, ts, user_lat, user_lon
+        FROM events
+        WHERE enrichment_pending
+        ORDER BY ts
+        LIMIT :n
+        FOR UPDATE SKIP LOCKED
+        """),
+        {"n": batch_size},
+    ).fetchall()
+    if not rows:
+        return 0
+
+    by_cell: Dict[Cell, List[tuple]] = defaultdict(list)
+    for r in rows:
+        if r.user_lat is None or r.user_lon is None:
+            by_cell[None].append(r)
+        else:
+            by_cell[snap_cell(r.user_lat, r.user_lon)].append(r)
+
+    now = datetime.now(timezone.utc)
+    oldest = min(r.ts for r in rows)
+    past_days = min(MAX_PAST_DAYS, max(1, math.ceil((now - oldest).total_seconds() / 86400.0)))
+    series = fetch_hourly_series(client, [c for c in by_cell if c is not None], past_days)
+
+    updates = []
+    for cell, events in by_cell.items():
+        if cell is not None and cell not in series:
+            continue  # upstream failed transiently; the events stay pending for a later run
+        for r in events:
+            values = _hour_values(series.get(cell, {}), r.ts) if cell is not None else None
+            # Events outside the upstream window are marked done without weather
+            updates.append({"id": r.id, **(values or {col: None for col in HOURLY_COLUMNS.values()})})
+    if not updates:
+        db.rollback()
+        return 0
+
+    db.execute(
+        text("""
+        UPDATE events SET
+          weather_temp_c = COALESCE(weather_temp_c, :weather_temp_c),
+          weather_precip_prob = COALESCE(weather_precip_prob, :weather_precip_prob),
+          weather_wind_kmh = COALESCE(weather_wind_kmh, :weather_wind_kmh),
+          weather_is_day = COALESCE(weather_is_day, :weather_is_day),
+          cloud_cover = COALESCE(cloud_cover, :cloud_cover),
+          precipitation = COALESCE(precipitation, :precipitation),
+          enrichment_pending = false
+        WHERE id = :id
+        """),
+        updates,
+    )
+    db.commit()
+    return len(updates)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timezone
+from typing import List, Literal, Set, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db.models import Event
+from app.services.recommender import result_cache
+from app.services.recommender.profile import PROFILE_EVENT_TYPES, record_profile_events
+from app.services.recommender.schemas import EventIn
+
+
+def _event_row(ev: EventIn) -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "user_id": ev.user_id,
+        "activity_id": ev.activity_id,
+        "event_type": ev.event_type,
+        "ts": ev.ts or datetime.now(timezone.utc),
+        "request_id": ev.request_id,
+        "position": ev.position,
+        "user_lat": ev.user_lat,
+        "user_lon": ev.user_lon,
+        "weather_temp_c": ev.weather_temp_c,
+        "weather_precip_prob": ev.weather_precip_prob,
+        "weather_wind_kmh": ev.weather_wind_kmh,
+        "weather_is_day": ev.weather_is_day,
+        # Missing weather context is filled in by the enrich_event_weather task
+        "enrichment_pending": ev.user_lat is not None and ev.user_lon is not None,
+        "idempotency_key": ev.idempotency_key,
+    }
+
+
+IngestStatus = Literal["accepted", "duplicate", "rejected"]
+
+
+def _existing_refs(db: Session, events: List[EventIn]) -> Tuple[Set[uuid.UUID], Set[uuid.UUID]]:
+    """
+    Referenced users and activities that exist. The rows are locked FOR KEY SHARE,
+    as the foreign key checks would, so they can't be deleted before the insert.
+    """
+    user_ids = list({ev.user_id for ev in events})
+    activity_ids = list({ev.activity_id for ev in events})
+    users = db.execute(
+        text("SELECT id FROM users WHERE id = ANY(:ids) FOR KEY SHARE"), {"ids": user_ids}
+    ).scalars().all()
+    activities = db.execute(
+        text("SELECT id FROM activities WHERE id = ANY(:ids) FOR KEY SHARE"), {"ids": activity_ids}
+    ).scalars().all()
+    return set(users), set(activities)
+
+
+def ingest_events(db: Session, events: List[EventIn]) -> List[IngestStatus]:
+    """
+    Insert client events with one multi-row INSERT and commit.
+
+    Events referencing a user or activity that doesn't exist are rejected
+    instead of failing the statement. Events whose idempotency_key already
+    exists (or repeats earlier in the same batch) are skipped. Save/complete
+    events update the user's tag profile in the same transaction.
+
+    Returns:
+        One status per input event: "accepted", "duplicate" or "rejected".
+    """
+    if not events:
+        return []
+
+    users, activities = _existing_refs(db, events)
+    statuses: List[IngestStatus] = []
+    rows = []
+    seen: Set[str] = set()
+    for ev in events:
+        if ev.user_id not in users or ev.activity_id not in activities:
+            statuses.append("rejected")
+            rows.append(None)
+            continue
+        key = ev.idempotency_key
+        if key is not None and key in seen:
+            statuses.append("duplicate")
+            rows.append(None)
+            continue
+        if key is not None:
+            seen.add(key)
+        statuses.append("duplicate")  # until the INSERT returns its id
+        rows.append(_event_row(ev))
+
+    to_insert = [r for r in rows if r is not None]
+    if to_insert:
+        stmt = (
+            pg_insert(Event)
+            .values(to_insert)
+            .on_conflict_do_nothing(
+                index_elements=[Event.idempotency_key],
+                index_where=text("idempotency_key IS NOT NULL"),
+            )
+            .returning(Event.id)
+        )
+        inserted_ids = {r[0] for r in db.execute(stmt).fetchall()}
+        for i, r in enumerate(rows):
+            if r is not None and r["id"] in inserted_ids:
+                statuses[i] = "accepted"
+
+    positives = [
+        (ev.user_id, ev.activity_id)
+        for ev, status in zip(events, statuses)
+        if status == "accepted" and ev.event_type in PROFILE_EVENT_TYPES
+    ]
+    record_profile_events(db, positives)
+    db.commit()
+
+    for user_id in {u for u, _ in positives}:
+        result_cache.invalidate_user(user_id)
+    return statuses
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 from math import radians, sin, cos, sqrt, atan2
-from datetime import datetime, timedelta, timezone
 
-import httpx
+import numpy as np
+
+ArrayLike = Union[np.ndarray, float]
+
+EARTH_RADIUS_KM = 6371.0
+
 
 @dataclass(frozen=True)
 class ActivityRow:
@@ -37,6 +41,130 @@ def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return R * c
 
 
+def haversine_km_vec(lat: ArrayLike, lon: ArrayLike, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Vectorized haversine: distance in kilometers from (lat, lon) to every (lats[i], lons[i])."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlon = np.radians(lons) - np.radians(lon)
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+# Model input contract. Training (train_from_db.py) and serving (recommend()) both
+# build their matrices with compute_features(), so the columns mean the same thing
+# in both places. Artifacts record the schema version they were trained on.
+# Adding a column keeps older artifacts valid (they select their columns by name);
+# changing what an existing column means must raise MIN_COMPATIBLE_SCHEMA_VERSION.
+FEATURE_SCHEMA_VERSION = 3
+MIN_COMPATIBLE_SCHEMA_VERSION = 2
+# Artifacts without a recorded version predate versioning (tag_overlap = len(tags))
+LEGACY_SCHEMA_VERSION = 1
+FEATURE_SCHEMA: Tuple[str, ...] = (
+    # user x item
+    "distance_km",
+    "cat_weight",
+    "tag_overlap",
+    "tag_weighted",
+    "cf_score",
+    # item attributes
+    "indoor_f",
+    "covered_f",
+    "price_level_f",
+    "difficulty_f",
+    "duration_minutes_f",
+    # weather snapshot
+    "weather_temp_c",
+    "weather_precip_prob",
+    "weather_wind_kmh",
+    "weather_is_day",
+    # derived weather sensitivity
+    "precip_penalty",
+    "wind_penalty",
+    "cold_penalty",
+    "heat_penalty",
+    "position",
+)
+FEATURE_INDEX: Dict[str, int] = {name: i for i, name in enumerate(FEATURE_SCHEMA)}
+
+
+def check_feature_order(feature_order: Sequence[str], schema_version: Optional[int]) -> int:
+    """
+    Raise ValueError if a model was trained on an incompatible schema version or
+    expects features the library doesn't produce. A missing version counts as
+    LEGACY_SCHEMA_VERSION. Returns the effective version.
+    """
+    version = LEGACY_SCHEMA_VERSION if schema_version is None else int(schema_version)
+    if not MIN_COMPATIBLE_SCHEMA_VERSION <= version <= FEATURE_SCHEMA_VERSION:
+        raise ValueError(
+            f"Model was trained with feature schema v{version}, serving computes "
+            f"v{FEATURE_SCHEMA_VERSION} (compatible from v{MIN_COMPATIBLE_SCHEMA_VERSION}); retrain it"
+        )
+    unknown = [f for f in feature_order if f not in FEATURE_INDEX]
+    if unknown:
+        raise ValueError(f"Model feature_order has features outside FEATURE_SCHEMA: {unknown}")
+    return version
+
+
+def compute_features(
+    *,
+    distance_km: ArrayLike,
+    cat_weight: ArrayLike,
+    tag_overlap: ArrayLike,
+    tag_weighted: ArrayLike,
+    indoor: ArrayLike,
+    covered: ArrayLike,
+    price_level: ArrayLike,
+    difficulty: ArrayLike,
+    duration_minutes: ArrayLike,
+    weather_temp_c: ArrayLike,
+    weather_precip_prob: ArrayLike,
+    weather_wind_kmh: ArrayLike,
+    weather_is_day: ArrayLike,
+    position: ArrayLike = 0.0,
+    cf_score: ArrayLike = np.nan,
+) -> np.ndarray:
+    """
+    Build the (n, len(FEATURE_SCHEMA)) float32 feature matrix.
+
+    `distance_km` fixes n; every other input is either a length-n array or a
+    scalar broadcast to all rows (e.g. one weather snapshot for all candidates).
+
+    Notes:
+      - weather_precip_prob is expected in [0..100]
+      - weather_is_day is expected 0/1 (or fraction if averaged)
+      - cf_score is NaN when the user or activity has no embedding (LightGBM treats it as missing)
+    """
+    n = np.shape(distance_km)[0]
+    X = np.empty((n, len(FEATURE_SCHEMA)), dtype=np.float32)
+    c = FEATURE_INDEX
+
+    X[:, c["distance_km"]] = distance_km
+    X[:, c["cat_weight"]] = cat_weight
+    X[:, c["tag_overlap"]] = tag_overlap
+    X[:, c["tag_weighted"]] = tag_weighted
+    X[:, c["cf_score"]] = cf_score
+    X[:, c["indoor_f"]] = indoor
+    X[:, c["covered_f"]] = covered
+    X[:, c["price_level_f"]] = price_level
+    X[:, c["difficulty_f"]] = difficulty
+    X[:, c["duration_minutes_f"]] = duration_minutes
+    X[:, c["weather_temp_c"]] = weather_temp_c
+    X[:, c["weather_precip_prob"]] = weather_precip_prob
+    X[:, c["weather_wind_kmh"]] = weather_wind_kmh
+    X[:, c["weather_is_day"]] = weather_is_day
+    X[:, c["position"]] = position
+
+    # Weather penalties mostly matter for outdoor activities
+    outdoor = 1.0 - X[:, c["indoor_f"]]
+    temp = X[:, c["weather_temp_c"]]
+    X[:, c["precip_penalty"]] = outdoor * (X[:, c["weather_precip_prob"]] / 100.0)  # 0..1
+    X[:, c["wind_penalty"]] = outdoor * (X[:, c["weather_wind_kmh"]] / 50.0)        # rough scaling
+    X[:, c["cold_penalty"]] = outdoor * np.maximum(0.0, (10.0 - temp) / 10.0)
+    X[:, c["heat_penalty"]] = outdoor * np.maximum(0.0, (temp - 30.0) / 10.0)
+    return X
+
+
 def build_features(
     user_pref: Dict[str, float],
     user_tag_pref: Dict[str, float],
@@ -49,67 +177,26 @@ def build_features(
     weather_is_day: float,
 ) -> Dict[str, float]:
     """
-    Build a consistent feature dictionary for ML scoring and heuristic fallback.
-
-    Keep these feature names stable and aligned with:
-      - ML training script feature_order
-      - MLRecommender.score() input
-
-    Notes:
-      - weather_precip_prob is expected in [0..100]
-      - weather_is_day is expected 0/1 (or fraction if averaged)
+    Features of a single activity as a {name: value} dict.
+    Row-at-a-time reference for compute_features(); recommend() uses the columnar path.
     """
-    distance = haversine_km(user_lat, user_lon, activity.lat, activity.lon)
-
-    cat_weight = float(user_pref.get(activity.category, 0.0))
-
-    tag_overlap = 0.0
-    tag_weighted = 0.0
-    for t in activity.tags:
-        w = user_tag_pref.get(t)
-        if w is not None:
-            tag_overlap += 1.0
-            tag_weighted += float(w)
-
-    indoor_f = 1.0 if activity.indoor else 0.0
-    covered_f = 1.0 if activity.covered else 0.0
-
-    # Weather penalties mostly matter for outdoor activities
-    outdoor = 1.0 - indoor_f
-
-    precip_penalty = outdoor * (float(weather_precip_prob) / 100.0)  # 0..1
-    wind_penalty = outdoor * (float(weather_wind_kmh) / 50.0)        # rough scaling
-    cold_penalty = outdoor * max(0.0, (10.0 - float(weather_temp_c)) / 10.0)
-    heat_penalty = outdoor * max(0.0, (float(weather_temp_c) - 30.0) / 10.0)
-
-    return {
-        # core
-        "distance_km": float(distance),
-        "cat_weight": float(cat_weight),
-        "tag_overlap": float(tag_overlap),
-        "tag_weighted": float(tag_weighted),
-
-        # item attributes
-        "indoor": indoor_f,
-        "covered": covered_f,
-        "price_level": float(activity.price_level),
-        "difficulty": float(activity.difficulty),
-        "duration_minutes": float(activity.duration_minutes),
-
-        # weather snapshot
-        "temp_c": float(weather_temp_c),
-        "precip_prob": float(weather_precip_prob),
-        "wind_kmh": float(weather_wind_kmh),
-        "is_day": float(weather_is_day),
-
-        # derived weather sensitivity
-        "precip_penalty": float(precip_penalty),
-        "wind_penalty": float(wind_penalty),
-        "cold_penalty": float(cold_penalty),
-        "heat_penalty": float(heat_penalty),
-
-        "position": 0.0,
-    }
+    matched = [float(user_tag_pref[t]) for t in dict.fromkeys(activity.tags) if t in user_tag_pref]
+    X = compute_features(
+        distance_km=haversine_km_vec(user_lat, user_lon, np.array([activity.lat]), np.array([activity.lon])),
+        cat_weight=float(user_pref.get(activity.category, 0.0)),
+        tag_overlap=float(len(matched)),
+        tag_weighted=sum(matched),
+        indoor=float(activity.indoor),
+        covered=float(activity.covered),
+        price_level=float(activity.price_level),
+        difficulty=float(activity.difficulty),
+        duration_minutes=float(activity.duration_minutes),
+        weather_temp_c=weather_temp_c,
+        weather_precip_prob=weather_precip_prob,
+        weather_wind_kmh=weather_wind_kmh,
+        weather_is_day=weather_is_day,
+    )
+    return dict(zip(FEATURE_SCHEMA, X[0].tolist()))
 
 
 def reason_text(activity: ActivityRow, weather_precip_prob: float, weather_temp_c: float) -> str:
@@ -143,98 +230,3 @@ class WeatherSlice:
     precip_prob: float
     wind_kmh: float
     is_day: float
-
-
-def _parse_iso_utc(ts: str) -> datetime:
-    # Open-Meteo returns ISO timestamps, usually without timezone; we use UTC.
-    # Example: "2025-12-23T14:00"
-    dt = datetime.fromisoformat(ts)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
-
-
-async def fetch_weather_slice(
-    lat: float,
-    lon: float,
-    horizon_hours: int = 4,
-    start: Optional[datetime] = None,
-) -> WeatherSlice:
-    """
-    Fetch hourly forecast from Open-Meteo and aggregate over [start, start+horizon_hours).
-
-    Open-Meteo endpoint (no key):
-      https://api.open-meteo.com/v1/forecast
-
-    Returns:
-      WeatherSlice(temp_c, precip_prob, wind_kmh, is_day)
-
-    Notes:
-    - Uses hourly: temperature_2m, precipitation_probability, windspeed_10m, is_day
-    - Uses timezone=UTC to simplify server-side handling.
-    """
-    if horizon_hours <= 0:
-        raise ValueError("horizon_hours must be > 0")
-
-    if start is None:
-        start = datetime.now(timezone.utc)
-    else:
-        if start.tzinfo is None:
-            start = start.replace(tzinfo=timezone.utc)
-        start = start.astimezone(timezone.utc)
-
-    end = start + timedelta(hours=horizon_hours)
-
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "hourly": "temperature_2m,precipitation_probability,windspeed_10m,is_day",
-        "timezone": "UTC",
-        "forecast_days": 2,
-    }
-
-    async with httpx.AsyncClient(timeout=300.0) as client:
-        resp = await client.get(url, params=params)
-        resp.raise_for_status()
-        data = resp.json()
-
-    hourly = data.get("hourly") or {}
-    times = hourly.get("time") or []
-    temps = hourly.get("temperature_2m") or []
-    pprob = hourly.get("precipitation_probability") or []
-    wind = hourly.get("windspeed_10m") or []
-    is_day = hourly.get("is_day") or []
-
-    if not (len(times) == len(temps) == len(pprob) == len(wind) == len(is_day)) or len(times) == 0:
-        # Defensive fallback if API shape changes or returns partial data
-        raise RuntimeError("Unexpected Open-Meteo response format")
-
-    selected = []
-    for i, t in enumerate(times):
-        dt = _parse_iso_utc(t)
-        if start <= dt < end:
-            # precipitation_probability can be null in some cases; treat as 0
-            selected.append((
-                float(temps[i]),
-                float(pprob[i] if pprob[i] is not None else 0.0),
-                float(wind[i]),
-                float(is_day[i]),
-            ))
-
-    # If the selected window had no entries (rare), fall back to the first hour
-    if not selected:
-        selected = [(
-            float(temps[0]),
-            float(pprob[0] if pprob[0] is not None else 0.0),
-            float(wind[0]),
-            float(is_day[0]),
-        )]
-
-    n = len(selected)
-    return WeatherSlice(
-        temp_c=sum(v[0] for v in selected) / n,
-        precip_prob=sum(v[1] for v in selected) / n,
-        wind_kmh=sum(v[2] for v in selected) / n,
-        is_day=sum(v[3] for v in selected) / n,
-    )
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.db.models import Event
+from app.db.session import session_scope
+
+logger = logging.getLogger(__name__)
+
+
+class ImpressionWriter:
+    """
+    Write-behind buffer for `view` impressions logged by /recommendations.
+
+    Requests enqueue rows and return immediately; a background task drains the
+    queue and writes up to `batch_size` rows per multi-row INSERT. The queue is
+    bounded: when full, `submit` waits up to `enqueue_timeout` seconds for room
+    (backpressure on the request) and then drops the overflow, counting it.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        enqueue_timeout: float = 0.5,
+    ):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: List[Dict[str, Any]] = []
+        self._inflight: Optional[asyncio.Future] = None
+        self._stats: Dict[str, float] = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "failed": 0,
+            "flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    @staticmethod
+    def row(**fields: Any) -> Dict[str, Any]:
+        """An events row for a view impression, timestamped now rather than at flush time."""
+        return {
+            "id": uuid.uuid4(),
+            "event_type": "view",
+            "ts": datetime.now(timezone.utc),
+            **fields,
+        }
+
+    async def submit(self, rows: List[Dict[str, Any]]) -> None:
+        if self._queue is None:
+            # Writer not running (scripts, tests): write inline
+            await asyncio.to_thread(self._write, rows)
+            return
+        deadline = time.monotonic() + self.enqueue_timeout
+        for i, r in enumerate(rows):
+            try:
+                self._queue.put_nowait(r)
+            except asyncio.QueueFull:
+                try:
+                    await asyncio.wait_for(self._queue.put(r), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    self._stats["dropped"] += len(rows) - i
+                    logger.warning("Impression queue full; dropped %d rows", len(rows) - i)
+                    return
+            self._stats["enqueued"] += 1
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        with session_scope() as db:
+            db.execute(insert(Event), rows)
+            db.commit()
+
+    async def _flush(self, rows: List[Dict[str, Any]]) -> None:
+        t0 = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write, rows)
+            self._stats["written"] += len(rows)
+        except Exception:
+            self._stats["failed"] += len(rows)
+            logger.exception("Failed to write %d impressions", len(rows))
+        ms = (time.perf_counter() - t0) * 1000.0
+        self._stats["flushes"] += 1
+        self._stats["last_flush_ms"] = ms
+        self._stats["total_flush_ms"] += ms
+        self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], ms)
+
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        assert self._queue is not None
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        while True:
+            self._pending = [await self._queue.get()]
+            # Give the batch a moment to fill up unless it's already full
+            if self._queue.qsize() + 1 < self.batch_size:
+                await asyncio.sleep(self.flush_interval)
+            self._pending += self._drain(self.batch_size - len(self._pending))
+            batch, self._pending = self._pending, []
+            # Shielded so shutdown lets an in-progress write finish
+            self._inflight = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._inflight)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background writer and flush everything still queued."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._inflight is not None:
+            await self._inflight
+        batch, self._pending = self._pending, []
+        while True:
+            batch += self._drain(self.batch_size - len(batch))
+            if not batch:
+                break
+            await self._flush(batch)
+            batch = []
+        self._queue = None
+
+    def stats(self) -> Dict[str, float]:
+        flushes = self._stats["flushes"]
+        return {
+            **self._stats,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_capacity": self.max_queue,
+            "avg_flush_ms": self._stats["total_flush_ms"] / flushes if flushes else 0.0,
+        }
+
+
+impression_writer = ImpressionWriter(
+    max_queue=settings.impression_queue_max,
+    batch_size=settings.impression_batch_size,
+    flush_interval=settings.impression_flush_interval_seconds,
+)
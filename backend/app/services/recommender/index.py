@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import redis
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.services.cache import cache
+from app.services.recommender.features import EARTH_RADIUS_KM, ActivityRow, haversine_km_vec
+
+logger = logging.getLogger(__name__)
+
+MAX_CANDIDATES = settings.recommendations_max_candidates
+
+# Bumped on every catalog change; part of recommendation cache keys and lets
+# each process notice changes made by other workers.
+CATALOG_VERSION_KEY = "recs:catalog_version"
+
+_ACTIVITY_COLUMNS = """
+    id::text, name, category, tags, indoor, covered,
+    price_level, difficulty, duration_minutes,
+    ST_Y(location::geometry) AS lat,
+    ST_X(location::geometry) AS lon
+"""
+
+
+def _row_from_sql(r) -> ActivityRow:
+    return ActivityRow(
+        id=r[0],
+        name=r[1],
+        category=r[2],
+        tags=list(r[3] or []),
+        indoor=bool(r[4]),
+        covered=bool(r[5]),
+        price_level=int(r[6]),
+        difficulty=int(r[7]),
+        duration_minutes=int(r[8]),
+        lat=float(r[9]),
+        lon=float(r[10]),
+    )
+
+
+@dataclass(frozen=True)
+class _Columns:
+    """
+    Immutable columnar snapshot of the activity catalog.
+    Readers grab a reference once per query; writers publish a new snapshot.
+    """
+    rows: Tuple[ActivityRow, ...]
+    pos: Dict[str, int]
+    lat: np.ndarray
+    lon: np.ndarray
+    indoor: np.ndarray
+    covered: np.ndarray
+    price_level: np.ndarray
+    difficulty: np.ndarray
+    duration_minutes: np.ndarray
+    category_id: np.ndarray
+    tag_bits: np.ndarray  # (n, words) uint64 bitset over the interned tag vocabulary
+
+
+@dataclass(frozen=True)
+class CandidateSet:
+    """Result of a radius query: positions into one catalog snapshot plus distances."""
+    cols: _Columns
+    idx: np.ndarray
+    distance_km: np.ndarray
+
+    def __len__(self) -> int:
+        return int(self.idx.shape[0])
+
+    def rows(self, positions: Optional[np.ndarray] = None) -> List[ActivityRow]:
+        """Activity rows of all candidates, or only of the given candidate positions (in that order)."""
+        idx = self.idx if positions is None else self.idx[positions]
+        return [self.cols.rows[i] for i in idx.tolist()]
+
+    def column(self, name: str) -> np.ndarray:
+        return getattr(self.cols, name)[self.idx]
+
+    def tag_overlap(self, mask: np.ndarray) -> np.ndarray:
+        """Number of tags each candidate shares with the `mask` bitset."""
+        bits = self.cols.tag_bits[self.idx]
+        words = min(bits.shape[1], mask.shape[0])
+        shared = bits[:, :words] & mask[:words]
+        return np.bitwise_count(shared).sum(axis=1).astype(np.float64)
+
+    def tag_weighted(self, tag_ids: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Sum of `weights[k]` over the tags `tag_ids[k]` each candidate carries."""
+        bits = self.cols.tag_bits[self.idx]
+        out = np.zeros(bits.shape[0], dtype=np.float64)
+        for tid, w in zip(tag_ids.tolist(), weights.tolist()):
+            if tid // 64 < bits.shape[1]:
+                has = (bits[:, tid // 64] >> np.uint64(tid % 64)) & np.uint64(1)
+                out += w * has
+        return out
+
+
+class ActivityIndex:
+    """
+    Process-local, in-memory columnar index over the `activities` table.
+
+    Candidate generation runs a vectorized radius filter over numpy arrays instead
+    of a PostGIS round trip. The index is loaded once and patched row by row when an
+    activity is created/updated/deleted in this process. It is fully reloaded when
+    the shared catalog version moves past the one it was built at (a change made by
+    another worker), or after `max_age_seconds` as a safety net.
+    """
+
+    def __init__(self, max_age_seconds: float = 300.0):
+        self.max_age_seconds = max_age_seconds
+        self.version = 0
+        self.catalog_version = 0
+        self._lock = threading.Lock()
+        self._cols: Optional[_Columns] = None
+        self._loaded_at = 0.0
+        self._category_ids: Dict[str, int] = {}
+        self._tag_ids: Dict[str, int] = {}
+
+    # ---- interning ----
+
+    def _intern_category(self, category: str) -> int:
+        return self._category_ids.setdefault(category, len(self._category_ids))
+
+    def _intern_tag(self, tag: str) -> int:
+        return self._tag_ids.setdefault(tag, len(self._tag_ids))
+
+    def category_id(self, category: str) -> int:
+        """Interned id of a category, or -1 if no indexed activity uses it."""
+        return self._category_ids.get(category, -1)
+
+    def category_weights(self, weights: Dict[str, float]) -> np.ndarray:
+        """Lookup table indexed by category id; categories without a weight map to 0."""
+        table = np.zeros(len(self._category_ids) + 1, dtype=np.float64)
+        for category, w in weights.items():
+            cid = self._category_ids.get(category)
+            if cid is not None:
+                table[cid] = w
+        return table
+
+    def tag_weights(self, weights: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """(tag ids, weights) of the weighted tags that appear in the index."""
+        known = [(self._tag_ids[t], w) for t, w in weights.items() if t in self._tag_ids]
+        ids = np.array([tid for tid, _ in known], dtype=np.int64)
+        return ids, np.array([w for _, w in known], dtype=np.float64)
+
+    def tag_mask(self, tags: Iterable[str]) -> np.ndarray:
+        """Bitset (uint64 words) with the bits of the given tags set; unknown tags are ignored."""
+        cols = self._cols
+        words = cols.tag_bits.shape[1] if cols is not None else 1
+        mask = np.zeros(words, dtype=np.uint64)
+        for t in tags:
+            tid = self._tag_ids.get(t)
+            if tid is not None and tid // 64 < words:
+                mask[tid // 64] |= np.uint64(1) << np.uint64(tid % 64)
+        return mask
+
+    # ---- building ----
+
+    def _encode(self, row: ActivityRow, words: int) -> Tuple[int, np.ndarray]:
+        tag_ids = [self._intern_tag(t) for t in row.tags]
+        words = max(words, (max(tag_ids, default=-1) // 64) + 1, 1)
+        bits = np.zeros(words, dtype=np.uint64)
+        for tid in tag_ids:
+            bits[tid // 64] |= np.uint64(1) << np.uint64(tid % 64)
+        return self._intern_category(row.category), bits
+
+    def _build(self, rows: Sequence[ActivityRow]) -> _Columns:
+        n = len(rows)
+        encoded = [self._encode(r, 1) for r in rows]
+        words = max((b.shape[0] for _, b in encoded), default=1)
+        tag_bits = np.zeros((n, words), dtype=np.uint64)
+        for i, (_, b) in enumerate(encoded):
+            tag_bits[i, : b.shape[0]] = b
+        return _Columns(
+            rows=tuple(rows),
+            pos={r.id: i for i, r in enumerate(rows)},
+            lat=np.fromiter((r.lat for r in rows), dtype=np.float64, count=n),
+            lon=np.fromiter((r.lon for r in rows), dtype=np.float64, count=n),
+            indoor=np.fromiter((r.indoor for r in rows), dtype=bool, count=n),
+            covered=np.fromiter((r.covered for r in rows), dtype=bool, count=n),
+            price_level=np.fromiter((r.price_level for r in rows), dtype=np.int32, count=n),
+            difficulty=np.fromiter((r.difficulty for r in rows), dtype=np.int32, count=n),
+            duration_minutes=np.fromiter((r.duration_minutes for r in rows), dtype=np.int32, count=n),
+            category_id=np.fromiter((c for c, _ in encoded), dtype=np.int32, count=n),
+            tag_bits=tag_bits,
+        )
+
+    def _publish(self, cols: _Columns) -> None:
+        self._cols = cols
+        self.version += 1
+
+    def rebuild(self, db: Session, catalog_version: int = 0) -> None:
+        """Reload the whole catalog from the database."""
+        rows = db.execute(text(f"SELECT {_ACTIVITY_COLUMNS} FROM activities")).fetchall()
+        with self._lock:
+            self._publish(self._build([_row_from_sql(r) for r in rows]))
+            self._loaded_at = time.monotonic()
+            self.catalog_version = catalog_version
+
+    def upsert(self, db: Session, activity_id: str) -> None:
+        """Insert or refresh a single activity, reading only that row from the database."""
+        r = db.execute(
+            text(f"SELECT {_ACTIVITY_COLUMNS} FROM activities WHERE id = :id"),
+            {"id": str(activity_id)},
+        ).fetchone()
+        if r is None:
+            self.remove(activity_id)
+            return
+        row = _row_from_sql(r)
+        with self._lock:
+            cols = self._cols
+            if cols is None:
+                # Nothing loaded yet; the first query will do a full load
+                return
+            cat_id, bits = self._encode(row, cols.tag_bits.shape[1])
+            tag_bits = cols.tag_bits
+            if bits.shape[0] > tag_bits.shape[1]:
+                tag_bits = np.pad(tag_bits, ((0, 0), (0, bits.shape[0] - tag_bits.shape[1])))
+
+            i = cols.pos.get(row.id)
+            if i is None:
+                self._publish(_Columns(
+                    rows=cols.rows + (row,),
+                    pos={**cols.pos, row.id: len(cols.rows)},
+                    lat=np.append(cols.lat, row.lat),
+                    lon=np.append(cols.lon, row.lon),
+                    indoor=np.append(cols.indoor, row.indoor),
+                    covered=np.append(cols.covered, row.covered),
+                    price_level=np.append(cols.price_level, np.int32(row.price_level)),
+                    difficulty=np.append(cols.difficulty, np.int32(row.difficulty)),
+                    duration_minutes=np.append(cols.duration_minutes, np.int32(row.duration_minutes)),
+                    category_id=np.append(cols.category_id, np.int32(cat_id)),
+                    tag_bits=np.vstack([tag_bits, bits[None, :]]),
+                ))
+                return
+
+            def _set(arr: np.ndarray, value) -> np.ndarray:
+                out = arr.copy()
+                out[i] = value
+                return out
+
+            self._publish(_Columns(
+                rows=cols.rows[:i] + (row,) + cols.rows[i + 1:],
+                pos=cols.pos,
+                lat=_set(cols.lat, row.lat),
+                lon=_set(cols.lon, row.lon),
+                indoor=_set(cols.indoor, row.indoor),
+                covered=_set(cols.covered, row.covered),
+                price_level=_set(cols.price_level, row.price_level),
+                difficulty=_set(cols.difficulty, row.difficulty),
+                duration_minutes=_set(cols.duration_minutes, row.duration_minutes),
+                category_id=_set(cols.category_id, cat_id),
+                tag_bits=_set(tag_bits, np.pad(bits, (0, tag_bits.shape[1] - bits.shape[0]))),
+            ))
+
+    def remove(self, activity_id: str) -> None:
+        """Drop a single activity from the index."""
+        with self._lock:
+            cols = self._cols
+            if cols is None or str(activity_id) not in cols.pos:
+                return
+            i = cols.pos[str(activity_id)]
+            rows = cols.rows[:i] + cols.rows[i + 1:]
+            self._publish(_Columns(
+                rows=rows,
+                pos={r.id: j for j, r in enumerate(rows)},
+                lat=np.delete(cols.lat, i),
+                lon=np.delete(cols.lon, i),
+                indoor=np.delete(cols.indoor, i),
+                covered=np.delete(cols.covered, i),
+                price_level=np.delete(cols.price_level, i),
+                difficulty=np.delete(cols.difficulty, i),
+                duration_minutes=np.delete(cols.duration_minutes, i),
+                category_id=np.delete(cols.category_id, i),
+                tag_bits=np.delete(cols.tag_bits, i, axis=0),
+            ))
+
+    def invalidate(self) -> None:
+        """Force a full reload on the next query."""
+        self._loaded_at = 0.0
+
+    def ensure_fresh(self, db: Session, catalog_version: int) -> None:
+        if (
+            self._cols is None
+            or catalog_version != self.catalog_version
+            or time.monotonic() - self._loaded_at > self.max_age_seconds
+        ):
+            self.rebuild(db, catalog_version)
+
+    def _columns(self) -> _Columns:
+        cols = self._cols
+        if cols is None:
+            raise RuntimeError("ActivityIndex is not loaded")
+        return cols
+
+    # ---- querying ----
+
+    def get(self, activity_id: str) -> Optional[ActivityRow]:
+        cols = self._columns()
+        i = cols.pos.get(str(activity_id))
+        return cols.rows[i] if i is not None else None
+
+    def __len__(self) -> int:
+        return len(self._cols.rows) if self._cols is not None else 0
+
+    def query(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        limit: int = MAX_CANDIDATES,
+    ) -> CandidateSet:
+        """Activities within `radius_km` of (lat, lon); only the nearest `limit` are kept."""
+        cols = self._columns()
+        if not cols.rows:
+            return CandidateSet(cols, np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.float64))
+
+        # Cheap bounding-box prefilter before the trigonometry
+        dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        dlon = dlat / max(np.cos(np.radians(lat)), 1e-6)
+        box = np.flatnonzero(
+            (np.abs(cols.lat - lat) <= dlat) & (np.abs(cols.lon - lon) <= dlon)
+        )
+        dist = haversine_km_vec(lat, lon, cols.lat[box], cols.lon[box])
+        inside = dist <= radius_km
+        idx, dist = box[inside], dist[inside]
+
+        if limit and idx.shape[0] > limit:
+            keep = np.argpartition(dist, limit - 1)[:limit]
+            idx, dist = idx[keep], dist[keep]
+        return CandidateSet(cols, idx, dist)
+
+
+activity_index = ActivityIndex(max_age_seconds=settings.activity_index_max_age_seconds)
+
+
+def current_catalog_version() -> int:
+    try:
+        return int(cache.sync.get(CATALOG_VERSION_KEY) or 0)
+    except redis.RedisError:
+        # Redis down: keep serving the loaded index; max_age still bounds staleness
+        return activity_index.catalog_version
+
+
+def activity_changed(db: Session, activity_id: str, deleted: bool = False) -> None:
+    """
+    Patch this process's index for one changed activity and bump the shared
+    catalog version so other workers reload and cached rankings are dropped.
+    Called after the write is committed, so a Redis failure is logged rather
+    than failing the request.
+    """
+    if deleted:
+        activity_index.remove(activity_id)
+    else:
+        activity_index.upsert(db, activity_id)
+    previous = activity_index.catalog_version
+    try:
+        current = int(cache.sync.incr(CATALOG_VERSION_KEY))
+    except redis.RedisError:
+        # Other workers pick the change up within max_age; reload here too
+        logger.warning("Could not bump catalog version after change to activity %s", activity_id)
+        activity_index.invalidate()
+        return
+    if current == previous + 1:
+        # Nobody else changed the catalog in between: the patched index is up to date
+        activity_index.catalog_version = current
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from typing import Iterable, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Event types that count towards a user's tag profile
+PROFILE_EVENT_TYPES = ("save", "complete")
+
+
+def record_profile_events(db: Session, events: Iterable[Tuple[UUID, UUID]]) -> None:
+    """
+    Add the tags of each (user_id, activity_id) save/complete event to the
+    user's tag profile. Runs in the caller's transaction, so commit together
+    with the event insert.
+
+    Counts use the activity's tags at event time; if an activity's tags are
+    edited later, rebuild_tag_profiles() realigns the table with history.
+    """
+    pairs = list(events)
+    if not pairs:
+        return
+    db.execute(
+        text("""
+        INSERT INTO user_tag_profile (user_id, tag, cnt)
+        SELECT e.user_id, t.tag, count(*)
+        FROM unnest(CAST(:users AS uuid[]), CAST(:activities AS uuid[])) AS e(user_id, activity_id)
+        JOIN activities a ON a.id = e.activity_id
+        CROSS JOIN LATERAL unnest(a.tags) AS t(tag)
+        GROUP BY 1, 2
+        ON CONFLICT (user_id, tag) DO UPDATE SET cnt = user_tag_profile.cnt + EXCLUDED.cnt
+        """),
+        {
+            "users": [str(u) for u, _ in pairs],
+            "activities": [str(a) for _, a in pairs],
+        },
+    )
+
+
+def rebuild_tag_profiles(db: Session, user_id: Optional[UUID] = None) -> None:
+    """Recompute user_tag_profile from the full events history (all users or one)."""
+    if user_id is not None:
+        profile_filter, event_filter = "user_id = :uid", "e.user_id = :uid"
+        params = {"uid": str(user_id)}
+    else:
+        profile_filter = event_filter = "true"
+        params = {}
+    db.execute(text(f"DELETE FROM user_tag_profile WHERE {profile_filter}"), params)
+    db.execute(
+        text(f"""
+        INSERT INTO user_tag_profile (user_id, tag, cnt)
+        SELECT e.user_id, t.tag, count(*)
+        FROM events e
+        JOIN activities a ON a.id = e.activity_id
+        CROSS JOIN LATERAL unnest(a.tags) AS t(tag)
+        WHERE e.event_type IN ('save', 'complete') AND {event_filter}
+        GROUP BY 1, 2
+        """),
+        params,
+    )
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+import joblib
+
+from app.core.config import settings
+from app.services.cache import cache
+from app.services.recommender.service import MLRecommender
+
+logger = logging.getLogger(__name__)
+
+MODEL_CHANNEL = "recommender:model"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_LOCK_NAME = ".manifest.lock"
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Versioned recommender artifacts on disk plus the model active in this process.
+
+    Layout of `root`:
+      manifest.json                   {"current": <version>, "versions": {<version>: {...}}}
+      recommender-<version>.joblib    uncompressed joblib payload (memory-mappable)
+
+    Every process holds one immutable MLRecommender. Reloads build a new instance
+    and swap the reference, so requests that already grabbed `active` finish on the
+    model they started with. Reload requests are broadcast over Redis pub/sub so
+    every API worker swaps, not just the one that served `/model/reload`.
+    """
+
+    def __init__(self, root: str, legacy_path: str):
+        self.root = Path(root)
+        self.legacy_path = legacy_path
+        self._active = MLRecommender(legacy_path)  # unloaded -> heuristic scoring
+        self._lock = threading.Lock()
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def active(self) -> MLRecommender:
+        return self._active
+
+    # ---- manifest ----
+
+    def read_manifest(self) -> Dict[str, Any]:
+        path = self.root / MANIFEST_NAME
+        if not path.exists():
+            return {"current": None, "versions": {}}
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    @contextmanager
+    def _manifest_lock(self) -> Iterator[None]:
+        """
+        Serialize manifest read-modify-write cycles across threads and processes
+        (API workers, the Celery retrain worker, scripts) sharing `root`.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.root / MANIFEST_LOCK_NAME, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        path = self.root / MANIFEST_NAME
+        tmp = path.with_name(f".{MANIFEST_NAME}.{uuid.uuid4().hex}")
+        tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+
+    # ---- publishing ----
+
+    def publish(
+        self,
+        payload: Dict[str, Any],
+        metrics: Optional[Dict[str, Any]] = None,
+        make_current: bool = True,
+        training: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        Write a new artifact version and record its checksum in the manifest.
+        The payload is dumped uncompressed so it can be loaded with mmap_mode.
+        `training` holds provenance (data window, parent version) for retraining.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        version = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+        path = self.root / f"recommender-{version}.joblib"
+        tmp = path.with_name(f".{path.name}.tmp")
+        joblib.dump(payload, tmp)
+        sha256 = file_sha256(tmp)
+        os.replace(tmp, path)
+
+        with self._manifest_lock():
+            manifest = self.read_manifest()
+            manifest["versions"][version] = {
+                "file": path.name,
+                "sha256": sha256,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "feature_order": list(payload.get("feature_order", [])),
+                "feature_schema_version": payload.get("feature_schema_version"),
+                "metrics": metrics or {},
+                "training": training or {},
+            }
+            if make_current:
+                manifest["current"] = version
+            self._write_manifest(manifest)
+        return version
+
+    def publish_file(self, src: str, metrics: Optional[Dict[str, Any]] = None) -> str:
+        """Import an existing joblib artifact (e.g. MODEL_OUT of train_from_db.py) as a new version."""
+        return self.publish(joblib.load(src), metrics=metrics)
+
+    def set_current(self, version: str) -> None:
+        with self._manifest_lock():
+            manifest = self.read_manifest()
+            if version not in manifest["versions"]:
+                raise KeyError(f"Unknown model version: {version}")
+            manifest["current"] = version
+            self._write_manifest(manifest)
+
+    # ---- loading ----
+
+    def open(self, version: Optional[str] = None) -> MLRecommender:
+        """
+        Load `version` (default: manifest's current) without activating it.
+        Falls back to the legacy single-file artifact when the registry is empty.
+
+        Raises:
+            KeyError: unknown version.
+            ValueError: artifact checksum does not match the manifest, or the
+                artifact's features don't match the serving feature schema.
+        """
+        manifest = self.read_manifest()
+        version = version or manifest.get("current")
+
+        if version is None:
+            rec = MLRecommender(self.legacy_path)
+            rec.load()
+            return rec
+
+        entry = manifest["versions"].get(version)
+        if entry is None:
+            raise KeyError(f"Unknown model version: {version}")
+        path = self.root / entry["file"]
+        if file_sha256(path) != entry["sha256"]:
+            raise ValueError(f"Checksum mismatch for model version {version}")
+        rec = MLRecommender(str(path), version=version)
+        rec.load(mmap_mode="r")
+        if rec.load_error is not None:
+            raise ValueError(f"Model version {version} can't be served: {rec.load_error}")
+        return rec
+
+    def load(self, version: Optional[str] = None) -> MLRecommender:
+        """Open `version` (see `open`) and make it active in this process."""
+        rec = self.open(version)
+        with self._lock:
+            self._active = rec
+        return rec
+
+    # ---- cross-worker broadcast ----
+
+    async def broadcast_reload(self, version: Optional[str] = None) -> None:
+        """Ask every process subscribed to MODEL_CHANNEL to load `version`."""
+        await cache.publish(MODEL_CHANNEL, {"version": version})
+
+    def broadcast_reload_sync(self, version: Optional[str] = None) -> None:
+        """`broadcast_reload` for Celery tasks and scripts."""
+        cache.sync.publish(MODEL_CHANNEL, json.dumps({"version": version}))
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = await cache.pubsub()
+                await pubsub.subscribe(MODEL_CHANNEL)
+                try:
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            await self._on_message(message["data"])
+                finally:
+                    await pubsub.aclose()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Model channel subscription lost; retrying")
+                await asyncio.sleep(5.0)
+
+    async def _on_message(self, data: str) -> None:
+        try:
+            version = json.loads(data).get("version")
+            await asyncio.to_thread(self.load, version)
+        except Exception:
+            # Keep serving the current model if the new one can't be loaded
+            logger.exception("Model reload from broadcast failed")
+
+    async def start(self) -> None:
+        try:
+            await asyncio.to_thread(self.load)
+        except Exception:
+            logger.exception("Initial model load failed; using heuristic scoring")
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+
+
+model_registry = ModelRegistry(settings.model_registry_dir, settings.model_path)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import json
+import logging
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+import redis
+
+from app.core.config import settings
+from app.services.cache import cache
+from app.services.recommender.features import WeatherSlice
+from app.services.recommender.index import CATALOG_VERSION_KEY
+
+logger = logging.getLogger(__name__)
+
+# Per-user generation counter: bumping it orphans every cached ranking of that user.
+USER_GENERATION_KEY = "recs:user_gen:{user_id}"
+
+# Snap requests to a ~1 km grid; rankings barely change within a cell
+CELL_DEGREES = 0.01
+
+
+def location_cell(lat: float, lon: float) -> str:
+    return f"{round(lat / CELL_DEGREES)}:{round(lon / CELL_DEGREES)}"
+
+
+def weather_bucket(w: WeatherSlice) -> str:
+    """Coarse weather bucket; scores only move meaningfully across these steps."""
+    return ":".join((
+        str(round(w.temp_c / 2.0)),       # 2 C
+        str(round(w.precip_prob / 10.0)), # 10 %
+        str(round(w.wind_kmh / 5.0)),     # 5 km/h
+        str(round(w.is_day * 2.0)),       # night / mixed / day
+    ))
+
+
+async def lookup(
+    user_id: UUID,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    limit: int,
+    weather: WeatherSlice,
+    model_version: Optional[str],
+    cf_version: Optional[str] = None,
+) -> Tuple[str, Optional[List[dict]]]:
+    """
+    Build the cache key for this request and return (key, cached ranking or None).
+    The key embeds the user's generation, the catalog version and the CF
+    embedding snapshot, so it changes as soon as any of them moves on.
+    The cache is best-effort: with Redis down every lookup is a miss.
+    """
+    try:
+        user_gen, catalog_version = await cache.get_many([
+            USER_GENERATION_KEY.format(user_id=user_id),
+            CATALOG_VERSION_KEY,
+        ])
+    except redis.RedisError:
+        logger.warning("Redis unavailable; ranking without the result cache")
+        return "", None
+    key = "recs:v1:" + ":".join((
+        str(user_id),
+        user_gen or "0",
+        location_cell(lat, lon),
+        f"{radius_km:g}",
+        str(limit),
+        weather_bucket(weather),
+        model_version or "legacy",
+        catalog_version or "0",
+        cf_version or "nocf",
+    ))
+    try:
+        raw = (await cache.get_many([key]))[0]
+    except redis.RedisError:
+        logger.warning("Redis unavailable; ranking without the result cache")
+        return key, None
+    return key, (json.loads(raw) if raw is not None else None)
+
+
+async def store(key: str, recs: List[dict]) -> None:
+    """Cache a ranking under a key from lookup(); an empty key (Redis was down) is skipped."""
+    if not key:
+        return
+    try:
+        await cache.set_json(key, recs, ttl_seconds=settings.recommendations_cache_ttl_seconds)
+    except redis.RedisError:
+        logger.warning("Could not cache ranking %s", key)
+
+
+def invalidate_user(user_id: UUID) -> None:
+    """
+    Called after a user logs save/complete events, which change their tag profile.
+    Runs after the events are committed, so a Redis failure is logged rather than
+    failing the request; cached rankings then expire through their TTL.
+    """
+    try:
+        cache.sync.incr(USER_GENERATION_KEY.format(user_id=user_id))
+    except redis.RedisError:
+        logger.warning("Could not invalidate cached rankings of user %s", user_id)
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+import numpy as np
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.services.recommender.features import FEATURE_SCHEMA_VERSION
+from app.services.recommender.registry import ModelRegistry
+from app.services.recommender.train_from_db import DEFAULT_PARAMS, build_dataset, new_classifier
+
+logger = logging.getLogger(__name__)
+
+
+def _data_until(registry: ModelRegistry, version: Optional[str]) -> Optional[datetime]:
+    """End of the impression window the given version was trained on, if recorded."""
+    if version is None:
+        return None
+    entry = registry.read_manifest()["versions"].get(version) or {}
+    until = (entry.get("training") or {}).get("data_until")
+    return datetime.fromisoformat(until) if until else None
+
+
+def _num_trees(rec) -> int:
+    return int(rec._booster.num_trees()) if rec._booster is not None else 0
+
+
+def retrain_incremental(
+    engine: Engine,
+    registry: ModelRegistry,
+    label_window_days: int = 7,
+    max_lookback_days: int = 30,
+    min_rows: int = 200,
+    trees_per_run: int = 100,
+    max_total_trees: int = 1500,
+    learning_rate: float = 0.03,
+    holdout_fraction: float = 0.25,
+    auc_tolerance: float = 0.0,
+    chunksize: int = 200_000,
+) -> Dict[str, Any]:
+    """
+    Warm-start the current model on impressions it hasn't seen yet and publish the
+    result as a new registry version if holdout AUC doesn't regress.
+
+    The data window starts where the current version's training data ended (at
+    most `max_lookback_days` back) and stops `label_window_days` ago, so every
+    impression used has a complete label. The new version adds `trees_per_run`
+    trees on top of the current booster, so a run costs O(new impressions).
+    Rejected or skipped runs keep the window start, so the next run retries
+    with the same impressions plus newer ones.
+
+    Once adding `trees_per_run` would take the model past `max_total_trees`,
+    the run instead trains a new model from scratch on the last
+    `max_lookback_days`, which bounds artifact size and scoring latency.
+
+    Returns:
+        Summary dict; "status" is "published", "rejected" or "skipped".
+    """
+    manifest = registry.read_manifest()
+    parent_version = manifest.get("current")
+    base = registry.open(parent_version)
+    base_trees = _num_trees(base)
+    full_rebuild = base.model is None or base_trees + trees_per_run > max_total_trees
+
+    until = datetime.now(timezone.utc) - timedelta(days=label_window_days)
+    since = until - timedelta(days=max_lookback_days)
+    watermark = _data_until(registry, parent_version)
+    if watermark is not None and not full_rebuild:
+        since = max(since, watermark)
+    summary: Dict[str, Any] = {
+        "parent_version": parent_version,
+        "data_since": since.isoformat(),
+        "data_until": until.isoformat(),
+        "base_num_trees": base_trees,
+        "full_rebuild": full_rebuild,
+    }
+    if since >= until:
+        return {**summary, "status": "skipped", "reason": "no new impressions"}
+
+    t0 = time.perf_counter()
+    df = build_dataset(
+        engine, since, until, label_window_days, chunksize,
+        embeddings_dir=settings.recommender_embeddings_dir,
+    )
+    summary["rows"] = len(df)
+    if len(df) < min_rows or df["label"].sum() == 0 or df["label"].sum() == len(df):
+        return {**summary, "status": "skipped", "reason": "not enough labeled impressions"}
+
+    # New trees must see the same columns as the base booster
+    feature_order = base.feature_order or list(df.columns.drop("label"))
+    X = df[feature_order]
+    y = df["label"].astype(int)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=holdout_fraction, random_state=42, stratify=y
+    )
+
+    pos = int(y_train.sum())
+    scale_pos_weight = (len(y_train) - pos) / max(pos, 1)
+    init_model = None if full_rebuild else base._booster
+    if init_model is not None:
+        # New trees keep the tree shape the base model was trained (or tuned) with
+        shape = {
+            k: v for k, v in getattr(base.model, "get_params", dict)().items()
+            if k in ("num_leaves", "min_child_samples", "subsample", "colsample_bytree")
+        }
+        model = new_classifier(
+            scale_pos_weight, **shape, n_estimators=trees_per_run, learning_rate=learning_rate
+        )
+    else:
+        # Nothing to warm-start from, or the tree cap is reached: full training on the window
+        model = new_classifier(
+            scale_pos_weight, n_estimators=min(DEFAULT_PARAMS["n_estimators"], max_total_trees)
+        )
+    model.fit(X_train, y_train, init_model=init_model)
+
+    auc = float(roc_auc_score(y_test, model.predict_proba(X_test)[:, 1]))
+    baseline_auc = (
+        float(roc_auc_score(y_test, base.score_batch(X_test.to_numpy(dtype=np.float64), feature_order)))
+        if base.model is not None else None
+    )
+    summary.update({
+        "auc": auc,
+        "baseline_auc": baseline_auc,
+        "train_rows": len(X_train),
+        "holdout_rows": len(X_test),
+        "pos_rate": float(y.mean()),
+        "num_trees": model.booster_.num_trees(),
+        "train_seconds": time.perf_counter() - t0,
+    })
+    if baseline_auc is not None and auc + auc_tolerance < baseline_auc:
+        logger.info("Retrained model rejected: AUC %.4f < baseline %.4f", auc, baseline_auc)
+        return {**summary, "status": "rejected"}
+
+    version = registry.publish(
+        {
+            "model": model,
+            "feature_order": feature_order,
+            "feature_schema_version": FEATURE_SCHEMA_VERSION,
+        },
+        metrics={
+            k: summary[k]
+            for k in ("auc", "baseline_auc", "train_rows", "holdout_rows", "pos_rate", "num_trees")
+        },
+        training={
+            "parent_version": parent_version,
+            "data_since": since.isoformat(),
+            "data_until": until.isoformat(),
+            "warm_start": init_model is not None,
+            "full_rebuild": full_rebuild,
+        },
+    )
+    registry.broadcast_reload_sync(version)
+    logger.info("Published retrained model %s (AUC %.4f, baseline %s)", version, auc, baseline_auc)
+    return {**summary, "status": "published", "version": version}
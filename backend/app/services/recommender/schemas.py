@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from typing import Any, Dict, List, Optional, Literal
 from uuid import UUID
 from datetime import datetime
 
@@ -21,14 +21,42 @@ class EventIn(BaseModel):
     request_id: Optional[UUID] = None
     position: Optional[int] = None
 
-    user_lat: Optional[float] = None
-    user_lon: Optional[float] = None
+    user_lat: Optional[float] = Field(default=None, ge=-90, le=90)
+    user_lon: Optional[float] = Field(default=None, ge=-180, le=180)
 
     weather_temp_c: Optional[float] = None
     weather_precip_prob: Optional[float] = None
     weather_wind_kmh: Optional[float] = None
     weather_is_day: Optional[float] = None
 
+    # Client-generated (e.g. a UUID per event); resubmitting the same key is a no-op
+    idempotency_key: Optional[str] = Field(default=None, max_length=128)
+
+
+MAX_EVENT_BATCH = 500
+
+
+class EventBatchIn(BaseModel):
+    """
+    Buffered client events. Items are validated one by one so a bad item
+    doesn't reject the rest of the batch.
+    """
+    events: List[Dict[str, Any]] = Field(max_length=MAX_EVENT_BATCH)
+
+
+class EventBatchItemResult(BaseModel):
+    index: int
+    status: Literal["accepted", "duplicate", "invalid", "rejected"]
+    errors: Optional[List[Dict[str, Any]]] = None
+
+
+class EventBatchOut(BaseModel):
+    accepted: int
+    duplicates: int
+    invalid: int
+    rejected: int
+    results: List[EventBatchItemResult]
+
 
 class ActivityOut(BaseModel):
     """
@@ -51,3 +79,25 @@ class ActivityOut(BaseModel):
     reason: str
 
     request_id: Optional[UUID] = None
+
+
+MAX_BEST_TIME_ACTIVITIES = 20
+
+
+class TimeWindowOut(BaseModel):
+    start: datetime
+    end: datetime
+    duration_hours: int
+    score: float
+
+    temp_c: float
+    precip_prob: float
+    wind_kmh: float
+    is_day: float
+
+
+class ActivityTimeWindowsOut(BaseModel):
+    """Best start times for one activity, best first."""
+    activity_id: UUID
+    name: str
+    windows: List[TimeWindowOut]
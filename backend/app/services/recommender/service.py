@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import time
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 import joblib
 import numpy as np
 from uuid import UUID
@@ -9,7 +10,32 @@ from uuid import UUID
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
-from app.services.recommender.features import build_features, reason_text, ActivityRow
+from app.services.recommender.features import (
+    FEATURE_INDEX,
+    FEATURE_SCHEMA,
+    ArrayLike,
+    check_feature_order,
+    compute_features,
+    reason_text,
+)
+from app.services.recommender.embeddings import embedding_store
+from app.services.recommender.index import (
+    ActivityIndex,
+    CandidateSet,
+    MAX_CANDIDATES,
+    activity_index,
+    current_catalog_version,
+)
+
+# Linear weights for the heuristic fallback used when no model artifact is loaded.
+HEURISTIC_WEIGHTS: Dict[str, float] = {
+    "cat_weight": 2.0,
+    "tag_overlap": 0.5,
+    "distance_km": -0.15,
+    "precip_penalty": -1.0,
+    "wind_penalty": -0.5,
+}
+
 
 class MLRecommender:
     """
@@ -18,19 +44,33 @@ class MLRecommender:
     Expected joblib payload:
       {
         "model": <sklearn-like model with predict_proba>,
-        "feature_order": [<feature1>, <feature2>, ...]
+        "feature_order": [<feature1>, <feature2>, ...],   # names from features.FEATURE_SCHEMA
+        "feature_schema_version": <int>                   # absent in older artifacts (= v1, rejected)
       }
     """
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, version: Optional[str] = None):
         self.model_path = model_path
+        self.version = version
         self.model = None
         self.feature_order: List[str] = []
+        self.feature_schema_version: Optional[int] = None
+        self.load_error: Optional[str] = None
+        self._booster = None
+        self._schema_idx: Optional[np.ndarray] = None
 
-    def load(self) -> None:
+    def load(self, mmap_mode: Optional[str] = None) -> None:
+        """
+        Load the artifact. With mmap_mode="r", numpy arrays in an uncompressed
+        artifact are memory-mapped so forked workers share the same pages.
+        """
+        self.load_error = None
         try:
-            payload = joblib.load(self.model_path)
+            payload = joblib.load(self.model_path, mmap_mode=mmap_mode)
+            feature_order = list(payload["feature_order"])
+            schema_version = check_feature_order(feature_order, payload.get("feature_schema_version"))
             self.model = payload["model"]
-            self.feature_order = list(payload["feature_order"])
+            self.feature_order = feature_order
+            self.feature_schema_version = schema_version
         except FileNotFoundError:
             self.model = None
             self.feature_order = []
@@ -38,6 +78,27 @@ class MLRecommender:
             # Fail closed: keep fallback scoring
             self.model = None
             self.feature_order = []
+            self.load_error = str(e)
+        self._booster = self._native_booster(self.model)
+        # Column positions of the model's features in a compute_features() matrix
+        self._schema_idx = (
+            np.array([FEATURE_INDEX[f] for f in self.feature_order], dtype=np.intp)
+            if self.feature_order else None
+        )
+
+    @staticmethod
+    def _native_booster(model):
+        """
+        Return the underlying LightGBM Booster of a fitted LGBMClassifier, if any.
+        Predicting through the Booster skips the sklearn wrapper's per-call validation.
+        """
+        if model is None:
+            return None
+        booster = getattr(model, "booster_", None) if hasattr(model, "predict_proba") else None
+        if booster is None and hasattr(model, "num_trees") and hasattr(model, "predict"):
+            # Raw lightgbm.Booster saved directly in the artifact
+            booster = model
+        return booster
 
     def score(self, features: Dict[str, float]) -> float:
         """
@@ -45,78 +106,194 @@ class MLRecommender:
         If model loaded: probability of positive outcome (click/save/complete).
         Otherwise: heuristic fallback.
         """
+        columns = list(features.keys())
+        x = np.array([[float(features[k]) for k in columns]], dtype=float)
+        return float(self.score_batch(x, columns)[0])
+
+    def score_batch(self, X: np.ndarray, columns: Sequence[str]) -> np.ndarray:
+        """
+        Score all candidates in one call.
+
+        Args:
+            X: (n_candidates, n_columns) feature matrix.
+            columns: feature name of each column of X.
+
+        Returns:
+            1-D float array of scores, one per row of X.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(columns):
+            raise ValueError("X must be a 2-D matrix with one column per feature name")
+        n = X.shape[0]
+        if n == 0:
+            return np.zeros(0, dtype=np.float64)
+
+        col_idx = FEATURE_INDEX if tuple(columns) == FEATURE_SCHEMA else {name: i for i, name in enumerate(columns)}
+
         if self.model is None or not self.feature_order:
-            # Simple fallback heuristic
-            base = 0.0
-            base += 2.0 * float(features.get("cat_weight", 0.0))
-            base += 0.5 * float(features.get("tag_overlap", 0.0))
-            base -= 0.15 * float(features.get("distance_km", 0.0))
-            base -= 1.0 * float(features.get("precip_penalty", 0.0))
-            base -= 0.5 * float(features.get("wind_penalty", 0.0))
-            return float(base)
+            return self._heuristic_batch(X, col_idx)
+
+        if col_idx is FEATURE_INDEX:
+            Xm = X[:, self._schema_idx]
+        else:
+            # Reorder/select columns to the model's feature order; unknown features are 0
+            Xm = np.zeros((n, len(self.feature_order)), dtype=np.float64)
+            for j, name in enumerate(self.feature_order):
+                i = col_idx.get(name)
+                if i is not None:
+                    Xm[:, j] = X[:, i]
 
-        x = np.array([[float(features.get(k, 0.0)) for k in self.feature_order]], dtype=float)
+        if self._booster is not None:
+            p = np.asarray(self._booster.predict(Xm))
+            # Binary objective returns P(y=1) directly; multiclass returns (n, k)
+            return (p[:, 1] if p.ndim == 2 else p).astype(np.float64, copy=False)
 
         # Most LightGBM/sklearn classifiers support predict_proba
         if hasattr(self.model, "predict_proba"):
-            p = self.model.predict_proba(x)[0, 1]
-            return float(p)
+            return np.asarray(self.model.predict_proba(Xm)[:, 1], dtype=np.float64)
 
         # If not available, fall back to predict and cast
         if hasattr(self.model, "predict"):
-            p = self.model.predict(x)[0]
-            return float(p)
+            return np.asarray(self.model.predict(Xm), dtype=np.float64).reshape(n)
 
         # Absolute fallback
-        return 0.0
+        return np.zeros(n, dtype=np.float64)
+
+    @staticmethod
+    def _heuristic_batch(X: np.ndarray, col_idx: Dict[str, int]) -> np.ndarray:
+        """Simple linear fallback heuristic over the whole candidate matrix."""
+        base = np.zeros(X.shape[0], dtype=np.float64)
+        for name, weight in HEURISTIC_WEIGHTS.items():
+            i = col_idx.get(name)
+            if i is not None:
+                base += weight * X[:, i]
+        return base
+
+class _StageClock:
+    """Records milliseconds spent per stage into `timings` (no-op when it's None)."""
+
+    def __init__(self, timings: Optional[Dict[str, float]]):
+        self.timings = timings
+        self._t = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        if self.timings is not None:
+            now = time.perf_counter()
+            self.timings[stage] = (now - self._t) * 1000.0
+            self._t = now
+
 
 def get_user_preferences(db: Session, user_id: UUID) -> Tuple[Dict[str, float], Dict[str, float]]:
-    q = text("SELECT category, weight FROM user_preferences WHERE user_id = :uid")
-    rows = db.execute(q, {"uid": str(user_id)}).fetchall()
-    cat = {r[0]: float(r[1]) for r in rows}
-
-    q2 = text("""
-      SELECT unnest(a.tags) AS tag, count(*) AS cnt
-      FROM events e
-      JOIN activities a ON a.id = e.activity_id
-      WHERE e.user_id = :uid AND e.event_type IN ('save','complete')
-      GROUP BY 1
+    """
+    Category weights and tag counts for a user in one round trip.
+    Both come from primary-key lookups; tag counts are kept up to date by
+    profile.record_profile_events() instead of aggregating the events history.
+    """
+    q = text("""
+      SELECT 'cat' AS kind, category AS name, weight::float AS value
+      FROM user_preferences WHERE user_id = :uid
+      UNION ALL
+      SELECT 'tag', tag, cnt::float
+      FROM user_tag_profile WHERE user_id = :uid
     """)
-    rows2 = db.execute(q2, {"uid": str(user_id)}).fetchall()
-    tag = {r[0]: float(r[1]) for r in rows2}
+    rows = db.execute(q, {"uid": str(user_id)}).fetchall()
+    cat: Dict[str, float] = {}
+    tag: Dict[str, float] = {}
+    for kind, name, value in rows:
+        (cat if kind == "cat" else tag)[name] = float(value)
     return cat, tag
 
 
-def fetch_candidates(db: Session, lat: float, lon: float, radius_km: float) -> List[ActivityRow]:
-    q = text("""
-      SELECT
-        id::text, name, category, tags, indoor, covered,
-        price_level, difficulty, duration_minutes,
-        ST_Y(location::geometry) AS lat,
-        ST_X(location::geometry) AS lon
-      FROM activities
-      WHERE ST_DWithin(location, ST_SetSRID(ST_MakePoint(:lon,:lat),4326)::geography, :meters)
-      LIMIT 500
-    """)
-    meters = radius_km * 1000.0
-    rows = db.execute(q, {"lat": lat, "lon": lon, "meters": meters}).fetchall()
-
-    out: List[ActivityRow] = []
-    for r in rows:
-        out.append(ActivityRow(
-            id=r[0],
-            name=r[1],
-            category=r[2],
-            tags=list(r[3] or []),
-            indoor=bool(r[4]),
-            covered=bool(r[5]),
-            price_level=int(r[6]),
-            difficulty=int(r[7]),
-            duration_minutes=int(r[8]),
-            lat=float(r[9]),
-            lon=float(r[10]),
-        ))
-    return out
+def fetch_candidates(
+    db: Session,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    limit: int = MAX_CANDIDATES,
+) -> CandidateSet:
+    """
+    Activities within `radius_km`, served from the in-memory activity index.
+    The database is only hit when the index needs a (re)load. `limit=0` keeps
+    every activity in the radius.
+    """
+    activity_index.ensure_fresh(db, current_catalog_version())
+    return activity_index.query(lat, lon, radius_km, limit=limit)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the `k` highest scores, best first. argpartition selects them in
+    O(n); only those k are sorted. Ties keep candidate order within the top k.
+    """
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.intp)
+    if k < n:
+        top = np.argpartition(-scores, k - 1)[:k]
+        top.sort()
+    else:
+        top = np.arange(n)
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def candidate_features(
+    candidates: CandidateSet,
+    cat_pref: Dict[str, float],
+    tag_pref: Dict[str, float],
+    weather_temp_c: float,
+    weather_precip_prob: float,
+    weather_wind_kmh: float,
+    weather_is_day: float,
+    position: float = 0.0,
+    cf_score: ArrayLike = np.nan,
+    index: ActivityIndex = activity_index,
+) -> np.ndarray:
+    """Feature matrix (columns in FEATURE_SCHEMA order) for every candidate, straight from the index columns."""
+    cat_table = index.category_weights(cat_pref)
+    tag_ids, tag_weights = index.tag_weights(tag_pref)
+    return compute_features(
+        distance_km=candidates.distance_km,
+        cat_weight=cat_table[candidates.column("category_id")],
+        tag_overlap=candidates.tag_overlap(index.tag_mask(tag_pref)),
+        tag_weighted=candidates.tag_weighted(tag_ids, tag_weights),
+        cf_score=cf_score,
+        indoor=candidates.column("indoor"),
+        covered=candidates.column("covered"),
+        price_level=candidates.column("price_level"),
+        difficulty=candidates.column("difficulty"),
+        duration_minutes=candidates.column("duration_minutes"),
+        weather_temp_c=weather_temp_c,
+        weather_precip_prob=weather_precip_prob,
+        weather_wind_kmh=weather_wind_kmh,
+        weather_is_day=weather_is_day,
+        position=position,
+    )
+
+
+def heuristic_scores(
+    candidates: CandidateSet,
+    cat_pref: Dict[str, float],
+    tag_pref: Dict[str, float],
+    weather_precip_prob: float,
+    weather_wind_kmh: float,
+    index: ActivityIndex = activity_index,
+) -> np.ndarray:
+    """
+    HEURISTIC_WEIGHTS score of every candidate, computed straight from the index
+    columns. Same result as the fallback in MLRecommender.score_batch() over
+    candidate_features(), without building the other feature columns.
+    """
+    w = HEURISTIC_WEIGHTS
+    outdoor = 1.0 - candidates.column("indoor")
+    scores = w.get("distance_km", 0.0) * candidates.distance_km
+    scores += w.get("cat_weight", 0.0) * index.category_weights(cat_pref)[candidates.column("category_id")]
+    if tag_pref:
+        scores += w.get("tag_overlap", 0.0) * candidates.tag_overlap(index.tag_mask(tag_pref))
+    scores += outdoor * (
+        w.get("precip_penalty", 0.0) * (weather_precip_prob / 100.0)
+        + w.get("wind_penalty", 0.0) * (weather_wind_kmh / 50.0)
+    )
+    return scores
 
 
 def recommend(
@@ -131,30 +308,50 @@ def recommend(
     weather_wind_kmh: float,
     weather_is_day: float,
     limit: int = 20,
+    timings: Optional[Dict[str, float]] = None,
 ) -> List[dict]:
+    """
+    Top `limit` activities around (lat, lon) for this user and weather.
+    If `timings` is given, per-stage wall times (ms) are written into it.
+
+    Without a loaded model the linear heuristic ranks every activity in the
+    radius (not just the nearest MAX_CANDIDATES) from the index columns, so
+    no feature matrix is built and only the top `limit` rows are materialized.
+    """
+    clock = _StageClock(timings)
     cat_pref, tag_pref = get_user_preferences(db, user_id)
-    candidates = fetch_candidates(db, lat, lon, radius_km)
-
-    scored = []
-    for a in candidates:
-        feats = build_features(
-            user_pref=cat_pref,
-            user_tag_pref=tag_pref,
-            activity=a,
-            user_lat=lat,
-            user_lon=lon,
+    clock.lap("preferences")
+    heuristic = model.model is None or not model.feature_order
+    candidates = fetch_candidates(db, lat, lon, radius_km, limit=0 if heuristic else MAX_CANDIDATES)
+    clock.lap("candidates")
+
+    if not len(candidates):
+        return []
+
+    if heuristic:
+        scores = heuristic_scores(candidates, cat_pref, tag_pref, weather_precip_prob, weather_wind_kmh)
+    else:
+        X = candidate_features(
+            candidates,
+            cat_pref,
+            tag_pref,
             weather_temp_c=weather_temp_c,
             weather_precip_prob=weather_precip_prob,
             weather_wind_kmh=weather_wind_kmh,
             weather_is_day=weather_is_day,
+            cf_score=embedding_store.scores(user_id, candidates),
         )
-        s = model.score(feats)
-        scored.append((s, feats["distance_km"], a, feats))
+        clock.lap("features")
+        scores = model.score_batch(X, FEATURE_SCHEMA)
+    clock.lap("scoring")
 
-    scored.sort(key=lambda x: x[0], reverse=True)
+    top = top_k(scores, limit)
+    rows = candidates.rows(top)
+    top_scores = scores[top].tolist()
+    distances = candidates.distance_km[top].tolist()
 
     results: List[dict] = []
-    for s, dist, a, feats in scored[:limit]:
+    for a, s, dist in zip(rows, top_scores, distances):
         results.append({
             "id": a.id,  # string UUID is fine; Pydantic will parse to UUID
             "name": a.name,
@@ -169,4 +366,5 @@ def recommend(
             "score": float(s),
             "reason": reason_text(a, weather_precip_prob, weather_temp_c),
         })
+    clock.lap("ranking")
     return results
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.recommender.features import FEATURE_SCHEMA, ActivityRow, compute_features, haversine_km_vec
+from app.services.recommender.service import MLRecommender
+from app.services.recommender.weather_grid import HourlySeries
+
+
+def window_means(
+    series: HourlySeries,
+    start_ts: float,
+    horizon_hours: int,
+    durations: Sequence[int],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Mean weather of every window starting at one of the next `horizon_hours` hours,
+    for every duration, from one pass of sliding-window sums over the prefix sums.
+
+    Returns:
+        (start sample indices (S,), means (n_vars, S, D), valid (S, D)). A window is
+        valid if it ends within the horizon and within the series.
+    """
+    n = series.n
+    d = np.asarray(durations, dtype=np.int64)
+    i0 = min(max(series.first_index(start_ts), 0), n - 1)
+    last = min(i0 + horizon_hours, n)
+    starts = np.arange(i0, last)
+    ends = starts[:, None] + d[None, :]
+    valid = ends <= last
+    ends = np.minimum(ends, n)
+    P = series.prefix
+    sums = P[:, ends] - P[:, starts][:, :, None]
+    means = sums / np.maximum(ends - starts[:, None], 1)
+    return starts, means, valid
+
+
+def rank_time_windows(
+    model: MLRecommender,
+    activity: ActivityRow,
+    series: HourlySeries,
+    cat_pref: Dict[str, float],
+    tag_pref: Dict[str, float],
+    durations: Sequence[int],
+    horizon_hours: int = 48,
+    user_lat: Optional[float] = None,
+    user_lon: Optional[float] = None,
+    start: Optional[datetime] = None,
+    limit: int = 5,
+    cf_score: float = np.nan,
+) -> List[dict]:
+    """
+    Score every (start hour, duration) window of the horizon for one activity with
+    the recommender's features and model, and return the best `limit` windows.
+    Everything but the weather is the same for all windows, so the feature matrix
+    is built once with the weather columns as arrays.
+    """
+    start = start or datetime.now(timezone.utc)
+    starts, means, valid = window_means(series, start.timestamp(), horizon_hours, durations)
+    if not valid.any():
+        return []
+    s_idx, d_idx = np.nonzero(valid)
+    temp, precip, wind, is_day = (m[s_idx, d_idx] for m in means)
+
+    matched = [float(tag_pref[t]) for t in dict.fromkeys(activity.tags) if t in tag_pref]
+    distance = (
+        float(haversine_km_vec(user_lat, user_lon, np.array([activity.lat]), np.array([activity.lon]))[0])
+        if user_lat is not None and user_lon is not None else 0.0
+    )
+    X = compute_features(
+        distance_km=np.full(s_idx.shape[0], distance),
+        cat_weight=float(cat_pref.get(activity.category, 0.0)),
+        tag_overlap=float(len(matched)),
+        tag_weighted=sum(matched),
+        cf_score=cf_score,
+        indoor=float(activity.indoor),
+        covered=float(activity.covered),
+        price_level=float(activity.price_level),
+        difficulty=float(activity.difficulty),
+        duration_minutes=float(activity.duration_minutes),
+        weather_temp_c=temp,
+        weather_precip_prob=precip,
+        weather_wind_kmh=wind,
+        weather_is_day=is_day,
+    )
+    scores = model.score_batch(X, FEATURE_SCHEMA)
+
+    # Best first; among equal scores prefer the earlier start, then the longer window
+    order = np.lexsort((-np.asarray(durations)[d_idx], s_idx, -scores))[:limit]
+    out = []
+    for j in order.tolist():
+        t_start = series.t0 + int(starts[s_idx[j]]) * series.step
+        hours = int(durations[d_idx[j]])
+        out.append({
+            "start": datetime.fromtimestamp(t_start, timezone.utc),
+            "end": datetime.fromtimestamp(t_start + hours * series.step, timezone.utc),
+            "duration_hours": hours,
+            "score": float(scores[j]),
+            "temp_c": float(temp[j]),
+            "precip_prob": float(precip[j]),
+            "wind_kmh": float(wind[j]),
+            "is_day": float(is_day[j]),
+        })
+    return out
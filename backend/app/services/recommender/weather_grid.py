@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+import redis
+
+from app.services.cache import cache
+from app.services.recommender.enrichment import OPEN_METEO_FORECAST_URL, fetch_hourly_series
+from app.services.recommender.features import WeatherSlice
+
+logger = logging.getLogger(__name__)
+
+# Open-Meteo hourly variables, in WeatherSlice field order
+VARIABLES = ("temperature_2m", "precipitation_probability", "wind_speed_10m", "is_day")
+
+CELL_DEGREES = 0.05          # ~5 km; forecast model resolution is coarser than this
+FORECAST_DAYS = 3            # always covers now + 48 h
+SERIES_KEY = "wx:v1:cell:{lat:.2f}:{lon:.2f}"
+SERIES_TTL_SECONDS = 7 * 24 * 3600  # last known series outlives upstream outages
+ACTIVE_CELLS_KEY = "wx:v1:active_cells"  # zset: cell -> last time a request needed it
+ACTIVE_WINDOW_SECONDS = 24 * 3600
+REFRESH_AFTER_SECONDS = 3 * 3600    # older series get a background refresh on read
+LOCAL_TTL_SECONDS = 60.0
+LOCAL_MAX_CELLS = 4096
+FETCH_TIMEOUT_SECONDS = 10.0
+
+Cell = Tuple[float, float]
+
+
+class WeatherUnavailable(RuntimeError):
+    """No series for the cell, and the upstream couldn't provide one."""
+
+
+@dataclass(frozen=True)
+class HourlySeries:
+    """
+    Hourly forecast of one grid cell, kept as prefix sums.
+
+    prefix[v, i] is the sum of variable v over hours [0, i), so the mean over any
+    window of hours [i0, i1) is (prefix[:, i1] - prefix[:, i0]) / (i1 - i0).
+    """
+    t0: int              # unix seconds of the first hour
+    step: int            # seconds between samples
+    fetched_at: float    # unix seconds
+    prefix: np.ndarray   # (len(VARIABLES), n + 1) float64
+
+    @property
+    def n(self) -> int:
+        return self.prefix.shape[1] - 1
+
+    @classmethod
+    def from_hourly(cls, hourly: dict, fetched_at: Optional[float] = None) -> "HourlySeries":
+        """Build from an Open-Meteo `hourly` object requested with timeformat=unixtime."""
+        times = hourly.get("time") or []
+        if len(times) < 2:
+            raise ValueError("Hourly series needs at least two samples")
+        values = np.array(
+            [[np.nan if v is None else v for v in (hourly.get(var) or [None] * len(times))] for var in VARIABLES],
+            dtype=np.float64,
+        )
+        if values.shape[1] != len(times):
+            raise ValueError("Unexpected Open-Meteo response format")
+        # precipitation_probability can be null; treat as 0. Other gaps take the series mean.
+        values[1] = np.nan_to_num(values[1], nan=0.0)
+        for v in (0, 2, 3):
+            row = values[v]
+            if np.isnan(row).any():
+                row[np.isnan(row)] = np.nanmean(row) if not np.isnan(row).all() else 0.0
+        prefix = np.zeros((len(VARIABLES), len(times) + 1), dtype=np.float64)
+        np.cumsum(values, axis=1, out=prefix[:, 1:])
+        return cls(
+            t0=int(times[0]),
+            step=int(times[1] - times[0]),
+            fetched_at=fetched_at if fetched_at is not None else time.time(),
+            prefix=prefix,
+        )
+
+    def encode(self) -> dict:
+        return {
+            "t0": self.t0,
+            "step": self.step,
+            "fetched_at": self.fetched_at,
+            "n": self.n,
+            "prefix": base64.b64encode(self.prefix.astype("<f8").tobytes()).decode("ascii"),
+        }
+
+    @classmethod
+    def decode(cls, data: dict) -> "HourlySeries":
+        prefix = np.frombuffer(base64.b64decode(data["prefix"]), dtype="<f8")
+        return cls(
+            t0=int(data["t0"]),
+            step=int(data["step"]),
+            fetched_at=float(data["fetched_at"]),
+            prefix=prefix.reshape(len(VARIABLES), int(data["n"]) + 1),
+        )
+
+    def first_index(self, ts: float) -> int:
+        """Index of the first sample at or after `ts`."""
+        return math.ceil((ts - self.t0) / self.step)
+
+    def window(self, start_ts: float, hours: int) -> WeatherSlice:
+        """
+        Mean over the samples in [start_ts, start_ts + hours) in O(1).
+        A window past the end of the series (stale data during an upstream
+        outage) uses the last `hours` samples instead.
+        """
+        n = self.n
+        i0 = min(max(self.first_index(start_ts), 0), n - 1)
+        i1 = min(i0 + max(hours, 1), n)
+        if i1 - i0 < hours:
+            i0 = max(0, i1 - hours)
+        mean = (self.prefix[:, i1] - self.prefix[:, i0]) / (i1 - i0)
+        return WeatherSlice(*(float(v) for v in mean))
+
+
+def cell_of(lat: float, lon: float) -> Cell:
+    return (
+        round(round(lat / CELL_DEGREES) * CELL_DEGREES, 4),
+        round(round(lon / CELL_DEGREES) * CELL_DEGREES, 4),
+    )
+
+
+def _member(cell: Cell) -> str:
+    return f"{cell[0]:.2f}:{cell[1]:.2f}"
+
+
+def _params(cell: Cell) -> dict:
+    return {
+        "latitude": f"{cell[0]:.4f}",
+        "longitude": f"{cell[1]:.4f}",
+        "hourly": ",".join(VARIABLES),
+        "timezone": "UTC",
+        "timeformat": "unixtime",
+        "forecast_days": FORECAST_DAYS,
+    }
+
+
+class WeatherGrid:
+    """
+    Hourly forecasts per grid cell, precomputed by the refresh_weather_grid task.
+
+    Reads go process memory -> Redis -> upstream. A cell that has never been
+    fetched is fetched inline once. A cell whose series is old is still served
+    immediately while a background task refreshes it, so an upstream outage
+    degrades to the last known series instead of blocking requests.
+    """
+
+    def __init__(self) -> None:
+        self._local: "OrderedDict[Cell, Tuple[HourlySeries, float]]" = OrderedDict()
+        self._refreshing: Dict[Cell, asyncio.Task] = {}
+
+    def _remember(self, cell: Cell, series: HourlySeries) -> None:
+        self._local[cell] = (series, time.monotonic())
+        self._local.move_to_end(cell)
+        while len(self._local) > LOCAL_MAX_CELLS:
+            self._local.popitem(last=False)
+
+    async def _fetch(self, cell: Cell) -> HourlySeries:
+        async with httpx.AsyncClient(timeout=FETCH_TIMEOUT_SECONDS) as client:
+            resp = await client.get(OPEN_METEO_FORECAST_URL, params=_params(cell))
+            resp.raise_for_status()
+            series = HourlySeries.from_hourly(resp.json().get("hourly") or {})
+        try:
+            await cache.set_json(SERIES_KEY.format(lat=cell[0], lon=cell[1]), series.encode(), SERIES_TTL_SECONDS)
+        except redis.RedisError:
+            logger.warning("Could not store weather series for cell %s", cell)
+        return series
+
+    async def _refresh(self, cell: Cell) -> None:
+        try:
+            self._remember(cell, await self._fetch(cell))
+        except Exception:
+            logger.warning("Weather refresh failed for cell %s; serving last known series", cell, exc_info=True)
+        finally:
+            self._refreshing.pop(cell, None)
+
+    async def series(self, lat: float, lon: float) -> HourlySeries:
+        cell = cell_of(lat, lon)
+        hit = self._local.get(cell)
+        if hit is not None and time.monotonic() - hit[1] < LOCAL_TTL_SECONDS:
+            return hit[0]
+
+        series = None
+        try:
+            raw = await cache.get_json(SERIES_KEY.format(lat=cell[0], lon=cell[1]))
+            await cache.zadd(ACTIVE_CELLS_KEY, {_member(cell): time.time()})
+            series = HourlySeries.decode(raw) if raw else None
+        except redis.RedisError:
+            logger.warning("Redis unavailable; using in-process weather series")
+            series = hit[0] if hit is not None else None
+
+        if series is None:
+            try:
+                series = await self._fetch(cell)
+            except (httpx.HTTPError, ValueError) as e:
+                raise WeatherUnavailable(f"No weather series for cell {cell}: {e}") from e
+        elif time.time() - series.fetched_at > REFRESH_AFTER_SECONDS and cell not in self._refreshing:
+            self._refreshing[cell] = asyncio.create_task(self._refresh(cell))
+
+        self._remember(cell, series)
+        return series
+
+    async def slice(
+        self,
+        lat: float,
+        lon: float,
+        horizon_hours: int = 4,
+        start: Optional[datetime] = None,
+    ) -> WeatherSlice:
+        """Mean weather over [start, start + horizon_hours) at (lat, lon); start defaults to now."""
+        if horizon_hours <= 0:
+            raise ValueError("horizon_hours must be > 0")
+        if start is None:
+            start = datetime.now(timezone.utc)
+        elif start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        series = await self.series(lat, lon)
+        return series.window(start.timestamp(), horizon_hours)
+
+    # ---- background refresh (Celery) ----
+
+    def refresh_active(self, client: httpx.Client) -> int:
+        """
+        Re-fetch every cell requested within ACTIVE_WINDOW_SECONDS, batching
+        cells into multi-location upstream calls. Cells whose fetch fails keep
+        their previous series.
+
+        Returns:
+            Number of cells refreshed.
+        """
+        r = cache.sync
+        r.zremrangebyscore(ACTIVE_CELLS_KEY, "-inf", time.time() - ACTIVE_WINDOW_SECONDS)
+        cells: List[Cell] = []
+        for member in r.zrange(ACTIVE_CELLS_KEY, 0, -1):
+            lat, lon = member.split(":")
+            cells.append((float(lat), float(lon)))
+        if not cells:
+            return 0
+
+        hourly = fetch_hourly_series(client, cells, past_days=0, forecast_days=FORECAST_DAYS, variables=VARIABLES)
+        fetched_at = time.time()
+        pipe = r.pipeline(transaction=False)
+        refreshed = 0
+        for cell, data in hourly.items():
+            try:
+                series = HourlySeries.from_hourly(data, fetched_at)
+            except ValueError:
+                logger.warning("Skipping malformed weather series for cell %s", cell)
+                continue
+            pipe.set(
+                SERIES_KEY.format(lat=cell[0], lon=cell[1]),
+                json.dumps(series.encode()),
+                ex=SERIES_TTL_SECONDS,
+            )
+            refreshed += 1
+        pipe.execute()
+        return refreshed
+
+
+weather_grid = WeatherGrid()
+
+
+async def fetch_weather_slice(
+    lat: float,
+    lon: float,
+    horizon_hours: int = 4,
+    start: Optional[datetime] = None,
+) -> WeatherSlice:
+    """Mean weather over the next `horizon_hours` at (lat, lon), served from the weather grid."""
+    return await weather_grid.slice(lat, lon, horizon_hours=horizon_hours, start=start)
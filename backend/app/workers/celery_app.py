@@ -24,14 +24,36 @@ celery_app.conf.update(
 
 # Periodic tasks (Celery Beat)
 celery_app.conf.beat_schedule = {
+    "enrich-event-weather-every-minute": {
+        "task": "app.workers.tasks.enrich_event_weather",
+        "schedule": 60.0,
+    },
+    "refresh-weather-grid-every-15-min": {
+        "task": "app.workers.tasks.refresh_weather_grid",
+        "schedule": 900.0,
+    },
+    "refresh-alerts-every-5-min": {
+        "task": "app.workers.tasks.refresh_alerts",
+        "schedule": 300.0,
+    },
+    # Series live 30 min in Redis; refreshing every 20 keeps the map grid always warm
+    "prewarm-air-quality-grid-every-20-min": {
+        "task": "app.workers.tasks.prewarm_air_quality_grid",
+        "schedule": 1200.0,
+    },
+    # Before the retrain so it trains on the newest cf_score snapshot
+    "refresh-cf-embeddings-daily": {
+        "task": "app.workers.tasks.refresh_cf_embeddings",
+        "schedule": crontab(hour=3, minute=0),
+    },
+    "retrain-recommender-daily": {
+        "task": "app.workers.tasks.retrain_recommender",
+        "schedule": crontab(hour=3, minute=30),
+    },
     # "refresh-radar-timestamps-every-5-min": {
     #     "task": "app.workers.tasks.refresh_radar_timestamps",
     #     "schedule": 300.0,
     # },
-    # "refresh-alerts-every-5-min": {
-    #     "task": "app.workers.tasks.refresh_alerts",
-    #     "schedule": 300.0,
-    # },
     # "sync-meteocat-comarca-forecasts-hourly": {
     #     "task": "app.workers.tasks.sync_meteocat_comarca_forecasts",
     #     "schedule": 3600.0,
@@ -1,11 +1,18 @@
-from app.db.session import SessionLocal
+from datetime import datetime, timezone
+
+import httpx
+
+from app.core.config import settings
+from app.db.session import SessionLocal, engine
 from app.db.models import StationMeasurement
+from app.services.recommender.enrichment import enrich_pending_events
 from app.workers.celery_app import celery_app
-from app.services.ml.train import train_and_save_model, fetch_all_stations
 from sqlalchemy import select, func
 
 @celery_app.task
 def train_all_station_models():
+    from app.services.ml.train import train_and_save_model, fetch_all_stations
+
     stations = fetch_all_stations()
     db = SessionLocal()
     try:
@@ -29,4 +36,96 @@ def get_station_date_range(station_code: str, db):
     min_date, max_date = result.one_or_none() or (None, None)
     min_str = min_date.strftime("%Y-%m-%d") if min_date else None
     max_str = max_date.strftime("%Y-%m-%d") if max_date else None
-    return min_str, max_str
\ No newline at end of file
+    return min_str, max_str
+
+
+@celery_app.task
+def enrich_event_weather(batch_size: int = 1000, max_batches: int = 20):
+    """Fill weather context of events ingested by POST /events, one batch at a time."""
+    total = 0
+    with httpx.Client(timeout=30.0) as client:
+        for _ in range(max_batches):
+            with SessionLocal() as db:
+                n = enrich_pending_events(db, client, batch_size=batch_size)
+            total += n
+            if n < batch_size:
+                break
+    return total
+
+
+@celery_app.task
+def refresh_weather_grid():
+    """Re-fetch hourly forecasts of every weather grid cell requested in the last day."""
+    from app.services.recommender.weather_grid import weather_grid
+
+    with httpx.Client(timeout=30.0) as client:
+        return weather_grid.refresh_active(client)
+
+
+@celery_app.task
+def refresh_alerts():
+    """Conditionally re-fetch Meteocat open warning episodes (and their comarca level index) for today and tomorrow."""
+    from app.services.alerts.service import alerts_service
+    from app.services.geo.service import comarca_service
+
+    with SessionLocal() as db:
+        codes = comarca_service.feature_codes(db)
+    with httpx.Client(timeout=15.0) as client:
+        return alerts_service.refresh(client, codes=codes)
+
+
+@celery_app.task
+def prewarm_air_quality_grid():
+    """Refresh the cached air-quality series of every comarca and station point before it expires."""
+    from app.services.air_quality.grid import GRID_SOURCES, load_grid_points
+    from app.services.air_quality.service import air_quality_service
+
+    with SessionLocal() as db:
+        points = [p for source in GRID_SOURCES for p in load_grid_points(db, source)]
+    return air_quality_service.prewarm([(p.lat, p.lon) for p in points])
+
+
+@celery_app.task
+def refresh_cf_embeddings():
+    """Refactorize the user x activity interaction matrix and publish a new embedding snapshot."""
+    from app.services.recommender.embeddings import build_embeddings, publish_snapshot
+
+    emb = build_embeddings(
+        engine,
+        until=datetime.now(timezone.utc),
+        lookback_days=settings.cf_lookback_days,
+        rank=settings.cf_rank,
+    )
+    path = publish_snapshot(emb, settings.recommender_embeddings_dir, keep=settings.cf_keep_snapshots)
+    return {
+        "snapshot": path.name,
+        "users": len(emb.user_ids),
+        "activities": len(emb.activity_ids),
+        "rank": emb.rank,
+    }
+
+
+@celery_app.task
+def retrain_recommender():
+    """Warm-start the recommender on impressions since its last training run."""
+    from app.services.cache import cache
+    from app.services.recommender.registry import model_registry
+    from app.services.recommender.retrain import retrain_incremental
+
+    # One retrain at a time across workers; a run that finds the lock held just exits
+    lock = cache.sync.lock("recs:retrain:lock", timeout=6 * 3600, blocking=False)
+    if not lock.acquire():
+        return {"status": "skipped", "reason": "another retrain is running"}
+    try:
+        return retrain_incremental(
+            engine,
+            model_registry,
+            label_window_days=settings.retrain_label_window_days,
+            max_lookback_days=settings.retrain_max_lookback_days,
+            min_rows=settings.retrain_min_rows,
+            trees_per_run=settings.retrain_trees_per_run,
+            max_total_trees=settings.retrain_max_total_trees,
+            auc_tolerance=settings.retrain_auc_tolerance,
+        )
+    finally:
+        lock.release()
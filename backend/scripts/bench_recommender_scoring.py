@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from typing import Dict
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.recommender.features import FEATURE_SCHEMA
+from app.services.recommender.service import MLRecommender, top_k
+
+
+SIZES = (50, 500, 5000)
+RANK_SIZES = (500, 5000, 50000)
+TOP = 20
+FEATURE_NAMES = list(FEATURE_SCHEMA)
+
+
+def synthetic_features(n: int, rng: np.random.Generator) -> np.ndarray:
+    """Random but plausible candidate features, one row per candidate."""
+    X = np.zeros((n, len(FEATURE_NAMES)), dtype=np.float64)
+    col = {name: i for i, name in enumerate(FEATURE_NAMES)}
+    X[:, col["distance_km"]] = rng.uniform(0.0, 8.0, n)
+    X[:, col["cat_weight"]] = rng.integers(0, 4, n)
+    X[:, col["tag_overlap"]] = rng.integers(0, 5, n)
+    X[:, col["tag_weighted"]] = rng.uniform(0.0, 10.0, n)
+    X[:, col["indoor_f"]] = rng.integers(0, 2, n)
+    X[:, col["covered_f"]] = rng.integers(0, 2, n)
+    X[:, col["price_level_f"]] = rng.integers(0, 4, n)
+    X[:, col["difficulty_f"]] = rng.integers(0, 4, n)
+    X[:, col["duration_minutes_f"]] = rng.integers(30, 240, n)
+    X[:, col["weather_temp_c"]] = 18.0
+    X[:, col["weather_precip_prob"]] = 30.0
+    X[:, col["weather_wind_kmh"]] = 12.0
+    X[:, col["weather_is_day"]] = 1.0
+    outdoor = 1.0 - X[:, col["indoor_f"]]
+    X[:, col["precip_penalty"]] = outdoor * 0.3
+    X[:, col["wind_penalty"]] = outdoor * 12.0 / 50.0
+    return X
+
+
+def per_row_score(rec: MLRecommender, features: Dict[str, float]) -> float:
+    """
+    The scoring path before batching, kept verbatim as the baseline: one dict
+    lookup per feature and one predict_proba call per candidate.
+    (MLRecommender.score now delegates to score_batch, so it can't be used here.)
+    """
+    if rec.model is None or not rec.feature_order:
+        base = 0.0
+        base += 2.0 * float(features.get("cat_weight", 0.0))
+        base += 0.5 * float(features.get("tag_overlap", 0.0))
+        base -= 0.15 * float(features.get("distance_km", 0.0))
+        base -= 1.0 * float(features.get("precip_penalty", 0.0))
+        base -= 0.5 * float(features.get("wind_penalty", 0.0))
+        return float(base)
+
+    x = np.array([[float(features.get(k, 0.0)) for k in rec.feature_order]], dtype=float)
+    if hasattr(rec.model, "predict_proba"):
+        return float(rec.model.predict_proba(x)[0, 1])
+    if hasattr(rec.model, "predict"):
+        return float(rec.model.predict(x)[0])
+    return 0.0
+
+
+def best_of(fn, repeats: int) -> float:
+    """Best wall time in milliseconds over `repeats` runs."""
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def main(model_path: str, repeats: int) -> None:
+    rng = np.random.default_rng(42)
+    ml = MLRecommender(model_path)
+    ml.load()
+    heuristic = MLRecommender(model_path)  # never loaded -> fallback scoring
+
+    print(f"model: {model_path} (loaded={ml.model is not None}, native_booster={ml._booster is not None})")
+    print(f"{'candidates':>10} | {'engine':>9} | {'per-row ms':>10} | {'batch ms':>9} | {'speedup':>7}")
+    for n in SIZES:
+        X = synthetic_features(n, rng)
+        rows = [dict(zip(FEATURE_NAMES, r)) for r in X.tolist()]
+        for label, rec in (("model", ml), ("heuristic", heuristic)):
+            if label == "model" and rec.model is None:
+                continue
+            per_row = best_of(lambda: [per_row_score(rec, f) for f in rows], repeats)
+            batch = best_of(lambda: rec.score_batch(X, FEATURE_NAMES), repeats)
+            print(f"{n:>10} | {label:>9} | {per_row:>10.2f} | {batch:>9.3f} | {per_row / batch:>6.1f}x")
+
+    # Ranking: full sort of (score, candidate) tuples vs argpartition top-k
+    print(f"\n{'candidates':>10} | {'sort ms':>9} | {'top-k ms':>9} | {'speedup':>7}")
+    for n in RANK_SIZES:
+        scores = rng.random(n)
+        items = list(range(n))
+        full = best_of(
+            lambda: sorted(zip(scores.tolist(), items), key=lambda x: x[0], reverse=True)[:TOP], repeats
+        )
+        part = best_of(lambda: top_k(scores, TOP), repeats)
+        print(f"{n:>10} | {full:>9.3f} | {part:>9.3f} | {full / part:>6.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-candidate vs batched recommender scoring latency.")
+    parser.add_argument("--model", default=settings.model_path, help="Path to the joblib model artifact")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    main(args.model, args.repeats)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import uuid
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.api.v1.endpoints.recommender import log_event, log_events_batch
+from app.db.session import engine
+from app.services.recommender.schemas import EventBatchIn, EventIn
+
+# Runs against a migrated database inside one transaction that is rolled back at
+# the end; the commits of the ingest path become savepoints, so nothing is kept.
+CATEGORY = "museum"
+
+
+def seed(db: Session) -> tuple:
+    db.execute(text("INSERT INTO categories (name) VALUES (:c) ON CONFLICT DO NOTHING"), {"c": CATEGORY})
+    user_id = uuid.uuid4()
+    db.execute(
+        text("INSERT INTO users (id, email, password_hash, role, is_active) VALUES (:id, :email, 'x', 'user', true)"),
+        {"id": user_id, "email": f"event-batch-check-{user_id}@example.com"},
+    )
+    activity_ids = [uuid.uuid4() for _ in range(2)]
+    db.execute(
+        text("""
+        INSERT INTO activities
+          (id, name, category, tags, indoor, covered, price_level, difficulty, duration_minutes, location, validated)
+        VALUES
+          (:id, 'Event batch check', :category, '{}', true, true, 0, 0, 60,
+           ST_SetSRID(ST_MakePoint(2.1686, 41.3874), 4326)::geography, true)
+        """),
+        [{"id": a, "category": CATEGORY} for a in activity_ids],
+    )
+    return user_id, activity_ids
+
+
+def check(db: Session) -> list:
+    user_id, activity_ids = seed(db)
+    unknown = uuid.uuid4()
+    items = [
+        {"user_id": str(user_id), "activity_id": str(activity_ids[0]), "event_type": "click", "idempotency_key": "k0"},
+        {"user_id": str(user_id), "activity_id": str(unknown), "event_type": "click", "idempotency_key": "k1"},
+        {"user_id": str(user_id), "activity_id": str(activity_ids[1]), "event_type": "view", "idempotency_key": "k2"},
+        {"user_id": str(user_id), "activity_id": "not-a-uuid", "event_type": "click"},
+    ]
+    failures = []
+
+    first = log_events_batch(EventBatchIn(events=items), db=db)
+    got = [r.status for r in first.results]
+    if got != ["accepted", "rejected", "accepted", "invalid"]:
+        failures.append(f"first batch statuses: {got}")
+    if (first.accepted, first.duplicates, first.invalid, first.rejected) != (2, 0, 1, 1):
+        failures.append(f"first batch counts: {first}")
+
+    # A retry of the whole batch must report the same items per index
+    retry = log_events_batch(EventBatchIn(events=items), db=db)
+    got = [r.status for r in retry.results]
+    if got != ["duplicate", "rejected", "duplicate", "invalid"]:
+        failures.append(f"retried batch statuses: {got}")
+
+    stored = db.execute(
+        text("SELECT count(*) FROM events WHERE user_id = :u"), {"u": user_id}
+    ).scalar()
+    if stored != 2:
+        failures.append(f"{stored} events stored, expected 2")
+
+    try:
+        log_event(EventIn(user_id=user_id, activity_id=unknown, event_type="click"), db=db)
+        failures.append("single event with an unknown activity was accepted")
+    except HTTPException as e:
+        if e.status_code != 422:
+            failures.append(f"single event with an unknown activity: HTTP {e.status_code}")
+    return failures
+
+
+def main() -> int:
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            with Session(bind=conn, join_transaction_mode="create_savepoint") as db:
+                failures = check(db)
+        finally:
+            trans.rollback()
+    for f in failures:
+        print(f"FAIL: {f}")
+    if not failures:
+        print("OK: unknown references are rejected per item, the rest of the batch is stored")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
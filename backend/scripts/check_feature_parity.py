@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+import pandas as pd
+
+from app.services.recommender.features import FEATURE_SCHEMA, ActivityRow, build_features
+from app.services.recommender.index import ActivityIndex
+from app.services.recommender.service import candidate_features
+from app.services.recommender.train_from_db import UserCategoryMatrix, build_feature_frame
+
+CATEGORIES = ["museum", "hiking", "beach", "climbing", "food", "cinema", "market", "cycling"]
+TAGS = [f"tag{i}" for i in range(90)]  # > 64 so the bitset spans two words
+USER_ID = "00000000-0000-0000-0000-000000000001"
+CENTER = (41.3874, 2.1686)
+WEATHER = {"weather_temp_c": 7.5, "weather_precip_prob": 40.0, "weather_wind_kmh": 22.0, "weather_is_day": 1.0}
+
+
+def synthetic_catalog(n: int, rng: np.random.Generator) -> list:
+    return [
+        ActivityRow(
+            id=f"a{i}",
+            name=f"Activity {i}",
+            category=str(rng.choice(CATEGORIES)),
+            tags=list(rng.choice(TAGS, size=int(rng.integers(0, 6)))),  # may repeat tags
+            indoor=bool(rng.integers(0, 2)),
+            covered=bool(rng.integers(0, 2)),
+            price_level=int(rng.integers(0, 4)),
+            difficulty=int(rng.integers(0, 4)),
+            duration_minutes=int(rng.integers(30, 240)),
+            lat=CENTER[0] + float(rng.uniform(-0.3, 0.3)),
+            lon=CENTER[1] + float(rng.uniform(-0.3, 0.3)),
+        )
+        for i in range(n)
+    ]
+
+
+def synthetic_user(rng: np.random.Generator):
+    cat_pref = {c: float(rng.uniform(0, 3)) for c in rng.choice(CATEGORIES, size=4, replace=False)}
+    tag_pref = {t: float(rng.integers(1, 6)) for t in rng.choice(TAGS, size=25, replace=False)}
+    return cat_pref, tag_pref
+
+
+def training_chunk(rows, cat_pref, tag_pref) -> tuple:
+    """The columns LABELED_IMPRESSIONS_SQL would return for impressions of `rows`."""
+    def tag_stats(tags):
+        matched = [tag_pref[t] for t in dict.fromkeys(tags) if t in tag_pref]
+        return len(matched), sum(matched)
+
+    stats = [tag_stats(a.tags) for a in rows]
+    chunk = pd.DataFrame({
+        "user_id": USER_ID,
+        "position": 0,
+        "user_lat": CENTER[0],
+        "user_lon": CENTER[1],
+        **{k: v for k, v in WEATHER.items()},
+        "category": [a.category for a in rows],
+        "tag_overlap": [s[0] for s in stats],
+        "tag_weighted": [s[1] for s in stats],
+        "indoor": [a.indoor for a in rows],
+        "covered": [a.covered for a in rows],
+        "price_level": [a.price_level for a in rows],
+        "difficulty": [a.difficulty for a in rows],
+        "duration_minutes": [a.duration_minutes for a in rows],
+        "lat": [a.lat for a in rows],
+        "lon": [a.lon for a in rows],
+        "label": 0,
+    })
+    prefs = pd.DataFrame(
+        {"user_id": USER_ID, "category": list(cat_pref), "weight": list(cat_pref.values())}
+    )
+    return chunk, UserCategoryMatrix(prefs)
+
+
+def best_of(fn, repeats: int) -> float:
+    """Best wall time in milliseconds over `repeats` runs."""
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def main(n: int, repeats: int) -> int:
+    rng = np.random.default_rng(7)
+    index = ActivityIndex()
+    index._publish(index._build(synthetic_catalog(n, rng)))
+    cat_pref, tag_pref = synthetic_user(rng)
+
+    cands = index.query(*CENTER, radius_km=1000.0, limit=0)
+    rows = cands.rows()
+
+    serving = candidate_features(cands, cat_pref, tag_pref, index=index, **WEATHER)
+    reference = np.array(
+        [
+            [build_features(cat_pref, tag_pref, a, *CENTER, **WEATHER)[f] for f in FEATURE_SCHEMA]
+            for a in rows
+        ],
+        dtype=np.float32,
+    )
+    chunk, user_cat = training_chunk(rows, cat_pref, tag_pref)
+    training = build_feature_frame(chunk, user_cat)[list(FEATURE_SCHEMA)].to_numpy()
+
+    failed = 0
+    for label, other in (("row-at-a-time", reference), ("training", training)):
+        diff = np.abs(serving - other)
+        bad = [FEATURE_SCHEMA[j] for j in np.flatnonzero(diff.max(axis=0) > 0)]
+        print(f"serving vs {label:>13}: {'OK' if not bad else 'MISMATCH ' + ', '.join(bad)}")
+        failed += bool(bad)
+
+    print(f"\nthroughput over {len(rows)} candidates (best of {repeats})")
+    timings = {
+        "row-at-a-time": best_of(
+            lambda: [build_features(cat_pref, tag_pref, a, *CENTER, **WEATHER) for a in rows], repeats
+        ),
+        "serving": best_of(
+            lambda: candidate_features(cands, cat_pref, tag_pref, index=index, **WEATHER), repeats
+        ),
+        "training": best_of(lambda: build_feature_frame(chunk, user_cat), repeats),
+    }
+    for label, ms in timings.items():
+        print(f"  {label:>13}: {ms:9.3f} ms  ({len(rows) / ms * 1000.0:,.0f} rows/s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that serving and training build identical features, and time both paths."
+    )
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    sys.exit(main(args.rows, args.repeats))
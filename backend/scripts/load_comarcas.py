@@ -10,6 +10,8 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 from app.core.config import settings
+from app.services.geo.geometries import build_geometry_levels
+from app.services.geo.tiles import tile_cache
 
 
 DEFAULT_PATH = Path(__file__).resolve().parents[1] / "data" / "comarcas_sample.geojson"
@@ -48,9 +50,14 @@ async def main(path: Path) -> None:
                 {"code": code, "name": name, "geojson": json.dumps(geom)},
             )
         await session.commit()
+        # Simplified, pre-compressed payloads served by /comarcas/geojson
+        levels = await session.run_sync(build_geometry_levels)
 
     await engine.dispose()
+    tile_cache.layer_changed("comarcas")
     print(f"Loaded comarcas from {path}")
+    for level in levels:
+        print(f"  zoom {level.zoom}: {level.size} bytes, {len(level.br)} br, {len(level.gzip)} gzip")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import joblib
+
+from app.services.recommender.registry import model_registry
+
+
+def main(src: str, make_current: bool) -> None:
+    version = model_registry.publish(joblib.load(src), make_current=make_current)
+    entry = model_registry.read_manifest()["versions"][version]
+    print(f"Published {src} as version {version} (sha256={entry['sha256']})")
+    if make_current:
+        print("Set as current; POST /api/v1/model/reload to activate it on all workers")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a joblib model artifact into the model registry.")
+    parser.add_argument("src", help="Path to a joblib payload with 'model' and 'feature_order'")
+    parser.add_argument("--no-current", action="store_true", help="Register without making it current")
+    args = parser.parse_args()
+    main(args.src, not args.no_current)
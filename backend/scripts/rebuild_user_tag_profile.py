@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import Optional
+from uuid import UUID
+import sys
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.db.session import session_scope
+from app.services.recommender.profile import rebuild_tag_profiles
+
+
+def main(user_id: Optional[UUID]) -> None:
+    with session_scope() as db:
+        rebuild_tag_profiles(db, user_id)
+        db.commit()
+    print(f"Rebuilt user_tag_profile for {user_id or 'all users'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild user_tag_profile from the events history.")
+    parser.add_argument("--user-id", type=UUID, default=None, help="Only rebuild this user")
+    args = parser.parse_args()
+    main(args.user_id)
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Sequence
+import sys
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+from sqlalchemy import insert, text
+
+from app.db.models import Event
+from app.db.session import engine, session_scope
+from app.services.recommender.features import WeatherSlice
+from app.services.recommender.impressions import ImpressionWriter
+from app.services.recommender.index import activity_index
+from app.services.recommender.service import MLRecommender, recommend
+
+STAGES = ("weather", "preferences", "candidates", "features", "scoring", "ranking", "logging")
+PERCENTILES = (50, 95, 99)
+
+# One row per logged recommendation list (request_id), with the context it was served
+# in and the activities of that list the user engaged with within the label window.
+LOGGED_REQUESTS_SQL = text("""
+    WITH req AS (
+      SELECT
+        e.request_id,
+        e.user_id,
+        min(e.ts) AS ts,
+        avg(e.user_lat) AS user_lat,
+        avg(e.user_lon) AS user_lon,
+        avg(e.weather_temp_c) AS weather_temp_c,
+        avg(e.weather_precip_prob) AS weather_precip_prob,
+        avg(e.weather_wind_kmh) AS weather_wind_kmh,
+        avg(e.weather_is_day) AS weather_is_day
+      FROM events e
+      WHERE e.event_type = 'view'
+        AND e.request_id IS NOT NULL
+        AND e.user_lat IS NOT NULL AND e.user_lon IS NOT NULL
+        AND e.weather_temp_c IS NOT NULL AND e.weather_precip_prob IS NOT NULL
+        AND e.weather_wind_kmh IS NOT NULL AND e.weather_is_day IS NOT NULL
+      GROUP BY e.request_id, e.user_id
+      ORDER BY min(e.ts) DESC
+      LIMIT :n
+    )
+    SELECT
+      req.*,
+      ARRAY(
+        SELECT DISTINCT v.activity_id::text
+        FROM events v
+        JOIN events o
+          ON o.user_id = v.user_id
+         AND o.activity_id = v.activity_id
+         AND o.event_type IN ('click', 'save', 'complete')
+         AND o.ts >= v.ts
+         AND o.ts <= v.ts + make_interval(days => :label_window_days)
+        WHERE v.request_id = req.request_id AND v.event_type = 'view'
+      ) AS relevant
+    FROM req
+    ORDER BY req.ts
+""")
+
+
+@dataclass(frozen=True)
+class LoggedRequest:
+    request_id: str
+    user_id: str
+    lat: float
+    lon: float
+    weather: WeatherSlice
+    relevant: frozenset
+
+
+class StubWeatherProvider:
+    """Returns the weather stored with each logged request instead of calling Open-Meteo."""
+
+    def __init__(self, requests: Sequence[LoggedRequest]):
+        self._by_request = {r.request_id: r.weather for r in requests}
+
+    def __call__(self, request_id: str) -> WeatherSlice:
+        return self._by_request[request_id]
+
+
+def load_requests(n: int, label_window_days: int) -> List[LoggedRequest]:
+    with session_scope() as db:
+        rows = db.execute(LOGGED_REQUESTS_SQL, {"n": n, "label_window_days": label_window_days}).fetchall()
+    return [
+        LoggedRequest(
+            request_id=str(r.request_id),
+            user_id=str(r.user_id),
+            lat=float(r.user_lat),
+            lon=float(r.user_lon),
+            weather=WeatherSlice(
+                temp_c=float(r.weather_temp_c),
+                precip_prob=float(r.weather_precip_prob),
+                wind_kmh=float(r.weather_wind_kmh),
+                is_day=float(r.weather_is_day),
+            ),
+            relevant=frozenset(r.relevant or ()),
+        )
+        for r in rows
+    ]
+
+
+def ndcg_at_k(ranked: Sequence[str], relevant: frozenset, k: int) -> float:
+    dcg = sum(1.0 / math.log2(i + 2) for i, a in enumerate(ranked[:k]) if a in relevant)
+    idcg = sum(1.0 / math.log2(i + 2) for i in range(min(len(relevant), k)))
+    return dcg / idcg if idcg else 0.0
+
+
+def recall_at_k(ranked: Sequence[str], relevant: frozenset, k: int) -> float:
+    return len(relevant.intersection(ranked[:k])) / len(relevant) if relevant else 0.0
+
+
+def log_impressions(req: LoggedRequest, recs: List[dict]) -> None:
+    """Build and insert the impression rows /recommendations would log, then roll back."""
+    rows = [
+        ImpressionWriter.row(
+            user_id=req.user_id,
+            activity_id=r["id"],
+            request_id=req.request_id,
+            position=i,
+            user_lat=req.lat,
+            user_lon=req.lon,
+            weather_temp_c=req.weather.temp_c,
+            weather_precip_prob=req.weather.precip_prob,
+            weather_wind_kmh=req.weather.wind_kmh,
+            weather_is_day=req.weather.is_day,
+        )
+        for i, r in enumerate(recs, start=1)
+    ]
+    if not rows:
+        return
+    with engine.connect() as conn:
+        tx = conn.begin()
+        conn.execute(insert(Event), rows)
+        tx.rollback()
+
+
+class Run:
+    """Per-request stage timings and ranking quality for one model."""
+
+    def __init__(self, label: str, model: MLRecommender):
+        self.label = label
+        self.model = model
+        self.reset()
+
+    def reset(self) -> None:
+        self.timings: Dict[str, List[float]] = {s: [] for s in STAGES + ("total",)}
+        self.ndcg: List[float] = []
+        self.recall: List[float] = []
+
+    def replay(self, req: LoggedRequest, weather_provider, radius_km: float, k: int, log: bool) -> None:
+        t0 = time.perf_counter()
+        weather = weather_provider(req.request_id)
+        stages = {"weather": (time.perf_counter() - t0) * 1000.0}
+        with session_scope() as db:
+            recs = recommend(
+                db=db,
+                model=self.model,
+                user_id=req.user_id,
+                lat=req.lat,
+                lon=req.lon,
+                radius_km=radius_km,
+                weather_temp_c=weather.temp_c,
+                weather_precip_prob=weather.precip_prob,
+                weather_wind_kmh=weather.wind_kmh,
+                weather_is_day=weather.is_day,
+                limit=k,
+                timings=stages,
+            )
+        if log:
+            t1 = time.perf_counter()
+            log_impressions(req, recs)
+            stages["logging"] = (time.perf_counter() - t1) * 1000.0
+        stages["total"] = (time.perf_counter() - t0) * 1000.0
+
+        for stage, values in self.timings.items():
+            if stage in stages:
+                values.append(stages[stage])
+        if req.relevant:
+            ranked = [str(r["id"]) for r in recs]
+            self.ndcg.append(ndcg_at_k(ranked, req.relevant, k))
+            self.recall.append(recall_at_k(ranked, req.relevant, k))
+
+    def summary(self) -> dict:
+        return {
+            "model": self.label,
+            "loaded": self.model.model is not None,
+            "requests": len(self.timings["total"]),
+            "judged_requests": len(self.ndcg),
+            "ndcg": float(np.mean(self.ndcg)) if self.ndcg else None,
+            "recall": float(np.mean(self.recall)) if self.recall else None,
+            "latency_ms": {
+                stage: {f"p{p}": float(np.percentile(v, p)) for p in PERCENTILES}
+                for stage, v in self.timings.items() if v
+            },
+        }
+
+
+def load_model(spec: str) -> MLRecommender:
+    """An artifact path, or 'heuristic' for the fallback scorer."""
+    model = MLRecommender(spec)
+    if spec != "heuristic":
+        model.load()
+        if model.model is None:
+            raise SystemExit(f"Could not load model {spec}: {model.load_error or 'file not found'}")
+    return model
+
+
+def print_report(summaries: List[dict], k: int) -> None:
+    for s in summaries:
+        ndcg = f"{s['ndcg']:.4f}" if s["ndcg"] is not None else "n/a"
+        recall = f"{s['recall']:.4f}" if s["recall"] is not None else "n/a"
+        print(f"\n== {s['model']} ==  requests={s['requests']} judged={s['judged_requests']} "
+              f"ndcg@{k}={ndcg} recall@{k}={recall}")
+        print(f"{'stage':>12} | " + " | ".join(f"{'p' + str(p) + ' ms':>9}" for p in PERCENTILES))
+        for stage, pct in s["latency_ms"].items():
+            print(f"{stage:>12} | " + " | ".join(f"{pct['p' + str(p)]:>9.3f}" for p in PERCENTILES))
+
+
+def main(args: argparse.Namespace) -> int:
+    requests = load_requests(args.requests, args.label_window_days)
+    if not requests:
+        raise SystemExit("No replayable view impressions (request_id + location + weather) found")
+    weather_provider = StubWeatherProvider(requests)
+
+    runs = [Run(args.model_a, load_model(args.model_a))]
+    if args.model_b:
+        runs.append(Run(args.model_b, load_model(args.model_b)))
+
+    # Load the activity index up front so the first request doesn't pay for it
+    with session_scope() as db:
+        activity_index.rebuild(db)
+
+    for req in requests[: args.warmup]:
+        for run in runs:
+            run.replay(req, weather_provider, args.radius_km, args.k, log=False)
+    for run in runs:
+        run.reset()
+
+    # Interleave the models per request so drift (cache, DB load) hits both equally
+    for req in requests:
+        for run in runs:
+            run.replay(req, weather_provider, args.radius_km, args.k, log=not args.no_logging)
+
+    summaries = [run.summary() for run in runs]
+    print_report(summaries, args.k)
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(summaries, indent=2), encoding="utf-8")
+
+    if len(summaries) == 2 and args.max_ndcg_drop is not None:
+        a, b = summaries[0]["ndcg"], summaries[1]["ndcg"]
+        if a is not None and b is not None and b < a - args.max_ndcg_drop:
+            print(f"\nFAIL: ndcg@{args.k} dropped from {a:.4f} to {b:.4f}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay logged recommendation requests through recommend() and report "
+                    "per-stage latency and ranking quality. Reads DATABASE_URL."
+    )
+    parser.add_argument("--model-a", default="heuristic", help="Artifact path or 'heuristic'")
+    parser.add_argument("--model-b", default=None, help="Second artifact to compare against model A")
+    parser.add_argument("--requests", type=int, default=1000, help="Most recent logged requests to replay")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--k", type=int, default=20, help="List length (recommend limit) and metric cutoff")
+    parser.add_argument("--radius-km", type=float, default=10.0)
+    parser.add_argument("--label-window-days", type=int, default=7)
+    parser.add_argument("--no-logging", action="store_true", help="Skip the (rolled back) impression insert")
+    parser.add_argument("--json-out", default=None)
+    parser.add_argument("--max-ndcg-drop", type=float, default=None,
+                        help="Exit 1 if model B's ndcg is lower than model A's by more than this")
+    sys.exit(main(parser.parse_args()))
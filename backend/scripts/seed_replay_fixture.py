@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import argparse
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+from sqlalchemy import text
+
+from app.db.session import session_scope
+from app.services.recommender.features import haversine_km_vec
+from app.services.recommender.profile import rebuild_tag_profiles
+
+# Synthetic data for scripts/replay_recommendations.py on an empty, migrated database
+# (e.g. a CI PostGIS container). Everything it creates is tagged so --reset can drop it.
+FIXTURE_EMAIL = "replay-fixture-{i}@example.com"
+FIXTURE_NAME_PREFIX = "Replay fixture"
+CATEGORIES = ["museum", "hiking", "beach", "climbing", "food", "cinema", "market", "cycling"]
+INDOOR_CATEGORIES = {"museum", "cinema", "food", "market"}
+TAGS = [f"tag{i}" for i in range(40)]
+CENTER = (41.3874, 2.1686)  # Barcelona
+LIST_SIZE = 20
+
+
+def reset(db) -> None:
+    db.execute(text("DELETE FROM users WHERE email LIKE 'replay-fixture-%@example.com'"))
+    db.execute(text("DELETE FROM activities WHERE name LIKE :p"), {"p": f"{FIXTURE_NAME_PREFIX} %"})
+
+
+def seed(db, n_users: int, n_activities: int, n_requests: int, rng: np.random.Generator) -> None:
+    db.execute(
+        text("INSERT INTO categories (name) SELECT unnest(CAST(:names AS text[])) ON CONFLICT DO NOTHING"),
+        {"names": CATEGORIES},
+    )
+
+    users = [str(uuid.uuid4()) for _ in range(n_users)]
+    db.execute(
+        text("INSERT INTO users (id, email, password_hash, role, is_active) VALUES (:id, :email, 'x', 'user', true)"),
+        [{"id": u, "email": FIXTURE_EMAIL.format(i=i)} for i, u in enumerate(users)],
+    )
+    liked = {u: list(rng.choice(CATEGORIES, size=2, replace=False)) for u in users}
+    db.execute(
+        text("INSERT INTO user_preferences (user_id, category, weight) VALUES (:u, :c, :w)"),
+        [{"u": u, "c": c, "w": int(rng.integers(1, 4))} for u in users for c in liked[u]],
+    )
+
+    ids = [str(uuid.uuid4()) for _ in range(n_activities)]
+    cats = rng.choice(CATEGORIES, size=n_activities)
+    lats = CENTER[0] + rng.uniform(-0.15, 0.15, n_activities)
+    lons = CENTER[1] + rng.uniform(-0.15, 0.15, n_activities)
+    db.execute(
+        text("""
+        INSERT INTO activities
+          (id, name, category, tags, indoor, covered, price_level, difficulty, duration_minutes, location, validated)
+        VALUES
+          (:id, :name, :category, :tags, :indoor, :covered, :price_level, :difficulty, :duration,
+           ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)::geography, true)
+        """),
+        [
+            {
+                "id": ids[i],
+                "name": f"{FIXTURE_NAME_PREFIX} {i}",
+                "category": str(cats[i]),
+                "tags": list(dict.fromkeys(rng.choice(TAGS, size=int(rng.integers(1, 5))).tolist())),
+                "indoor": str(cats[i]) in INDOOR_CATEGORIES,
+                "covered": bool(rng.integers(0, 2)),
+                "price_level": int(rng.integers(0, 4)),
+                "difficulty": int(rng.integers(0, 4)),
+                "duration": int(rng.integers(30, 240)),
+                "lat": float(lats[i]),
+                "lon": float(lons[i]),
+            }
+            for i in range(n_activities)
+        ],
+    )
+
+    # Logged lists: the nearest activities to a random point, engaged with more often
+    # when the category is one the user likes and (in the rain) when it's indoors.
+    now = datetime.now(timezone.utc)
+    events = []
+    for _ in range(n_requests):
+        u = users[int(rng.integers(0, n_users))]
+        lat = CENTER[0] + float(rng.uniform(-0.1, 0.1))
+        lon = CENTER[1] + float(rng.uniform(-0.1, 0.1))
+        weather = {
+            "weather_temp_c": float(rng.uniform(2, 32)),
+            "weather_precip_prob": float(rng.choice([0, 10, 40, 80])),
+            "weather_wind_kmh": float(rng.uniform(0, 40)),
+            "weather_is_day": 1.0,
+        }
+        ts = now - timedelta(days=float(rng.uniform(8, 30)))
+        request_id = str(uuid.uuid4())
+        shown = np.argsort(haversine_km_vec(lat, lon, lats, lons))[:LIST_SIZE]
+        rng.shuffle(shown)
+        for pos, i in enumerate(shown.tolist(), start=1):
+            ctx = {"user_id": u, "activity_id": ids[i], "user_lat": lat, "user_lon": lon, **weather}
+            events.append({**ctx, "id": str(uuid.uuid4()), "event_type": "view", "ts": ts,
+                           "request_id": request_id, "position": pos})
+            p = 0.03 + 0.25 * (cats[i] in liked[u])
+            if weather["weather_precip_prob"] >= 40:
+                p *= 1.5 if cats[i] in INDOOR_CATEGORIES else 0.4
+            if rng.random() < p:
+                event_type = "save" if rng.random() < 0.3 else "click"
+                events.append({**ctx, "id": str(uuid.uuid4()), "event_type": event_type,
+                               "ts": ts + timedelta(minutes=5), "request_id": request_id, "position": pos})
+
+    db.execute(
+        text("""
+        INSERT INTO events
+          (id, user_id, activity_id, event_type, ts, request_id, position, user_lat, user_lon,
+           weather_temp_c, weather_precip_prob, weather_wind_kmh, weather_is_day, enrichment_pending)
+        VALUES
+          (:id, :user_id, :activity_id, :event_type, :ts, :request_id, :position, :user_lat, :user_lon,
+           :weather_temp_c, :weather_precip_prob, :weather_wind_kmh, :weather_is_day, false)
+        """),
+        events,
+    )
+    for u in users:
+        rebuild_tag_profiles(db, u)
+
+
+def main(args: argparse.Namespace) -> None:
+    with session_scope() as db:
+        reset(db)
+        if not args.reset_only:
+            seed(db, args.users, args.activities, args.requests, np.random.default_rng(args.seed))
+        db.commit()
+    print("Removed replay fixture" if args.reset_only else
+          f"Seeded {args.users} users, {args.activities} activities, {args.requests} logged lists")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed synthetic data for replay_recommendations.py.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--activities", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset-only", action="store_true", help="Only delete a previous fixture")
+    main(parser.parse_args())
@@ -1,5 +1,5 @@
 import { apiFetch } from "./client";
-import type { ActivityOut, Me, TokenOut, EventIn } from "./types";
+import type { ActivityOut, Me, TokenOut, EventIn, EventBatchOut } from "./types";
 
 /** Auth */
 export async function register(email: string, password: string) {
@@ -47,6 +47,15 @@ export async function postEvent(token: string, ev: EventIn) {
   });
 }
 
+/** Flush buffered events in one request; set idempotency_key so retries are safe. */
+export async function postEventsBatch(token: string, events: EventIn[]) {
+  return apiFetch<EventBatchOut>("/events/batch", {
+    method: "POST",
+    token,
+    body: JSON.stringify({ events })
+  });
+}
+
 /** Health + admin ops */
 export async function health() {
   return apiFetch<{ ok: boolean; model_loaded: boolean }>("/health", { method: "GET" });
@@ -150,4 +150,20 @@ export type EventIn = {
   weather_precip_prob?: number | null;
   weather_wind_kmh?: number | null;
   weather_is_day?: number | null;
+
+  idempotency_key?: string | null;
+};
+
+export type EventBatchItemResult = {
+  index: number;
+  status: "accepted" | "duplicate" | "invalid" | "rejected";
+  errors?: Record<string, unknown>[] | null;
+};
+
+export type EventBatchOut = {
+  accepted: number;
+  duplicates: number;
+  invalid: number;
+  rejected: number;
+  results: EventBatchItemResult[];
 };
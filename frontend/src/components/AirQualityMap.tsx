@@ -89,7 +89,6 @@ function Legend({ param }: { param: string }) {
 
 export default function AirQualityMap() {
   const [selectedParam, setSelectedParam] = useState('pm2_5');
-  const [stations, setStations] = useState<any[]>([]);
   const [airQualityPoints, setAirQualityPoints] = useState<any[]>([]);
   const [modalOpen, setModalOpen] = useState(false);
   const [modalData, setModalData] = useState<any[]>([]);
@@ -97,30 +96,26 @@ export default function AirQualityMap() {
   const [comarcasGeoJson, setComarcasGeoJson] = useState<any>(null);
 
   useEffect(() => {
-    fetch('/api/v1/comarcas/geojson')
+    fetch('/api/v1/comarcas/geojson?zoom=8')
       .then(res => res.json())
       .then(setComarcasGeoJson);
   }, []);
 
-  // Fetch stations on mount
+  // Fetch current air quality for all stations in one request
   useEffect(() => {
-    fetch('/api/v1/meteocat/stations')
+    fetch('/api/v1/air-quality/grid?source=stations')
       .then(res => res.json())
-      .then(setStations);
+      .then(data => setAirQualityPoints(
+        (data.points || []).map((pt: any) => ({
+          id: pt.id,
+          nom: pt.name,
+          latitud: pt.lat,
+          longitud: pt.lon,
+          ...pt.observation,
+        }))
+      ));
   }, []);
 
-  // Fetch air quality for all stations
-  useEffect(() => {
-    if (stations.length === 0) return;
-    Promise.all(
-      stations.map(async (st) => {
-        const res = await fetch(`/api/v1/air-quality?lat=${st.latitud}&lon=${st.longitud}`);
-        const data = await res.json();
-        return { ...st, ...data.observations?.[0] };
-      })
-    ).then(setAirQualityPoints);
-  }, [stations]);
-
   // Color scale for colormap
   function getColor(value: number | null | undefined, param: string) {
     if (value == null) return '#ccc';
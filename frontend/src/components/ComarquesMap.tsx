@@ -68,7 +68,7 @@ export default function ComarquesMap() {
   const mapRef = useRef<any>(null);
 
   useEffect(() => {
-    fetch('/api/v1/comarcas/geojson')
+    fetch('/api/v1/comarcas/geojson?zoom=8')
       .then(res => res.json())
       .then(setGeojson);
 
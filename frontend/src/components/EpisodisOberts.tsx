@@ -1,46 +1,32 @@
-import { useEffect, useState } from "react";
+import { useEffect, useMemo, useState } from "react";
 import { MapContainer, TileLayer, GeoJSON } from "react-leaflet";
 import { Box, Button, Typography, Paper, Stack } from "@mui/material";
 import "leaflet/dist/leaflet.css";
-import { EpisodiObert } from "../api/types";
 
-
-function getAffectedComarques(episodis, periodNom) {
-  const affected = [];
-  episodis.forEach(ep =>
-    (ep.avisos || []).forEach(aviso =>
-      (aviso.evolucions || []).forEach(evol =>
-        (evol.periodes || []).forEach(period => {
-          if (period.nom === periodNom && Array.isArray(period.afectacions)) {
-            affected.push(...period.afectacions.map(a => ({
-              idComarca: a.idComarca,
-              perill: a.perill,
-              nivell: a.nivell,
-              llindar: a.llindar
-            })));
-          }
-        })
-      )
-    )
-  );
-  return affected;
-}
+// Per-comarca level index: perill[p][i] / nivell[p][i] belong to periods[p] and
+// the i-th feature of /comarcas/geojson; 0 means no warning. afectacions[p] holds
+// every affectation of the period as [feature index, perill, nivell, llindar].
+type Afectacio = [number, number, number, string | null];
+type AlertLevels = {
+  date: string;
+  count: number;
+  periods: string[];
+  perill: number[][];
+  nivell: number[][];
+  afectacions: Afectacio[][];
+};
 
 const DAY_LABELS = ["Today", "Tomorrow"];
+const PERILL_COLORS = ["#ffffb2", "#fecc5c", "#fd8d3c", "#f03b20", "#bd0026"];
 
 export default function EpisodisObertsMap() {
   const [dayOffset, setDayOffset] = useState(0);
-  const [data, setData] = useState<EpisodiObert[] | null>(null);
+  const [levels, setLevels] = useState<AlertLevels | null>(null);
   const [selectedPeriod, setSelectedPeriod] = useState<string | null>(null);
-  const [periods, setPeriods] = useState<string[]>([]);
   const [comarcasGeoJson, setComarcasGeoJson] = useState<any>(null);
 
-  // Compute the date based on offset
-  const date = new Date();
-  date.setDate(date.getDate() + dayOffset);
-
   useEffect(() => {
-        fetch("/api/v1/comarcas/geojson")
+        fetch("/api/v1/comarcas/geojson?zoom=8")
         .then(res => res.json())
         .then(setComarcasGeoJson);
     }, []);
@@ -52,7 +38,7 @@ export default function EpisodisObertsMap() {
       const year = base.getFullYear();
       const month = String(base.getMonth() + 1).padStart(2, "0");
       const day = String(base.getDate()).padStart(2, "0");
-      fetch(`/api/v1/meteocat/episodis-oberts?year=${year}&month=${month}&day=${day}`)
+      fetch(`/api/v1/meteocat/episodis-oberts/levels?year=${year}&month=${month}&day=${day}`)
         .then(async res => {
           if (!res.ok) {
             const text = await res.text();
@@ -60,38 +46,46 @@ export default function EpisodisObertsMap() {
           }
           return res.json();
         })
-        .then(res => {
-          setData(res);
-          const allPeriods = new Set<string>();
-          res.forEach((ep: EpisodiObert) =>
-            (ep.avisos || []).forEach(av =>
-              (av.evolucions || []).forEach(ev =>
-                (ev.periodes || []).forEach(p => allPeriods.add(p.nom))
-              )
-            )
-          );
-          setPeriods(Array.from(allPeriods));
-          setSelectedPeriod(Array.from(allPeriods)[0] || null);
+        .then((res: AlertLevels) => {
+          setLevels(res);
+          setSelectedPeriod(res.periods[0] || null);
         })
         .catch(err => {
-          setData([]);
-          setPeriods([]);
+          setLevels(null);
           setSelectedPeriod(null);
           console.error("Failed to fetch episodi oberts:", err);
         });
     }, [dayOffset]);
 
-  const affected = data && selectedPeriod
-    ? getAffectedComarques(data, selectedPeriod)
-    : [];
+  const periods = levels ? levels.periods : [];
+
+  // Feature -> position in the GeoJSON, the column of the level arrays
+  const featureIndex = useMemo(() => {
+    const index = new Map<any, number>();
+    (comarcasGeoJson?.features || []).forEach((f: any, i: number) => index.set(f, i));
+    return index;
+  }, [comarcasGeoJson]);
+
+  const row = levels && selectedPeriod ? levels.periods.indexOf(selectedPeriod) : -1;
+  const perill = row >= 0 ? levels!.perill[row] : null;
+
+  // Feature index -> affectations of the selected period, for tooltips
+  const afectacions = useMemo(() => {
+    const byFeature = new Map<number, Afectacio[]>();
+    (row >= 0 ? levels!.afectacions[row] : []).forEach(a => {
+      const list = byFeature.get(a[0]);
+      if (list) list.push(a);
+      else byFeature.set(a[0], [a]);
+    });
+    return byFeature;
+  }, [levels, row]);
 
   function style(feature) {
-    const code = Number(feature.properties.code);
-    const found = affected.find(a => a.idComarca === code);
-    if (found) {
-      const colors = ["#ffffb2", "#fecc5c", "#fd8d3c", "#f03b20", "#bd0026"];
+    const i = featureIndex.get(feature);
+    const level = perill && i !== undefined ? perill[i] : 0;
+    if (level > 0) {
       return {
-        fillColor: colors[found.perill] || "#f03b20",
+        fillColor: PERILL_COLORS[level - 1] || "#f03b20",
         weight: 2,
         opacity: 1,
         color: "#000000ff",
@@ -108,14 +102,14 @@ export default function EpisodisObertsMap() {
   }
 
   function onEachFeature(feature, layer) {
-    const code = Number(feature.properties.code);
-    const affectedInfo = affected.filter(a => a.idComarca === code);
+    const i = featureIndex.get(feature);
+    const affectedInfo = i !== undefined ? afectacions.get(i) || [] : [];
 
     let tooltipContent = `<strong>${feature.properties.name}</strong>`;
     if (affectedInfo.length > 0) {
         tooltipContent += "<br/>";
-        tooltipContent += affectedInfo.map(a =>
-        `Perill: ${a.perill}, Nivell: ${a.nivell}${a.llindar ? `, Llindar: ${a.llindar}` : ""}`
+        tooltipContent += affectedInfo.map(([, level, nivell, llindar]) =>
+        `Perill: ${level}, Nivell: ${nivell}${llindar ? `, Llindar: ${llindar}` : ""}`
         ).join("<br/>");
     } else {
         tooltipContent += "<br/>No warnings for this period.";
@@ -162,7 +156,7 @@ export default function EpisodisObertsMap() {
         <TileLayer url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png" />
         {comarcasGeoJson && (
             <GeoJSON
-                key={dayOffset + '-' + selectedPeriod + '-' + JSON.stringify(affected.map(a => a.idComarca))}
+                key={(levels ? levels.date : dayOffset) + '-' + selectedPeriod}
                 data={comarcasGeoJson}
                 style={style}
                 onEachFeature={onEachFeature}